@@ -47,7 +47,29 @@ quantity INT,
 FOREIGN KEY(order_id) REFERENCES orders(order_id) ON DELETE CASCADE,
 FOREIGN KEY(product_id) REFERENCES products(product_id) ON DELETE SET NULL
 );
+
+-- Time-limited stock holds taken by dao/InventoryManager.py; expires_at is in Unix seconds
+create table stock_reservations(
+reservation_id int PRIMARY KEY,
+product_id INT,
+customer_id INT,
+quantity INT,
+expires_at bigint,
+FOREIGN KEY(product_id) REFERENCES products(product_id) ON DELETE CASCADE
+);
+
+-- Indexes for the hot query paths are added by util/SchemaMigrator.py (python util/SchemaMigrator.py migrate)
+
+-- Hi/lo id blocks handed out by util/IdAllocator.py (replaces SELECT MAX(id) + 1)
+create table id_sequences(
+name varchar(50) PRIMARY KEY,
+next_value int
+);
 select * from order_items;
+DROP TABLE IF EXISTS id_sequences;
+
+DROP TABLE IF EXISTS stock_reservations;
+
 -- Drop order_items table first due to foreign key constraints
 DROP TABLE IF EXISTS order_items;
 
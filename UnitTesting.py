@@ -1,11 +1,55 @@
 import sys
 import os
+import asyncio
+import io
+import http.client
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import time
 import unittest
+from datetime import date
+from decimal import Decimal
 from entity.product import Product
 from entity.customer import Customer
+from entity.product_batch import ProductBatch
+from entity.lazy_product import LazyProduct
 from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from dao.CachedOrderProcessorRepository import CachedOrderProcessorRepository
+from dao.AsyncOrderProcessorRepositoryImpl import AsyncOrderProcessorRepositoryImpl
+from dao.CartStore import CartStore
+from dao.InventoryManager import InventoryManager
+from dao.OrderIntake import OrderIntake
+from dao.Session import Session
+from dao.ShardedOrderProcessorRepository import ShardedOrderProcessorRepository
+from dao.Resharder import Resharder
+from dao.ProductSearchIndex import ProductSearchIndex
+from main.bulkimport import BulkImporter
+from main.server import EcomService
+from benchmark import dao_bench
+from benchmark.datagen import DataGenerator
 from exception.customernotfound import CustomerNotFound
 from exception.productnotfound import ProductNotFound
+from exception.pooltimeout import PoolTimeout
+from exception.insufficientstock import InsufficientStock
+from exception.intakefull import IntakeFull
+from util.ConnectionPool import ConnectionPool
+from util.DatabaseBackend import SqliteBackend, SqlServerBackend
+from util.SchemaBootstrapper import SchemaBootstrapper, load_table_definitions
+from util.SchemaMigrator import SchemaMigrator
+from util.IdAllocator import IdAllocator, LocalCounterSource, SequenceTableSource
+from util.ReplicaSet import ReplicaSet
+from util.ShardMap import ShardMap
+from util.LRUCache import LRUCache
+from util.PricingEngine import CartLines, PricingEngine
+from dao.RepricingJob import RepricingJob
+from dao.SalesReport import SalesReport
+from util.ColumnarFile import read_columns, write_columns
+from util.StatementCache import StatementRegistry
+from util.Instrumentation import Instrumentation, InMemorySink, JsonLogSink, PrometheusSink
+from util.HttpServer import listening_socket, start_server
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -51,5 +95,1882 @@ class TestEcommerceSystem(unittest.TestCase):
         with self.assertRaises(ProductNotFound):
             self.repository.get_product_by_id(200)  # Using a non-existent product ID
 
+def create_sqlite_pool(directory, **settings):
+    """Create a pool over a fresh SQLite stand-in database with the application schema."""
+    backend = SqliteBackend(os.path.join(directory, "ecom.db"))
+    SchemaBootstrapper(backend).create_all()
+    SchemaMigrator(backend).migrate()
+    return ConnectionPool.for_backend(backend, **settings)
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=3, timeout=5.0)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_connection_is_reused(self):
+        """Test case to check that a returned connection is handed out again."""
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+        stats = self.pool.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], 1)
+        self.assertEqual(self.pool.connection_stats()[0]["use_count"], 2)
+
+    def test_acquire_times_out_when_exhausted(self):
+        """Test case to check that the pool never grows past max_size."""
+        borrowed = [self.pool.acquire() for _ in range(3)]
+        with self.assertRaises(PoolTimeout):
+            self.pool.acquire(timeout=0.05)
+        for pooled in borrowed:
+            self.pool.release(pooled)
+        self.assertEqual(self.pool.stats()["idle"], 3)
+
+    def test_concurrent_borrowers_stay_within_bounds(self):
+        """Test case to check that many threads share a bounded number of connections."""
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(50):
+                    with self.pool.connection() as connection:
+                        connection.execute("SELECT COUNT(*) FROM products").fetchone()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        stats = self.pool.stats()
+        self.assertLessEqual(stats["created"], 3)
+        self.assertEqual(stats["checkouts"], 400)
+        self.assertEqual(stats["in_use"], 0)
+
+    def test_broken_connection_is_replaced_on_checkout(self):
+        """Test case to check that a connection failing the health check is discarded."""
+        with self.pool.connection() as connection:
+            pass
+        connection.close()
+        with self.pool.connection() as replacement:
+            self.assertIsNot(replacement, connection)
+        self.assertEqual(self.pool.stats()["failed_checks"], 1)
+
+    def test_idle_connections_are_evicted(self):
+        """Test case to check that idle connections above min_size are closed."""
+        self.pool.max_idle = 0
+        with self.pool.connection():
+            pass
+        self.assertEqual(self.pool.evict_idle(), 1)
+        self.assertEqual(self.pool.stats()["size"], 0)
+
+    def test_repository_borrows_per_operation(self):
+        """Test case to check that the repository returns connections after each call."""
+        repository = OrderProcessorRepositoryImpl(self.pool)
+        self.assertTrue(repository.create_product(Product(1, "Belt", 499.99, "Leather belt", 20)))
+        self.assertEqual(repository.get_product_by_id(1)[1], "Belt")
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+
+
+class TestIdAllocator(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=10, timeout=30.0)
+        self.seed_repository = OrderProcessorRepositoryImpl(self.pool)
+        for customer_id in range(1, 9):
+            self.seed_repository.create_customer(Customer(customer_id, f"User{customer_id}", f"user{customer_id}@mail.com", "pw"))
+        for product_id in range(1, 6):
+            self.seed_repository.create_product(Product(product_id, f"Item{product_id}", 10.0, "Test item", 10000))
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_blocks_are_served_from_memory(self):
+        """Test case to check that ids within a block need no new reservation."""
+        calls = []
+        source = LocalCounterSource()
+        original_reserve = source.reserve
+        source.reserve = lambda name, size: calls.append(size) or original_reserve(name, size)
+        allocator = IdAllocator(source, block_size=10)
+        self.assertEqual([allocator.next_id("cart") for _ in range(10)], list(range(1, 11)))
+        self.assertEqual(calls, [10])
+        self.assertEqual(list(allocator.next_ids("cart", 3)), [11, 12, 13])
+        self.assertEqual(calls, [10, 10])
+
+    def test_sequence_table_seeds_from_existing_rows(self):
+        """Test case to check that a new sequence continues after ids already in the table."""
+        with self.pool.connection() as connection:
+            connection.execute("INSERT INTO cart (cart_id, customer_id, product_id, quantity) VALUES (41, 1, 1, 1)")
+            # The migration seeded the sequence while the table was empty; without its row the allocator seeds it itself
+            connection.execute("DELETE FROM id_sequences WHERE name = 'cart'")
+            connection.commit()
+        allocator = IdAllocator(SequenceTableSource(self.pool), block_size=5)
+        self.assertEqual(allocator.next_id("cart"), 42)
+
+    def test_separate_allocators_never_collide(self):
+        """Test case to check that allocators in different processes share the sequence table safely."""
+        first = IdAllocator(SequenceTableSource(self.pool), block_size=3)
+        second = IdAllocator(SequenceTableSource(self.pool), block_size=3)
+        ids = [allocator.next_id("orders") for _ in range(10) for allocator in (first, second)]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_concurrent_cart_and_order_writes(self):
+        """Stress test: many threads adding to carts and placing orders without key collisions."""
+        threads_count, adds_per_thread, orders_per_thread = 8, 20, 5
+        failures = []
+
+        def shopper(customer_id):
+            # Each thread gets its own repository and allocator, like separate app servers
+            repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(SequenceTableSource(self.pool), block_size=4))
+            customer = Customer(customer_id, "", "", "")
+            for i in range(adds_per_thread):
+                product = Product(i % 5 + 1, "", 10.0, "", 0)
+                if not repository.add_to_cart(customer, product, 1):
+                    failures.append(("cart", customer_id, i))
+            for i in range(orders_per_thread):
+                lines = [(Product(1, "", 10.0, "", 0), 1), (Product(2, "", 10.0, "", 0), 2)]
+                if not repository.place_order(customer, lines, "1 Main St"):
+                    failures.append(("order", customer_id, i))
+
+        threads = [threading.Thread(target=shopper, args=(customer_id,)) for customer_id in range(1, threads_count + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [])
+        with self.pool.connection() as connection:
+            counts = [connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("cart", "orders", "order_items")]
+            cart_quantity = connection.execute("SELECT SUM(quantity) FROM cart").fetchone()[0]
+        # Repeated adds of the same product merge into one cart line per customer and product
+        self.assertEqual(counts, [threads_count * 5, threads_count * orders_per_thread, threads_count * orders_per_thread * 2])
+        self.assertEqual(cart_quantity, threads_count * adds_per_thread)
+
+
+class TestBatchedPlaceOrder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=2)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool)))
+        self.customer = Customer(1, "Aman", "aman@mail.com", "pw")
+        self.repository.create_customer(self.customer)
+        self.products = [Product(product_id, f"Item{product_id}", 5.0, "Test item", 10) for product_id in range(1, 51)]
+        for product in self.products:
+            self.repository.create_product(product)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _stock(self, product_id):
+        return self.repository.get_product_by_id(product_id)[4]
+
+    def test_round_trips_do_not_grow_with_order_size(self):
+        """Test case to check that a 50-line order costs the same round-trips as a 2-line order."""
+        self.assertTrue(self.repository.place_order(self.customer, [(product, 1) for product in self.products[:2]], "1 Main St"))
+        small_order_round_trips = self.repository.last_round_trips
+        self.assertTrue(self.repository.place_order(self.customer, [(product, 1) for product in self.products], "1 Main St"))
+        self.assertEqual(self.repository.last_round_trips, small_order_round_trips)
+        self.assertEqual(self._stock(1), 8)
+        self.assertEqual(self._stock(50), 9)
+
+    def test_oversell_is_rejected_atomically(self):
+        """Test case to check that an order exceeding stock changes nothing."""
+        lines = [(self.products[0], 3), (self.products[1], 6), (self.products[1], 6)]  # product 2 needs 12 of 10
+        self.assertFalse(self.repository.place_order(self.customer, lines, "1 Main St"))
+        self.assertEqual(self._stock(1), 10)
+        self.assertEqual(self._stock(2), 10)
+        with self.pool.connection() as connection:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0], 0)
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM order_items").fetchone()[0], 0)
+
+
+class TestCatalogCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=2)
+        self.now = 0.0
+        cache = LRUCache(max_entries=3, ttl=10.0, clock=lambda: self.now)
+        self.repository = CachedOrderProcessorRepository(
+            OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool))), cache=cache)
+        self.customer = Customer(1, "Aman", "aman@mail.com", "pw")
+        self.repository.create_customer(self.customer)
+        for product_id in range(1, 5):
+            self.repository.create_product(Product(product_id, f"Item{product_id}", 5.0, "Test item", 10))
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_hot_lookups_are_served_from_memory(self):
+        """Test case to check that repeated product lookups hit the database once."""
+        checkouts = self.pool.stats()["checkouts"]
+        for _ in range(5):
+            self.assertEqual(self.repository.get_product_by_id(1)[1], "Item1")
+        self.assertEqual(self.pool.stats()["checkouts"], checkouts + 1)
+        self.assertEqual(self.repository.cache_stats()["hits"], 4)
+
+    def test_entries_expire_and_are_evicted(self):
+        """Test case to check TTL expiry and the LRU size bound."""
+        self.repository.get_product_by_id(1)
+        self.now = 11.0
+        self.repository.get_product_by_id(1)
+        for product_id in (2, 3, 4):
+            self.repository.get_product_by_id(product_id)
+        stats = self.repository.cache_stats()
+        self.assertEqual(stats["expirations"], 1)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["size"], 3)
+
+    def test_place_order_invalidates_stock(self):
+        """Test case to check that stock read after an order is never stale."""
+        product = Product(*self.repository.get_product_by_id(2))
+        self.assertTrue(self.repository.place_order(self.customer, [(product, 4)], "1 Main St"))
+        self.assertEqual(self.repository.get_product_by_id(2)[4], 6)
+
+    def test_create_and_delete_invalidate_listing(self):
+        """Test case to check that catalog writes invalidate the cached product list."""
+        self.assertEqual(len(self.repository.get_all_products()), 4)
+        self.repository.delete_product(4)
+        self.assertIsNone(self.repository.get_product_by_id(4))
+        self.assertEqual(len(self.repository.get_all_products()), 3)
+        self.repository.create_product(Product(9, "Cap", 3.0, "Summer cap", 5))
+        self.assertEqual(len(self.repository.get_all_products()), 4)
+
+    def test_changing_returned_products_leaves_the_cache_alone(self):
+        """Test case to check that products handed out from the cached listing are copies"""
+        repository = CachedOrderProcessorRepository(self.repository.repository)
+        for _ in range(2):
+            for product in repository.get_all_products():
+                product.set_price(99.0)
+                product.set_stockQuantity(0)
+        self.assertEqual(repository.cache_stats()["hits"], 1)
+        self.assertEqual({(product.get_price(), product.get_stockQuantity()) for product in repository.get_all_products()}, {(5.0, 10)})
+        self.assertEqual(repository.get_product_by_id(1)[2:], (5.0, "Test item", 10))
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=2)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool)))
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _count(self, table):
+        with self.pool.connection() as connection:
+            return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_bulk_products_report_failed_rows(self):
+        """Test case to check that bad rows are reported while the rest of each chunk is kept."""
+        product_ids = [1, 2, 3, 4, 2, 5, 6, 7, 8, 9]  # position 4 repeats an id
+        generator = (Product(product_id, f"Item{product_id}", 2.5, "Bulk item", 1) for product_id in product_ids)
+        chunks = []
+        result = self.repository.bulk_create_products(generator, chunk_size=3, progress=lambda r: chunks.append(r.inserted))
+        self.assertEqual(result.inserted, 9)
+        self.assertEqual([index for index, _ in result.errors], [4])
+        self.assertEqual(chunks, [3, 5, 8, 9])
+        self.assertEqual(self._count("products"), 9)
+
+    def test_bulk_customers(self):
+        """Test case to check that customers are inserted in chunks."""
+        customers = (Customer(customer_id, "User", f"user{customer_id}@mail.com", "pw") for customer_id in range(1, 2501))
+        result = self.repository.bulk_create_customers(customers, chunk_size=1000)
+        self.assertEqual((result.inserted, result.get_failed()), (2500, 0))
+        self.assertEqual(self._count("customers"), 2500)
+
+    def test_cli_streams_csv_and_jsonl(self):
+        """Test case to check that the importer maps failures back to file line numbers."""
+        csv_path = os.path.join(self.directory, "products.csv")
+        with open(csv_path, "w", newline="") as handle:
+            handle.write("product_id,name,price,description,stockQuantity\n")
+            handle.write("1,Belt,499.99,Leather belt,20\n")
+            handle.write("2,Cap,not-a-price,Summer cap,5\n")
+            handle.write("3,Shoe,999.00,Running shoe,7\n")
+            handle.write("1,Duplicate,1.00,Same id,1\n")
+        importer = BulkImporter(self.repository, "products", chunk_size=2, out=io.StringIO())
+        result = importer.run(csv_path, "csv")
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual([line for line, _ in importer.parse_errors], [3])
+        self.assertEqual([importer.line_for(index) for index, _ in result.errors], [5])
+
+        jsonl_path = os.path.join(self.directory, "customers.jsonl")
+        with open(jsonl_path, "w") as handle:
+            handle.write('{"customer_id": 1, "name": "Aman", "email": "aman@mail.com", "password": "pw"}\n')
+            handle.write('{"customer_id": 2, "name": "Riya", "email": "riya@mail.com", "password": "pw"}\n')
+        importer = BulkImporter(self.repository, "customers", out=io.StringIO())
+        self.assertEqual(importer.run(jsonl_path, "jsonl").inserted, 2)
+
+
+class TestStreamingListings(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=2)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool)))
+        self.repository.bulk_create_products(Product(product_id, f"Item{product_id}", 1.0, "", 1) for product_id in range(1, 1001))
+        self.repository.bulk_create_customers(Customer(customer_id, "User", "", "") for customer_id in range(1, 101))
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_iteration_is_lazy_and_can_stop_early(self):
+        """Test case to check that stopping early releases the connection."""
+        products = self.repository.iter_products(page_size=10, after_id=500)
+        self.assertEqual([next(products).get_product_id() for _ in range(3)], [501, 502, 503])
+        self.assertEqual(self.pool.stats()["in_use"], 1)
+        products.close()
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+
+    def test_full_scan_matches_table(self):
+        """Test case to check that streaming visits every row in key order."""
+        ids = [product.get_product_id() for product in self.repository.iter_products(page_size=64)]
+        self.assertEqual(ids, list(range(1, 1001)))
+        self.assertEqual(sum(1 for _ in self.repository.iter_customers(page_size=7)), 100)
+
+    def test_keyset_pages(self):
+        """Test case to check that pages chain through next keys until exhausted."""
+        pages, key = [], None
+        while True:
+            customers, key = self.repository.get_customers_page(page_size=30, after_id=key)
+            pages.append(len(customers))
+            if key is None:
+                break
+        self.assertEqual(pages, [30, 30, 30, 10])
+        products, key = self.repository.get_products_page(page_size=5, after_id=995)
+        self.assertEqual(([product.get_product_id() for product in products], key), ([996, 997, 998, 999, 1000], 1000))
+
+
+class TestCompactEntities(unittest.TestCase):
+    def test_entities_have_no_instance_dict(self):
+        """Test case to check that entities are slot-backed and keep their getters and setters."""
+        product = Product(1, "Belt", 499.99, "Leather belt", 20)
+        self.assertFalse(hasattr(product, "__dict__"))
+        product.set_stockQuantity(19)
+        self.assertEqual(product.get_stockQuantity(), 19)
+        with self.assertRaises(AttributeError):
+            product.colour = "brown"
+
+    def test_product_batch_round_trip(self):
+        """Test case to check that the columnar batch keeps exact prices."""
+        batch = ProductBatch.from_products([Product(1, "Belt", "499.99", "Leather belt", 20), Product(2, "Cap", 0.1, "", None)])
+        self.assertEqual(list(batch.price_cents), [49999, 10])
+        self.assertEqual(list(batch.stock_quantities), [20, 0])
+        self.assertEqual(str(batch.get_product(0).get_price()), "499.99")
+        self.assertEqual([product.get_name() for product in batch], ["Belt", "Cap"])
+
+    def test_repository_loads_product_batch(self):
+        """Test case to check that the repository fills a batch straight from rows."""
+        directory = tempfile.mkdtemp()
+        pool = create_sqlite_pool(directory, min_size=0, max_size=1)
+        try:
+            repository = OrderProcessorRepositoryImpl(pool, IdAllocator(LocalCounterSource(pool)))
+            repository.bulk_create_products(Product(product_id, "Item", 1.25, "", product_id) for product_id in range(1, 101))
+            batch = repository.load_product_batch(after_id=10, limit=20)
+            self.assertEqual(list(batch.product_ids), list(range(11, 31)))
+            self.assertEqual(set(batch.price_cents), {125})
+        finally:
+            pool.close()
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestAsyncRepository(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=4)
+        self.repository = AsyncOrderProcessorRepositoryImpl(OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool))))
+
+    def tearDown(self):
+        self.repository.close()
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_many_operations_in_flight_on_one_loop(self):
+        """Test case to check that hundreds of concurrent coroutines share a small pool."""
+        async def scenario():
+            await self.repository.create_customer(Customer(1, "Aman", "aman@mail.com", "pw"))
+            await asyncio.gather(*(self.repository.create_product(Product(product_id, "Item", 1.0, "", 100))
+                                   for product_id in range(1, 201)))
+            customer = Customer(1, "", "", "")
+            added = await asyncio.gather(*(self.repository.add_to_cart(customer, Product(product_id, "", 1.0, "", 0), 1)
+                                           for product_id in range(1, 201)))
+            cart = await self.repository.get_all_from_cart(customer)
+            return added, cart
+
+        added, cart = asyncio.run(scenario())
+        self.assertTrue(all(added))
+        self.assertEqual(len(cart), 200)
+        self.assertLessEqual(self.pool.stats()["created"], 4)
+
+
+class TestStorageBackends(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = SqliteBackend(os.path.join(self.directory, "edge.db"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_bootstrapper_creates_schema_from_script(self):
+        """Test case to check that every table in the case-study script is created, idempotently."""
+        bootstrapper = SchemaBootstrapper(self.backend)
+        bootstrapper.create_all()
+        bootstrapper.create_all()
+        connection = self.backend.connect()
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        journal_mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        connection.close()
+        self.assertTrue({"customers", "products", "cart", "orders", "order_items", "id_sequences"} <= tables)
+        self.assertEqual(journal_mode, "wal")
+
+    def test_dialects_render_their_own_sql(self):
+        """Test case to check dialect-specific SQL generation."""
+        sql_server = SqlServerBackend(connection_string="")
+        self.assertEqual(sql_server.limit("SELECT * FROM products ORDER BY product_id", 5), "SELECT TOP (5) * FROM products ORDER BY product_id")
+        self.assertEqual(self.backend.limit("SELECT * FROM products ORDER BY product_id", 5), "SELECT * FROM products ORDER BY product_id LIMIT 5")
+        self.assertEqual(sql_server.current_date(), "GETDATE()")
+
+    def test_repository_runs_on_embedded_backend(self):
+        """Test case to check the full order flow on the embedded SQLite backend."""
+        SchemaBootstrapper(self.backend).create_all()
+        pool = ConnectionPool.for_backend(self.backend, min_size=0, max_size=2)
+        try:
+            repository = OrderProcessorRepositoryImpl(pool)
+            customer = Customer(1, "Aman", "aman@mail.com", "pw")
+            repository.create_customer(customer)
+            repository.create_product(Product(1, "Belt", 499.99, "Leather belt", 20))
+            self.assertTrue(repository.place_order(customer, [(Product(*repository.get_product_by_id(1)), 2)], "1 Main St"))
+            with pool.connection() as connection:
+                order_date = connection.execute("SELECT order_date FROM orders").fetchone()[0]
+            self.assertRegex(order_date, r"^\d{4}-\d{2}-\d{2}$")
+        finally:
+            pool.close()
+
+
+class TestSchemaMigrations(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = SqliteBackend(os.path.join(self.directory, "migrate.db"))
+        SchemaBootstrapper(self.backend).create_all()
+        self.connection = self.backend.connect()
+        self.migrator = SchemaMigrator(self.backend)
+
+    def tearDown(self):
+        self.connection.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_migrations_apply_once_and_merge_duplicate_cart_lines(self):
+        """Test case to check versioning and the cart de-duplication that precedes the unique index."""
+        self.connection.execute("INSERT INTO customers VALUES (1, 'Aman', 'aman@mail.com', 'pw')")
+        self.connection.execute("INSERT INTO products VALUES (1, 'Belt', 499.99, 'Leather belt', 20)")
+        self.connection.executemany("INSERT INTO cart VALUES (?, 1, 1, ?)", [(1, 2), (2, 3), (3, 1)])
+        self.connection.commit()
+        self.assertEqual(self.migrator.migrate(self.connection, target=1), [1])
+        self.assertEqual(self.migrator.migrate(self.connection), [2, 3])
+        self.assertEqual(self.migrator.migrate(self.connection), [])
+        self.assertEqual(self.migrator.current_version(self.connection), 3)
+        self.assertEqual(self.connection.execute("SELECT cart_id, quantity FROM cart").fetchall(), [(1, 6)])
+        # Sequences start after the ids already used
+        self.assertEqual(self.connection.execute("SELECT name, next_value FROM id_sequences ORDER BY name").fetchall(),
+                         [("cart", 2), ("order_items", 1), ("orders", 1), ("stock_reservations", 1)])
+        with self.assertRaises(Exception):
+            self.connection.execute("INSERT INTO cart VALUES (4, 1, 1, 1)")
+
+    def test_migrations_bring_the_original_schema_up_to_date(self):
+        """Test case to check that a database created from the original script gets every table and can take orders."""
+        backend = SqliteBackend(os.path.join(self.directory, "original.db"))
+        connection = backend.connect()
+        try:
+            # The tables of the case-study script before any of the performance work
+            for table, create_sql in load_table_definitions():
+                if table in ("customers", "products", "cart", "orders", "order_items"):
+                    connection.execute(create_sql)
+            connection.execute("INSERT INTO customers VALUES (1, 'Aman', 'aman@mail.com', 'pw')")
+            connection.execute("INSERT INTO products VALUES (1, 'Belt', 499.99, 'Leather belt', 20)")
+            connection.execute("INSERT INTO orders VALUES (7, 1, '2024-01-02', 499.99, 'Home')")
+            connection.execute("INSERT INTO order_items VALUES (9, 7, 1, 1)")
+            connection.commit()
+            SchemaMigrator(backend).migrate(connection)
+            tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            self.assertLessEqual({table for table, _ in load_table_definitions()}, tables)
+        finally:
+            connection.close()
+        pool = ConnectionPool.for_backend(backend, min_size=0, max_size=2)
+        try:
+            repository = OrderProcessorRepositoryImpl(pool, IdAllocator(SequenceTableSource(pool)))
+            customer = Customer(1, "", "", "")
+            self.assertTrue(repository.place_order(customer, [(Product(1, "", Decimal("499.99"), "", 0), 2)], "Home"))
+            self.assertTrue(repository.add_to_cart(customer, Product(1, "", Decimal("499.99"), "", 0), 1))
+            order = repository.checkout_cart(customer, "Work")
+            self.assertEqual(order.get_order_id(), 9)
+            with pool.connection() as pooled:
+                self.assertEqual(pooled.execute("SELECT order_id FROM orders ORDER BY order_id").fetchall(), [(7,), (8,), (9,)])
+                self.assertEqual(pooled.execute("SELECT order_item_id FROM order_items ORDER BY order_item_id").fetchall(),
+                                 [(9,), (10,), (11,)])
+        finally:
+            pool.close()
+
+    def test_query_plans_use_the_new_indexes(self):
+        """Test case to check that the verification tool sees the hot queries switch to the indexes."""
+        self.assertFalse(any(ok for _, ok, _ in self.migrator.verify_query_plans(self.connection)))
+        self.migrator.migrate(self.connection)
+        results = self.migrator.verify_query_plans(self.connection)
+        self.assertTrue(all(ok for _, ok, _ in results), results)
+
+
+class TestCartUpsertAndWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=3)
+        self.allocator = IdAllocator(LocalCounterSource(self.pool))
+        self.repository = OrderProcessorRepositoryImpl(self.pool, self.allocator)
+        self.customer = Customer(1, "Aman", "aman@mail.com", "pw")
+        self.repository.create_customer(self.customer)
+        for product_id in range(1, 4):
+            self.repository.create_product(Product(product_id, f"Item{product_id}", 2.0, "", 50))
+        self.journal = os.path.join(self.directory, "cart.journal")
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _cart_rows(self):
+        with self.pool.connection() as connection:
+            return connection.execute("SELECT product_id, quantity FROM cart WHERE customer_id = 1 ORDER BY product_id").fetchall()
+
+    def test_repeated_adds_merge_quantities(self):
+        """Test case to check that adding the same product twice keeps a single cart line."""
+        product = Product(1, "", 2.0, "", 0)
+        self.assertTrue(self.repository.add_to_cart(self.customer, product, 2))
+        self.assertTrue(self.repository.add_to_cart(self.customer, product, 3))
+        self.assertEqual(self._cart_rows(), [(1, 5)])
+        # Merging into the line spends no cart id
+        self.assertTrue(self.repository.add_to_cart(self.customer, Product(2, "", 2.0, "", 0), 1))
+        with self.pool.connection() as connection:
+            self.assertEqual(connection.execute("SELECT cart_id FROM cart ORDER BY cart_id").fetchall(), [(1,), (2,)])
+
+    def test_write_behind_coalesces_clicks(self):
+        """Test case to check that many cart clicks become one batched flush."""
+        store = CartStore(self.pool, self.allocator, journal_path=self.journal, flush_interval=None)
+        repository = OrderProcessorRepositoryImpl(self.pool, self.allocator, cart_store=store)
+        for _ in range(10):
+            repository.add_to_cart(self.customer, Product(1, "", 2.0, "", 0), 1)
+        repository.add_to_cart(self.customer, Product(2, "", 2.0, "", 0), 4)
+        repository.add_to_cart(self.customer, Product(3, "", 2.0, "", 0), 1)
+        self.assertTrue(repository.remove_product_from_cart(1, 3))
+        self.assertEqual(self._cart_rows(), [])
+        self.assertEqual({item['product'].get_product_id(): item['quantity'] for item in repository.get_all_from_cart(self.customer)}, {1: 10, 2: 4})
+        self.assertEqual(store.flush(), 3)
+        self.assertEqual(self._cart_rows(), [(1, 10), (2, 4)])
+        self.assertEqual(os.path.getsize(self.journal), 0)
+        store.stop()
+
+    def test_checkout_flushes_pending_lines(self):
+        """Test case to check that place_order writes pending cart lines first."""
+        store = CartStore(self.pool, self.allocator, flush_interval=None)
+        repository = OrderProcessorRepositoryImpl(self.pool, self.allocator, cart_store=store)
+        repository.add_to_cart(self.customer, Product(2, "", 2.0, "", 0), 2)
+        self.assertTrue(repository.place_order(self.customer, [(Product(1, "", 2.0, "", 0), 1)], "1 Main St"))
+        self.assertEqual(self._cart_rows(), [(2, 2)])
+
+    def test_journal_replays_after_crash(self):
+        """Test case to check that pending cart writes survive a crash before the flush."""
+        crashed = CartStore(self.pool, self.allocator, journal_path=self.journal, flush_interval=None)
+        crashed.add(1, 1, 3)
+        crashed.add(1, 2, 1)
+        crashed.remove(1, 2)
+        crashed._journal.close()  # process dies here: nothing reached the cart table
+
+        recovered = CartStore(self.pool, self.allocator, journal_path=self.journal, flush_interval=None)
+        self.assertEqual(recovered.get_cart(1), {1: 3})
+        recovered.flush()
+        recovered.stop()
+        # Replaying the same journal again must not double the quantities
+        with open(self.journal, "w") as handle:
+            handle.write('{"c": 1, "p": 1, "q": 3}\n')
+        again = CartStore(self.pool, self.allocator, journal_path=self.journal, flush_interval=None)
+        again.stop()
+        self.assertEqual(self._cart_rows(), [(1, 3)])
+
+    def test_background_flusher(self):
+        """Test case to check that the interval flusher writes pending lines on its own."""
+        store = CartStore(self.pool, self.allocator, flush_interval=0.01)
+        store.start()
+        store.add(1, 3, 7)
+        deadline = time.monotonic() + 5
+        while store.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        store.stop()
+        self.assertEqual(self._cart_rows(), [(3, 7)])
+
+    def test_bad_lines_do_not_block_the_flush(self):
+        """Test case to check that a deleted product's line is dropped and a failing customer does not hold back the others"""
+        store = CartStore(self.pool, self.allocator, flush_interval=None)
+        with self.assertRaises(ProductNotFound):
+            store.add(1, 99, 1)
+        self.repository.create_customer(Customer(2, "Riya", "riya@mail.com", "pw"))
+        store.add(1, 1, 2)
+        store.add(1, 2, 1)
+        store.add(2, 1, 3)
+        store.add(7, 3, 1)   # no such customer: the line can never be written
+        self.assertTrue(self.repository.delete_product(2))
+        self.assertEqual(store.flush(), 2)
+        self.assertEqual(self._cart_rows(), [(1, 2)])
+        self.assertEqual(store.get_cart(1), {1: 2})
+        self.assertEqual(store.get_cart(2), {1: 3})
+        self.assertEqual(store.get_cart(7), {})
+        self.assertEqual(store.pending_count(), 0)
+
+
+class TestOrderHistory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=2)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool)))
+        self.customer = Customer(1, "Aman", "aman@mail.com", "pw")
+        self.repository.create_customer(self.customer)
+        self.repository.create_customer(Customer(2, "Riya", "riya@mail.com", "pw"))
+        self.products = [Product(product_id, f"Item{product_id}", 2.5, "Test item", 1000) for product_id in range(1, 4)]
+        for product in self.products:
+            self.repository.create_product(product)
+        for i in range(25):
+            lines = [(self.products[0], 1), (self.products[i % 2 + 1], 2)]
+            self.repository.place_order(self.customer, lines, f"{i} Main St")
+        self.repository.place_order(Customer(2, "", "", ""), [(self.products[0], 9)], "Elsewhere")
+        with self.pool.connection() as connection:
+            # Spread the orders over January 2024
+            connection.execute("UPDATE orders SET order_date = DATE('2024-01-01', '+' || (order_id - 1) || ' days')")
+            connection.commit()
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_orders_come_back_as_aggregates(self):
+        """Test case to check that every order carries its metadata and OrderItem lines."""
+        orders = list(self.repository.get_order_history(1))
+        self.assertEqual(len(orders), 25)
+        first = orders[0]
+        self.assertEqual((first.get_shipping_address(), first.get_total_price(), first.get_order_date()), ("0 Main St", 7.5, "2024-01-01"))
+        self.assertEqual([(item.get_product_id(), item.get_quantity()) for item in first.get_items()], [(1, 1), (2, 2)])
+        self.assertEqual(first.get_items()[1].get_product().get_name(), "Item2")
+
+    def test_date_range_and_keyset_pages(self):
+        """Test case to check date filtering and paging by whole orders."""
+        january_tenth_to_fifteenth = list(self.repository.get_order_history(1, date(2024, 1, 10), date(2024, 1, 16)))
+        self.assertEqual([order.get_order_id() for order in january_tenth_to_fifteenth], [10, 11, 12, 13, 14, 15])
+        pages, key = [], None
+        while True:
+            orders, key = self.repository.get_order_history_page(1, page_size=10, after_order_id=key)
+            pages.append([len(order.get_items()) for order in orders])
+            if key is None:
+                break
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertTrue(all(count == 2 for page in pages for count in page))
+
+    def test_history_is_one_streamed_query(self):
+        """Test case to check that stopping early releases the single connection used."""
+        history = self.repository.get_order_history(1, page_size=4)
+        next(history)
+        self.assertEqual(self.pool.stats()["in_use"], 1)
+        history.close()
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+
+
+class TestInventoryReservations(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=10, timeout=30.0)
+        self.allocator = IdAllocator(SequenceTableSource(self.pool), block_size=16)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, self.allocator)
+        self.now = 1_000_000.0
+        self.inventory = InventoryManager(self.pool, self.allocator, ttl=60, clock=lambda: self.now)
+        for customer_id in range(1, 11):
+            self.repository.create_customer(Customer(customer_id, "User", f"user{customer_id}@mail.com", "pw"))
+        self.repository.create_product(Product(1, "Hot item", 9.99, "Limited drop", 50))
+        self.repository.create_product(Product(2, "Other item", 1.00, "", 100))
+
+    def tearDown(self):
+        self.inventory.stop_reaper()
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _stock(self, product_id):
+        return self.repository.get_product_by_id(product_id)[4]
+
+    def _run_threads(self, target, count):
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_reservations_never_oversell(self):
+        """Stress test: 10 threads race for 50 units of one SKU, 200 attempts in total."""
+        granted, refused, errors = [], [], []
+
+        def shopper(i):
+            for _ in range(20):
+                try:
+                    granted.append(self.inventory.reserve(i + 1, 1, 1))
+                except InsufficientStock:
+                    refused.append(i)
+                except Exception as e:
+                    errors.append(e)
+
+        self._run_threads(shopper, 10)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(granted), 50)
+        self.assertEqual(len(set(granted)), 50)
+        self.assertEqual(len(refused), 150)
+        self.assertEqual(self._stock(1), 0)
+
+    def test_concurrent_place_order_never_oversells(self):
+        """Stress test: concurrent checkouts stop exactly when stock runs out."""
+        results = []
+
+        def checkout(i):
+            for _ in range(10):
+                results.append(self.repository.place_order(Customer(i + 1, "", "", ""), [(Product(1, "", 9.99, "", 0), 1)], "1 Main St"))
+
+        self._run_threads(checkout, 10)
+        self.assertEqual(results.count(True), 50)
+        self.assertEqual(self._stock(1), 0)
+
+    def test_confirm_release_and_reap(self):
+        """Test case to check the reservation life cycle."""
+        kept = self.inventory.reserve_many(1, [(1, 2), (2, 5)])
+        released = self.inventory.reserve(1, 1, 3)
+        expiring = self.inventory.reserve(2, 1, 4, ttl=10)
+        self.assertEqual((self._stock(1), self._stock(2)), (41, 95))
+
+        self.assertTrue(self.inventory.release(released))
+        self.assertFalse(self.inventory.release(released))
+        self.now += 30
+        self.assertEqual(self.inventory.reap_expired(), 1)
+        self.assertEqual(self._stock(1), 48)
+        with self.assertRaises(InsufficientStock):
+            self.inventory.confirm(2, [expiring], "1 Main St")
+
+        order_id = self.inventory.confirm(1, kept, "1 Main St")
+        order = next(self.repository.get_order_history(1))
+        self.assertEqual(order.get_order_id(), order_id)
+        self.assertEqual([(item.get_product_id(), item.get_quantity()) for item in order.get_items()], [(1, 2), (2, 5)])
+        self.assertEqual((self._stock(1), self._stock(2)), (48, 95))
+
+    def test_background_reaper(self):
+        """Test case to check that the reaper thread returns expired holds."""
+        self.inventory.reserve(1, 1, 5, ttl=-1)
+        self.inventory.start_reaper(interval=0.01)
+        deadline = time.monotonic() + 5
+        while self._stock(1) != 50 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self._stock(1), 50)
+
+
+class TestDaoBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_generator_is_reproducible(self):
+        """Test case to check that the same seed generates the same rows and cart lines are unique per customer and product"""
+        first, second = DataGenerator(500, seed=3), DataGenerator(500, seed=3)
+        self.assertEqual(list(first.product_rows()), list(second.product_rows()))
+        self.assertEqual(list(first.order_item_rows()), list(second.order_item_rows()))
+        self.assertNotEqual(list(first.product_rows()), list(DataGenerator(500, seed=4).product_rows()))
+        cart = list(first.cart_rows())
+        self.assertEqual(len(cart), first.cart_lines)
+        self.assertEqual(len({(row[1], row[2]) for row in cart}), len(cart))
+
+    def test_run_reports_every_method_and_detects_regressions(self):
+        """Test case to check that a small run covers every repository method and that a slower run is flagged"""
+        report = dao_bench.run(scale=200, iterations=20, operations=50, directory=self.directory, out=io.StringIO())
+        self.assertEqual(report["meta"]["rows"]["customers"], 200)
+        for name in dao_bench.MICROBENCHMARKS:
+            self.assertIn(f"micro.{name}", report["results"])
+        for result in report["results"].values():
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+            self.assertLessEqual(result["p95_ms"], result["p99_ms"])
+        self.assertEqual(dao_bench.compare(report, report), [])
+
+        slower = {"results": {name: dict(result, p95_ms=result["p95_ms"] * 3 + 1, ops_per_sec=result["ops_per_sec"] / 3)
+                              for name, result in report["results"].items()}}
+        regressions = dao_bench.compare(slower, report)
+        self.assertTrue(any(line.startswith("micro.get_product_by_id: p95") for line in regressions))
+        self.assertTrue(any(line.startswith("mix.browse_heavy: throughput") for line in regressions))
+
+
+class TestQueryInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sink = PrometheusSink()
+        self.slow = []
+        self.instrumentation = Instrumentation([self.sink], slow_query_seconds=None, slow_query_log=self.slow.append)
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=4, instrumentation=self.instrumentation)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool)))
+        self.repository.create_customer(Customer(1, "User", "user1@mail.com", "pw"))
+        for product_id in (1, 2):
+            self.repository.create_product(Product(product_id, f"Item{product_id}", 5.00, "", 100))
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _last_call(self, method):
+        return [event for event in self.sink.events if event["type"] == "call" and event["method"] == method][-1]
+
+    def test_round_trips_and_rows_are_attributed_to_repository_calls(self):
+        """Test case to check that statements, rows and round-trips are counted per repository call"""
+        customer = Customer(1, "", "", "")
+        for _ in range(2):
+            self.assertTrue(self.repository.place_order(customer, [(Product(1, "", 5.00, "", 0), 2), (Product(2, "", 5.00, "", 0), 1)], "Home"))
+        self.assertEqual(self._last_call("place_order")["round_trips"], self.repository.last_round_trips)
+
+        self.repository.get_all_customers()
+        call = self._last_call("get_all_customers")
+        self.assertEqual((call["statements"], call["rows"], call["errors"]), (1, 1, 0))
+        statement = [event for event in self.sink.events if event["type"] == "statement"][-1]
+        self.assertEqual((statement["method"], statement["rows"]), ("get_all_customers", 1))
+        self.assertEqual(self.sink.snapshot()["calls"]["create_product"]["count"], 2)
+
+    def test_errors_and_slow_queries_are_reported(self):
+        """Test case to check that a failing statement is counted although the repository swallows it, and slow queries are logged"""
+        self.assertFalse(self.repository.create_product(Product(1, "Duplicate", 1.00, "", 1)))
+        self.assertEqual(self._last_call("create_product")["errors"], 1)
+        self.assertEqual(self.slow, [])
+
+        self.instrumentation.slow_query_seconds = 0.0
+        self.repository.get_product_by_id(1)
+        self.assertEqual(len(self.slow), 1)
+        self.assertEqual(self.slow[0]["method"], "get_product_by_id")
+        self.assertTrue(self.slow[0]["statement"].startswith("SELECT"))
+
+    def test_sinks_render_prometheus_text_and_json_lines(self):
+        """Test case to check the Prometheus exposition and the JSON log sink"""
+        stream = io.StringIO()
+        self.instrumentation.sinks.append(JsonLogSink(stream))
+        self.repository.get_products_page(page_size=10)
+        text = self.sink.render()
+        self.assertIn('ecom_repository_calls_total{method="get_products_page"} 1', text)
+        self.assertIn('ecom_sql_statement_seconds_bucket{statement="COMMIT",le="+Inf"}', text)
+        self.assertIn("# TYPE ecom_repository_call_seconds histogram", text)
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([event["type"] for event in events], ["statement", "call"])
+        self.assertEqual(events[1]["rows"], 2)
+
+    def test_disabled_instrumentation_hands_out_raw_connections(self):
+        """Test case to check that a disabled instrumentation adds no wrapper and records nothing"""
+        self.instrumentation.enabled = False
+        self.sink.reset()
+        with self.pool.connection() as connection:
+            self.assertEqual(type(connection).__name__, "Connection")
+        self.assertIsNotNone(self.repository.get_customer_by_id(1))
+        self.assertEqual(len(self.sink.events), 0)
+
+
+class TestStatementCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=1)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool)))
+        self.repository.create_customer(Customer(1, "User", "user1@mail.com", "pw"))
+        self.repository.create_product(Product(1, "Item", 5.00, "", 10))
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_declared_statements_reuse_one_cursor_per_connection(self):
+        """Test case to check that repeated lookups reuse the connection's cached cursor"""
+        for _ in range(5):
+            self.assertEqual(self.repository.get_customer_by_id(1).get_name(), "User")
+            self.assertEqual(self.repository.get_product_by_id(1)[1], "Item")
+        statements = self.pool._idle[0].statements
+        self.assertEqual(len(statements), 4)  # insert_customer, insert_product, customer_by_id, product_by_id
+        self.assertGreaterEqual(statements.hits, 8)
+        self.assertEqual(self.pool.connection_stats()[0]["cached_statements"], 4)
+
+    def test_failed_statement_drops_its_cursor_and_leaves_no_transaction(self):
+        """Test case to check that a failing statement is not reused and the connection goes back clean"""
+        self.assertFalse(self.repository.create_product(Product(1, "Duplicate", 1.00, "", 1)))
+        self.assertEqual(len(self.pool._idle[0].statements), 1)
+        self.assertTrue(self.repository.create_product(Product(2, "Second", 1.00, "", 1)))
+        self.assertTrue(self.repository.add_to_cart(Customer(1, "", "", ""), Product(2, "", 1.00, "", 0), 2))
+        self.assertTrue(self.repository.add_to_cart(Customer(1, "", "", ""), Product(2, "", 1.00, "", 0), 1))
+        self.assertEqual(self.repository.get_all_from_cart(Customer(1, "", "", ""))[0]["quantity"], 3)
+        other = SqliteBackend(os.path.join(self.directory, "ecom.db")).connect()
+        try:
+            other.execute("UPDATE products SET stockQuantity = 5 WHERE product_id = 1")  # would be locked by a leaked write
+            other.commit()
+        finally:
+            other.close()
+
+    def test_statement_names_are_declared_once(self):
+        """Test case to check that the registry rejects a second declaration of a name"""
+        registry = StatementRegistry()
+        statement = registry.declare("customer_by_id", "SELECT 1")
+        self.assertIs(registry.get("customer_by_id"), statement)
+        with self.assertRaises(ValueError):
+            registry.declare("customer_by_id", "SELECT 2")
+
+
+class TestPricingEngine(unittest.TestCase):
+    def test_totals_are_exact_cents(self):
+        """Test case to check that many carts are priced exactly, with promotions, cart discounts, tax and half-up rounding"""
+        engine = PricingEngine(tax_rate_bp=1800, promotions={2: 1000})
+        lines = CartLines()
+        lines.add_cart("a", [(1, "0.10", 3)])                      # 0.30, no float drift
+        lines.add_cart("b", [(1, Decimal("19.99"), 1), (2, 0.35, 1)])  # 19.99 + 0.35 - 0.035 promo -> 20.30 (0.04 off)
+        lines.add_cart("empty", [])
+        lines.add_cart("c", [(3, "5.00", 2)])
+        priced = engine.price(lines, cart_discount_bp=[0, 0, 0, 5000], cart_discount_cents=[0, 0, 0, 1000])
+        self.assertEqual(list(priced.keys), ["a", "b", "empty", "c"])
+        self.assertEqual(list(priced.subtotal_cents), [30, 2034, 0, 1000])
+        self.assertEqual(list(priced.discount_cents), [0, 4, 0, 1000])   # 50 % + 10.00 is capped at the subtotal
+        self.assertEqual(list(priced.tax_cents), [5, 365, 0, 0])         # 18 % of 0.30 = 0.054 -> 0.05; of 20.30 = 3.654 -> 3.65
+        self.assertEqual([priced.get_total(index) for index in range(4)],
+                         [Decimal("0.35"), Decimal("23.95"), Decimal("0.00"), Decimal("0.00")])
+        self.assertEqual(PricingEngine().price_order([(1, 0.1, 3), (2, 0.2, 1)]), Decimal("0.50"))
+
+    def test_repricing_job_quotes_carts_and_reconciles_orders(self):
+        """Test case to check that carts are quoted in batches and orders whose lines no longer match their total are reported"""
+        directory = tempfile.mkdtemp()
+        pool = create_sqlite_pool(directory, min_size=0, max_size=4)
+        try:
+            repository = OrderProcessorRepositoryImpl(pool, IdAllocator(LocalCounterSource(pool)))
+            for customer_id in (1, 2, 3):
+                repository.create_customer(Customer(customer_id, "User", f"user{customer_id}@mail.com", "pw"))
+            repository.create_product(Product(1, "Pen", Decimal("0.10"), "", 100))
+            repository.create_product(Product(2, "Book", Decimal("12.50"), "", 100))
+            for customer_id, product_id, quantity in ((1, 1, 3), (2, 2, 1), (2, 1, 1), (3, 2, 2)):
+                repository.add_to_cart(Customer(customer_id, "", "", ""), Product(product_id, "", 0, "", 0), quantity)
+            self.assertEqual(repository.calculate_total_price([(Product(1, "Pen", 0.1, "", 0), 3)]), Decimal("0.30"))
+            self.assertTrue(repository.place_order(Customer(1, "", "", ""), [(Product(1, "Pen", Decimal("0.10"), "", 0), 3)], "Home"))
+            self.assertTrue(repository.place_order(Customer(2, "", "", ""), [(Product(2, "Book", Decimal("12.50"), "", 0), 1)], "Home"))
+
+            job = RepricingJob(pool, PricingEngine(promotions={2: 2000}), carts_per_batch=2, page_size=1)
+            batches = list(job.quote_carts({3: 1000}))
+            self.assertEqual([len(batch) for batch in batches], [2, 1])
+            quotes = {row[0]: row[4] for batch in batches for row in batch.rows()}
+            self.assertEqual(quotes, {1: Decimal("0.30"), 2: Decimal("10.10"), 3: Decimal("18.00")})
+
+            self.assertEqual(list(RepricingJob(pool).reconcile_orders()), [])
+            with pool.connection() as connection:
+                connection.execute("UPDATE products SET price = 13.00 WHERE product_id = 2")
+                connection.commit()
+            self.assertEqual(list(RepricingJob(pool).reconcile_orders()), [(2, Decimal("12.50"), Decimal("13.00"))])
+            # A deleted product leaves its order with no current total: skipped, not reported
+            self.assertTrue(repository.place_order(Customer(3, "", "", ""), [(Product(1, "Pen", Decimal("0.10"), "", 0), 1),
+                                                                             (Product(2, "Book", Decimal("13.00"), "", 0), 1)], "Home"))
+            self.assertTrue(repository.delete_product(1))
+            job = RepricingJob(pool)
+            self.assertEqual(list(job.reconcile_orders()), [(2, Decimal("12.50"), Decimal("13.00"))])
+            self.assertEqual(job.unpriced_orders, 2)
+        finally:
+            pool.close()
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestSalesReport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = SqliteBackend(os.path.join(self.directory, "sales.db"))
+        SchemaBootstrapper(self.backend).create_all()
+        connection = self.backend.connect()
+        connection.executemany("INSERT INTO customers VALUES (?, ?, ?, ?)", [(1, "A", "a@mail.com", "pw"), (2, "B", "b@mail.com", "pw")])
+        connection.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?)", [(1, "Pen", "0.10", "", 97), (2, "Book", "12.50", "", 8)])
+        connection.commit()
+        connection.close()
+        # order_id, customer_id, day, lines [(product_id, quantity)]
+        self._add_orders([(1, 1, "2024-03-01", [(1, 3)]), (2, 2, "2024-03-01", [(1, 1), (2, 2)]), (40, 1, "2024-03-02", [(2, 1)])])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _add_orders(self, orders):
+        connection = self.backend.connect()
+        for order_id, customer_id, day, lines in orders:
+            total = sum({1: Decimal("0.10"), 2: Decimal("12.50")}[product_id] * quantity for product_id, quantity in lines)
+            connection.execute("INSERT INTO orders VALUES (?, ?, ?, ?, ?)", (order_id, customer_id, day, total, "Home"))
+            connection.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?)",
+                                   [(order_id * 10 + index, order_id, product_id, quantity) for index, (product_id, quantity) in enumerate(lines)])
+        connection.commit()
+        connection.close()
+
+    def test_partitions_are_aggregated_in_worker_processes(self):
+        """Test case to check per-product, per-day and per-customer totals computed by a process pool"""
+        report = SalesReport(self.backend, os.path.join(self.directory, "out"), workers=2, partitions_per_worker=2)
+        summary = report.run(until=date(2024, 3, 3))
+        self.assertEqual((summary["orders"], summary["partitions"], summary["through"]), (3, 4, "2024-03-02"))
+        products = report.load("product_sales")
+        self.assertEqual(list(products["product_id"]), [1, 2])
+        self.assertEqual(list(products["units"]), [4, 3])
+        self.assertEqual(list(products["revenue_cents"]), [40, 3750])
+        self.assertEqual(list(products["turnover_bp"]), [4 * 20000 // (2 * 97 + 4), 3 * 20000 // (2 * 8 + 3)])
+        days = report.load("daily_revenue")
+        self.assertEqual((list(days["day"]), list(days["orders"]), list(days["revenue_cents"])), ([20240301, 20240302], [2, 1], [2540, 1250]))
+        customers = report.load("customer_revenue")
+        self.assertEqual(list(customers["revenue_cents"]), [1280, 2510])
+
+        inline = SalesReport(self.backend, os.path.join(self.directory, "inline"), workers=1)
+        inline.run(until=date(2024, 3, 3))
+        self.assertEqual(inline.load("customer_revenue"), customers)
+
+    def test_rerun_only_adds_days_after_the_watermark(self):
+        """Test case to check that a second run aggregates only newer days and keeps one output generation"""
+        output = os.path.join(self.directory, "out")
+        report = SalesReport(self.backend, output, workers=1)
+        report.run(until=date(2024, 3, 2))
+        self.assertEqual(report.watermark()["through"], "2024-03-01")
+        self.assertEqual(list(report.load("daily_revenue")["day"]), [20240301])
+
+        self._add_orders([(7, 2, "2024-03-03", [(1, 10)])])
+        summary = report.run(until=date(2024, 3, 4))
+        self.assertEqual(summary["orders"], 2)  # 2024-03-02 and 2024-03-03 only
+        self.assertEqual(report.run(until=date(2024, 3, 4))["orders"], 0)
+        days = report.load("daily_revenue")
+        self.assertEqual(list(days["day"]), [20240301, 20240302, 20240303])
+        self.assertEqual(list(report.load("customer_revenue")["orders"]), [2, 2])
+        self.assertEqual(list(report.load("product_sales")["units"]), [14, 3])
+        self.assertEqual(report.watermark()["orders"], 4)
+        self.assertEqual(sorted(name for name in os.listdir(output) if name.startswith("gen-")), [report.watermark()["generation"]])
+
+    def test_columnar_files_round_trip(self):
+        """Test case to check that columnar files keep int64 columns and reject unequal lengths"""
+        path = os.path.join(self.directory, "columns.col")
+        write_columns(path, {"id": [1, 2, 3], "cents": [10 ** 12, -5, 0]})
+        columns = read_columns(path)
+        self.assertEqual((list(columns["id"]), list(columns["cents"])), ([1, 2, 3], [10 ** 12, -5, 0]))
+        with self.assertRaises(ValueError):
+            write_columns(path, {"id": [1], "cents": []})
+
+
+class TestBulkCartAndCheckout(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=3)
+        self.allocator = IdAllocator(LocalCounterSource(self.pool))
+        self.repository = OrderProcessorRepositoryImpl(self.pool, self.allocator)
+        self.customer = Customer(1, "Aman", "aman@mail.com", "pw")
+        self.repository.create_customer(self.customer)
+        self.products = [Product(product_id, f"Item{product_id}", Decimal("2.50"), "", 10) for product_id in range(1, 31)]
+        self.repository.bulk_create_products(self.products)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _count(self, sql):
+        with self.pool.connection() as connection:
+            return connection.execute(sql).fetchone()[0]
+
+    def test_many_lines_are_added_and_removed_per_call(self):
+        """Test case to check that bulk cart calls merge into existing lines and remove many lines at once"""
+        self.assertTrue(self.repository.add_to_cart(self.customer, self.products[0], 1))
+        self.assertTrue(self.repository.add_items_to_cart(self.customer, [(product, 2) for product in self.products[:5]] + [(self.products[1], 1)]))
+        with self.pool.connection() as connection:
+            rows = connection.execute("SELECT product_id, quantity FROM cart WHERE customer_id = 1 ORDER BY product_id").fetchall()
+        self.assertEqual(rows, [(1, 3), (2, 3), (3, 2), (4, 2), (5, 2)])
+        self.assertEqual(self.repository.remove_products_from_cart(1, [2, 4, 4, 99]), 2)
+        self.assertEqual(self._count("SELECT COUNT(*) FROM cart"), 3)
+
+    def test_products_are_fetched_by_ids_in_one_query(self):
+        """Test case to check that get_products_by_ids returns found products in request order, cached or not"""
+        products = self.repository.get_products_by_ids([7, 3, 99, 7])
+        self.assertEqual(list(products), [7, 3])
+        self.assertEqual((products[3].get_name(), products[3].get_stockQuantity()), ("Item3", 10))
+
+        cached = CachedOrderProcessorRepository(self.repository)
+        cached.get_product_by_id(3)
+        checkouts = self.pool.stats()["checkouts"]
+        self.assertEqual(list(cached.get_products_by_ids([3, 5, 6])), [3, 5, 6])
+        self.assertEqual(list(cached.get_products_by_ids([6, 5])), [6, 5])
+        self.assertEqual(self.pool.stats()["checkouts"], checkouts + 1)
+
+    def test_checkout_moves_the_cart_into_an_order_server_side(self):
+        """Test case to check that a 30-line checkout takes stock, writes the order and empties the cart in a few round-trips"""
+        self.assertTrue(self.repository.add_items_to_cart(self.customer, [(product, 2) for product in self.products]))
+        order = self.repository.checkout_cart(self.customer, "1 Main St")
+        self.assertIsNotNone(order)
+        self.assertEqual(order.get_total_price(), Decimal("150.00"))
+        self.assertEqual([item.get_product_id() for item in order.get_items()], list(range(1, 31)))
+        self.assertLessEqual(self.repository.last_round_trips, 7)
+        with self.pool.connection() as connection:
+            self.assertEqual(connection.execute("SELECT total_price FROM orders WHERE order_id = ?", (order.get_order_id(),)).fetchone()[0], 150)
+            items = connection.execute("SELECT order_item_id, product_id, quantity FROM order_items ORDER BY order_item_id").fetchall()
+        self.assertEqual(items, [(item.get_order_item_id(), item.get_product_id(), 2) for item in order.get_items()])
+        self.assertEqual(self._count("SELECT COUNT(*) FROM cart"), 0)
+        self.assertEqual(self._count("SELECT SUM(stockQuantity) FROM products"), 30 * 8)
+        self.assertIsNone(self.repository.checkout_cart(self.customer, "1 Main St"))  # empty cart
+
+    def test_checkout_rejects_oversold_carts_atomically(self):
+        """Test case to check that a cart line exceeding stock leaves stock, orders and the cart unchanged"""
+        self.repository.add_items_to_cart(self.customer, [(self.products[0], 3), (self.products[1], 11)])
+        self.assertIsNone(self.repository.checkout_cart(self.customer, "1 Main St"))
+        self.assertEqual(self._count("SELECT SUM(stockQuantity) FROM products"), 300)
+        self.assertEqual(self._count("SELECT COUNT(*) FROM orders"), 0)
+        self.assertEqual(self._count("SELECT COUNT(*) FROM cart"), 2)
+
+    def test_checkout_flushes_the_write_behind_cart(self):
+        """Test case to check that checkout sees lines still held by the cart store and clears them from it"""
+        store = CartStore(self.pool, self.allocator, flush_interval=None)
+        repository = OrderProcessorRepositoryImpl(self.pool, self.allocator, cart_store=store)
+        repository.add_items_to_cart(self.customer, [(self.products[0], 1), (self.products[2], 4)])
+        self.assertEqual(self._count("SELECT COUNT(*) FROM cart"), 0)
+        order = repository.checkout_cart(self.customer, "1 Main St")
+        self.assertEqual(order.get_total_price(), Decimal("12.50"))
+        self.assertEqual(store.get_cart(1), {})
+        self.assertEqual(repository.get_all_from_cart(self.customer), [])
+
+
+class TestProductSearch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "products.idx")
+        self.index = ProductSearchIndex()
+        for product in [Product(1, "Blue Denim Jeans", Decimal("49.00"), "Classic fit with red stitching", 0),
+                        Product(2, "Red Cotton Shirt", Decimal("19.99"), "Soft everyday shirt", 5),
+                        Product(3, "Shirt Hanger", Decimal("4.50"), "Holds shirts and jackets", 40),
+                        Product(4, "Café Crème Mug", Decimal("8.00"), "Ceramic", 3)]:
+            self.index.add(product)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _ids(self, query, **filters):
+        return [product_id for product_id, _ in self.index.search(query, **filters)]
+
+    def test_ranking_prefixes_and_filters(self):
+        """Test case to check token and prefix matching, name-before-description ranking and price/stock filters"""
+        self.assertEqual(self.index.search("red"), [(2, 8), (1, 2)])
+        self.assertEqual(self._ids("shirt"), [2, 3])
+        self.assertEqual(self._ids("shi"), [2, 3])
+        self.assertEqual(self._ids("jac"), [3])
+        self.assertEqual(self._ids("red shirt"), [2])
+        self.assertEqual(self._ids("CAFÉ crè"), [4])
+        self.assertEqual(self._ids("shirt", max_price="10"), [3])
+        self.assertEqual(self._ids("red", min_stock=1), [2])
+        self.assertEqual(self._ids("shirt", limit=1), [2])
+        self.assertEqual(self._ids("sweater"), [])
+
+    def test_saved_index_is_mapped_and_updated_incrementally(self):
+        """Test case to check that a saved index opens memory-mapped and takes adds and deletes until the next save"""
+        self.index.save(self.path)
+        self.index.close()
+        self.index = ProductSearchIndex.open(self.path)
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self._ids("shirt"), [2, 3])
+
+        self.assertTrue(self.index.remove(3))
+        self.assertFalse(self.index.remove(3))
+        self.index.add(Product(2, "Linen Shirt", Decimal("29.00"), "", 1))
+        self.index.add(Product(9, "Shirt Box", Decimal("3.00"), "", 9))
+        self.assertEqual(self._ids("shirt"), [2, 9])
+        self.assertEqual(self._ids("cotton"), [])
+        self.index.save()
+        reopened = ProductSearchIndex.open(self.path)
+        try:
+            self.assertEqual(len(reopened), 4)
+            self.assertEqual(reopened.search("shirt linen"), [(2, 16)])
+            self.assertEqual(self._ids("hanger"), [])
+        finally:
+            reopened.close()
+
+    def test_repository_events_keep_the_index_current(self):
+        """Test case to check that creates, bulk creates and deletes reach the index and search re-reads stock"""
+        pool = create_sqlite_pool(self.directory, min_size=0, max_size=2)
+        try:
+            repository = OrderProcessorRepositoryImpl(pool, IdAllocator(LocalCounterSource(pool)), search_index=ProductSearchIndex())
+            repository.create_customer(Customer(1, "Aman", "aman@mail.com", "pw"))
+            repository.create_product(Product(1, "Wool Scarf", Decimal("15.00"), "Warm", 2))
+            repository.bulk_create_products([Product(2, "Wool Socks", Decimal("5.00"), "", 10), Product(1, "Duplicate", 1, "", 1)])
+            self.assertEqual([product.get_product_id() for product in repository.search_products("wool")], [1, 2])
+            repository.place_order(Customer(1, "", "", ""), [(Product(1, "", Decimal("15.00"), "", 0), 2)], "Home")
+            self.assertEqual([product.get_product_id() for product in repository.search_products("wool", min_stock=1)], [2])
+            repository.delete_product(2)
+            self.assertEqual([product.get_product_id() for product in repository.search_products("wool")], [1])
+            self.assertEqual(len(repository.search_index), 1)
+        finally:
+            pool.close()
+
+
+class TestHttpService(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=3)
+        self.repository = AsyncOrderProcessorRepositoryImpl(OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool))))
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        sock = listening_socket("127.0.0.1", 0)
+        self.port = sock.getsockname()[1]
+        self.server = asyncio.run_coroutine_threadsafe(start_server(EcomService(self.repository).router, sock), self.loop).result()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.repository.close()
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _request(self, connection, method, path, body=None):
+        connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        payload = response.read()
+        return response.status, json.loads(payload) if payload else None
+
+    def test_json_api_over_one_keep_alive_connection(self):
+        """Test case to check routing, JSON bodies, error statuses and checkout, all on one reused connection"""
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            self.assertEqual(self._request(connection, "POST", "/customers", {"customer_id": 1, "name": "Aman", "email": "aman@mail.com", "password": "pw"}),
+                             (201, {"customer_id": 1, "name": "Aman", "email": "aman@mail.com"}))
+            sock = connection.sock
+            status, product = self._request(connection, "POST", "/products", {"product_id": 5, "name": "Mug", "price": "2.50", "stock_quantity": 3})
+            self.assertEqual((status, product["price"]), (201, "2.50"))
+            self.assertEqual(self._request(connection, "GET", "/customers/1")[1]["email"], "aman@mail.com")
+            self.assertEqual(self._request(connection, "GET", "/customers/99")[0], 404)
+            self.assertEqual(self._request(connection, "PATCH", "/customers/1")[0], 405)
+            self.assertEqual(self._request(connection, "GET", "/orders")[0], 404)
+            self.assertEqual(self._request(connection, "POST", "/customers", {"customer_id": "x"})[0], 400)
+            self.assertEqual(self._request(connection, "POST", "/customers/1/cart", {"items": [{"product_id": 9, "quantity": 1}]})[0], 404)
+
+            self.assertEqual(self._request(connection, "POST", "/customers/1/cart", {"items": [{"product_id": 5, "quantity": 2}]}), (204, None))
+            self.assertEqual(self._request(connection, "GET", "/customers/1/cart")[1]["items"][0]["quantity"], 2)
+            status, order = self._request(connection, "POST", "/customers/1/checkout", {"shipping_address": "Home"})
+            self.assertEqual((status, order["total_price"], len(order["items"])), (201, "5.00", 1))
+            self.assertEqual(self._request(connection, "POST", "/customers/1/checkout", {"shipping_address": "Home"})[0], 409)
+            self.assertEqual(self._request(connection, "GET", "/products/5")[1]["stock_quantity"], 1)
+            self.assertEqual([o["order_id"] for o in self._request(connection, "GET", "/customers/1/orders")[1]["orders"]], [order["order_id"]])
+            self.assertEqual(self._request(connection, "GET", "/products/search?q=mug")[0], 503)
+            self.assertIs(connection.sock, sock)
+        finally:
+            connection.close()
+
+    def test_no_content_response_has_no_content_length(self):
+        """Test case to check that a 204 is sent without Content-Length and the connection stays usable"""
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            self._request(connection, "POST", "/customers", {"customer_id": 1, "name": "Aman", "email": "aman@mail.com", "password": "pw"})
+            self._request(connection, "POST", "/products", {"product_id": 5, "name": "Mug", "price": "2.50", "stock_quantity": 3})
+            connection.request("POST", "/customers/1/cart", body=json.dumps({"items": [{"product_id": 5, "quantity": 1}]}))
+            response = connection.getresponse()
+            self.assertEqual((response.status, response.read()), (204, b""))
+            self.assertIsNone(response.getheader("Content-Length"))
+            self.assertEqual(self._request(connection, "GET", "/customers/1/cart")[0], 200)
+        finally:
+            connection.close()
+
+    def test_pipelined_requests_are_answered_in_order(self):
+        """Test case to check that requests sent back-to-back get responses in request order and Connection: close ends the stream"""
+        async def seed():
+            await self.repository.create_customer(Customer(1, "Aman", "aman@mail.com", "pw"))
+            await self.repository.create_customer(Customer(2, "Riya", "riya@mail.com", "pw"))
+        asyncio.run_coroutine_threadsafe(seed(), self.loop).result()
+
+        update = b'{"name":"Aman K","email":"aman@mail.com","password":"pw"}'
+        requests = [b"GET /customers/2 HTTP/1.1\r\nHost: x\r\n\r\n",
+                    b"GET /customers/3 HTTP/1.1\r\nHost: x\r\n\r\n",
+                    b"PUT /customers/1 HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(update), update),
+                    b"GET /customers/1 HTTP/1.1\r\nConnection: close\r\n\r\n"]
+        with socket.create_connection(("127.0.0.1", self.port), timeout=10) as sock:
+            sock.sendall(b"".join(requests))
+            received = b""
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                received += chunk
+        responses = received.split(b"HTTP/1.1 ")[1:]
+        self.assertEqual([int(response[:3]) for response in responses], [200, 404, 200, 200])
+        self.assertIn(b'"name":"Riya"', responses[0])
+        self.assertIn(b'"name":"Aman K"', responses[3])
+        self.assertIn(b"Connection: close", responses[3])
+
+        with socket.create_connection(("127.0.0.1", self.port), timeout=10) as sock:
+            sock.sendall(b"GARBAGE\r\n\r\nGET /customers/1 HTTP/1.1\r\n\r\n")
+            self.assertTrue(sock.recv(65536).startswith(b"HTTP/1.1 400"))
+            self.assertEqual(sock.recv(65536), b"")
+
+
+class TestOrderIntake(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.directory, "orders.wal")
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=1, timeout=5.0)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(SequenceTableSource(self.pool)))
+        self.customer = Customer(1, "Aman", "aman@mail.com", "pw")
+        self.repository.create_customer(self.customer)
+        self.products = [Product(product_id, f"Item{product_id}", Decimal("2.50"), "", 5) for product_id in range(1, 4)]
+        self.repository.bulk_create_products(self.products)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _count(self, sql):
+        with self.pool.connection() as connection:
+            return connection.execute(sql).fetchone()[0]
+
+    def test_orders_are_group_committed_and_rejected_alone(self):
+        """Test case to check that queued orders share commits and an order short of stock fails without its batch"""
+        intake = OrderIntake(self.repository, self.log_path, batch_size=50, max_delay=0.2)
+        try:
+            futures = [intake.submit(self.customer, [(self.products[i % 3], 1)], "Home") for i in range(6)]
+            futures.append(intake.submit(self.customer, [(self.products[0], 1), (self.products[1], 100)], "Home"))
+            futures.append(intake.submit(self.customer, [(self.products[2], 2)], "Home"))
+            self.assertEqual([future.result(timeout=5) for future in futures[:6]], [True] * 6)
+            with self.assertRaises(InsufficientStock):
+                futures[6].result(timeout=5)
+            self.assertTrue(futures[7].result(timeout=5))
+            self.assertEqual(intake.batches, 1)
+        finally:
+            intake.close()
+        self.assertEqual(self._count("SELECT COUNT(*) FROM orders"), 7)
+        self.assertEqual(self._count("SELECT COUNT(*) FROM order_items"), 7)
+        self.assertEqual(self._count("SELECT SUM(stockQuantity) FROM products"), 15 - 8)
+        self.assertEqual(self._count("SELECT SUM(total_price) FROM orders"), 20)
+
+    def test_full_queue_pushes_back(self):
+        """Test case to check that submit waits for room and raises IntakeFull once its timeout passes"""
+        self.repository.id_allocator.next_id("orders")
+        self.repository.id_allocator.next_id("order_items")
+        intake = OrderIntake(self.repository, self.log_path, max_pending=1)
+        try:
+            with self.pool.connection():
+                # The committer cannot get the only connection, so the first order stays pending
+                first = intake.submit(self.customer, [(self.products[0], 1)], "Home")
+                with self.assertRaises(IntakeFull):
+                    intake.submit(self.customer, [(self.products[0], 1)], "Home", timeout=0.1)
+                self.assertEqual(intake.pending_count(), 1)
+            self.assertTrue(first.result(timeout=10))
+            self.assertTrue(intake.place_order(self.customer, [(self.products[0], 1)], "Home", timeout=5))
+        finally:
+            intake.close()
+        self.assertEqual(self._count("SELECT COUNT(*) FROM orders"), 2)
+
+    def test_logged_orders_are_replayed_once_after_a_crash(self):
+        """Test case to check that reopening the intake writes logged orders not yet committed, and only those"""
+        intake = OrderIntake(self.repository, self.log_path)
+        self.assertTrue(intake.place_order(self.customer, [(self.products[0], 1)], "Home"))
+        committed_id = self._count("SELECT MAX(order_id) FROM orders")
+        intake.close()
+        with open(self.log_path, "a", encoding="utf-8") as log:
+            # Committed but its done marker was lost, a logged order never written, and a torn record
+            log.write(json.dumps({"order_id": committed_id, "first_item_id": 900, "customer_id": 1, "lines": [[2, 1]],
+                                  "total_price": "2.50", "shipping_address": "Home"}) + "\n")
+            log.write(json.dumps({"order_id": 1000, "first_item_id": 1000, "customer_id": 1, "lines": [[2, 2], [3, 1]],
+                                  "total_price": "7.50", "shipping_address": "Work"}) + "\n")
+            log.write('{"order_id": 1001, "first_')
+
+        reopened = OrderIntake(self.repository, self.log_path)
+        try:
+            self.assertEqual(reopened.replayed, 1)
+            self.assertTrue(reopened.place_order(self.customer, [(self.products[0], 1)], "Home"))
+        finally:
+            reopened.close()
+        self.assertEqual(self._count("SELECT COUNT(*) FROM orders"), 3)
+        self.assertEqual(self._count("SELECT shipping_address FROM orders WHERE order_id = 1000"), "Work")
+        self.assertEqual(self._count("SELECT stockQuantity FROM products WHERE product_id = 2"), 3)
+        reopened = OrderIntake(self.repository, self.log_path)
+        reopened.close()
+        self.assertEqual(reopened.replayed, 0)
+
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = create_sqlite_pool(self.directory, min_size=0, max_size=2)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool)))
+        self.repository.create_customer(Customer(1, "Aman", "aman@mail.com", "pw"))
+        self.repository.bulk_create_products([Product(product_id, f"Item{product_id}", Decimal("2.50"), f"About {product_id}", 10)
+                                              for product_id in range(1, 4)])
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _checkouts(self):
+        return self.pool.stats()["checkouts"]
+
+    def test_each_entity_is_loaded_once_per_session(self):
+        """Test case to check that repeated lookups return the same object without querying again"""
+        session = Session(self.repository)
+        customer = session.get_customer(1)
+        product = session.get_product(1)
+        self.assertTrue(self.repository.add_to_cart(customer, product, 2))
+        before = self._checkouts()
+        self.assertIs(session.get_customer(1), customer)
+        self.assertIsNone(session.get_customer(99))
+        self.assertIsNone(session.get_customer(99))
+        products = session.get_products([1, 2, 99])
+        self.assertIs(products[1], product)
+        self.assertEqual(list(products), [1, 2])
+        self.assertIs(session.get_cart(customer)[0]['product'], product)
+        self.assertEqual(self._checkouts() - before, 3)   # customer 99, products 2 and 99 together, the cart
+
+    def test_flush_writes_only_changed_columns(self):
+        """Test case to check that flush updates just the columns changed in the session, in one transaction"""
+        with Session(self.repository) as session:
+            customer = session.get_customer(1)
+            product = session.get_product(2)
+            self.assertFalse(session.is_dirty())
+            self.assertIsNone(session.flush())   # nothing to write is not reported as a write
+            with self.pool.connection() as connection:
+                # Changed behind the session's back; flush must not overwrite it
+                connection.execute("UPDATE customers SET name = 'Aman K' WHERE customer_id = 1")
+                connection.execute("UPDATE products SET stockQuantity = 4 WHERE product_id = 2")
+                connection.commit()
+            customer.set_email("aman.k@mail.com")
+            product.set_price(Decimal("3.00"))
+            self.assertTrue(session.is_dirty())
+        with self.pool.connection() as connection:
+            self.assertEqual(connection.execute("SELECT name, email FROM customers").fetchone(), ("Aman K", "aman.k@mail.com"))
+            self.assertEqual(connection.execute("SELECT price, stockQuantity FROM products WHERE product_id = 2").fetchone(), (3, 4))
+        self.assertFalse(self.repository.update_columns(products={2: {"product_id": 5}}))
+
+    def test_ordered_products_are_complete(self):
+        """Test case to check that ordered products carry every column and are shared with the session's lookups"""
+        self.repository.place_order(Customer(1, "", "", ""), [(Product(1, "", Decimal("2.50"), "", 0), 1),
+                                                              (Product(3, "", Decimal("2.50"), "", 0), 2)], "Home")
+        self.repository.place_order(Customer(1, "", "", ""), [(Product(3, "", Decimal("2.50"), "", 0), 1)], "Home")
+        rows = self.repository.get_orders_by_customer(1)
+        self.assertEqual(sorted((product.get_name(), product.get_description()) for product in rows),
+                         [("Item1", "About 1"), ("Item3", "About 3"), ("Item3", "About 3")])
+        session = Session(self.repository)
+        ordered = session.get_orders_by_customer(1)
+        self.assertEqual({product.get_product_id(): quantity for product, quantity in ordered.items()}, {1: 1, 3: 3})
+        before = self._checkouts()
+        self.assertEqual(sorted(product.get_name() for product in ordered), ["Item1", "Item3"])
+        self.assertIs(session.get_product(3), next(product for product in ordered if product.get_product_id() == 3))
+        self.assertEqual(self._checkouts(), before)
+        self.assertFalse(session.is_dirty())
+
+    def test_cart_products_are_lazy(self):
+        """Test case to check that cart products are lazy and load their missing columns together in one query"""
+        customer = Customer(1, "", "", "")
+        self.assertTrue(self.repository.add_to_cart(customer, Product(2, "", Decimal("2.50"), "", 0), 1))
+        self.assertTrue(self.repository.add_to_cart(customer, Product(3, "", Decimal("2.50"), "", 0), 1))
+        session = Session(self.repository)
+        products = [line['product'] for line in session.get_cart(customer)]
+        self.assertTrue(all(isinstance(product, LazyProduct) for product in products))
+        self.assertEqual(sorted(product.get_name() for product in products), ["Item2", "Item3"])
+        self.assertFalse(any(product.is_loaded() for product in products))
+        self.assertIs(session.get_product(2), next(product for product in products if product.get_product_id() == 2))
+        before = self._checkouts()
+        self.assertEqual(sorted((product.get_stockQuantity(), product.get_description()) for product in products),
+                         [(10, "About 2"), (10, "About 3")])
+        self.assertEqual(self._checkouts() - before, 1)
+        self.assertFalse(session.is_dirty())
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        # A catalog node and three shard databases; the map starts out using only the first two shards
+        self.directories = [tempfile.mkdtemp() for _ in range(4)]
+        self.catalog_pool = create_sqlite_pool(self.directories[0], min_size=0, max_size=4)
+        self.shard_pools = [create_sqlite_pool(directory, min_size=0, max_size=4) for directory in self.directories[1:]]
+        id_allocator = IdAllocator(LocalCounterSource(self.catalog_pool))
+        self.shard_map = ShardMap.create(2, path=os.path.join(self.directories[0], "shards.json"))
+        self.repository = ShardedOrderProcessorRepository(OrderProcessorRepositoryImpl(self.catalog_pool, id_allocator),
+                                                          [OrderProcessorRepositoryImpl(pool, id_allocator) for pool in self.shard_pools],
+                                                          self.shard_map)
+        self.repository.bulk_create_products(Product(product_id, f"Item{product_id}", Decimal("2.50"), "Thing", 10)
+                                             for product_id in range(1, 6))
+        self.repository.bulk_create_customers(Customer(customer_id, f"User{customer_id}", f"u{customer_id}@mail.com", "pw")
+                                              for customer_id in range(1, 41))
+
+    def tearDown(self):
+        self.repository.close()
+        for directory in self.directories:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _rows(self, pool, sql, params=()):
+        with pool.connection() as connection:
+            return connection.execute(sql, params).fetchall()
+
+    def _stock(self, pool, product_id):
+        return self._rows(pool, "SELECT stockQuantity FROM products WHERE product_id = ?", (product_id,))[0][0]
+
+    def test_customers_live_on_their_shard_and_listings_merge_all_shards(self):
+        """Test case to check that customers are routed by hash, products copied everywhere and listings gathered in id order"""
+        for index, pool in enumerate(self.shard_pools[:2]):
+            customer_ids = [row[0] for row in self._rows(pool, "SELECT customer_id FROM customers")]
+            self.assertTrue(customer_ids)
+            self.assertTrue(all(self.shard_map.shard_of(customer_id) == index for customer_id in customer_ids))
+        for pool in self.shard_pools:
+            self.assertEqual(self._rows(pool, "SELECT COUNT(*) FROM products")[0][0], 5)
+        self.assertEqual(self.repository.get_customer_by_id(17).get_name(), "User17")
+        self.assertIsNone(self.repository.get_customer_by_id(99))
+        self.assertEqual([customer.get_customer_id() for customer in self.repository.get_all_customers()], list(range(1, 41)))
+        self.assertEqual([customer.get_customer_id() for customer in self.repository.iter_customers(page_size=6)], list(range(1, 41)))
+        seen, after_id = [], None
+        while True:
+            page, after_id = self.repository.get_customers_page(7, after_id)
+            seen.extend(customer.get_customer_id() for customer in page)
+            if after_id is None:
+                break
+        self.assertEqual(seen, list(range(1, 41)))
+        self.assertTrue(self.repository.update_columns({3: {"name": "Three"}, 4: {"name": "Four"}}, {2: {"price": Decimal("3.00")}}))
+        self.assertEqual([self.repository.get_customer_by_id(customer_id).get_name() for customer_id in (3, 4)], ["Three", "Four"])
+        self.assertEqual(len({self._rows(pool, "SELECT price FROM products WHERE product_id = 2")[0][0]
+                              for pool in [self.catalog_pool] + self.shard_pools}), 1)
+
+    def test_orders_take_stock_on_the_catalog(self):
+        """Test case to check that orders are written on the customer's shard while stock is counted on the catalog node"""
+        customer = Customer(5, "", "", "")
+        shard_pool = self.shard_pools[self.shard_map.shard_of(5)]
+        self.assertTrue(self.repository.place_order(customer, [(Product(1, "", Decimal("2.50"), "", 0), 4)], "Home"))
+        self.assertEqual(self._stock(self.catalog_pool, 1), 6)
+        self.assertEqual(self._stock(shard_pool, 1), 10)   # the shard's copy is not counted down
+        self.assertFalse(self.repository.place_order(customer, [(Product(1, "", Decimal("2.50"), "", 0), 7)], "Home"))
+        # The shard rejects the order (no such customer): the stock taken on the catalog is given back
+        self.assertFalse(self.repository.place_order(Customer(99, "", "", ""), [(Product(2, "", Decimal("2.50"), "", 0), 1)], "Home"))
+        self.assertEqual(self._stock(self.catalog_pool, 2), 10)
+
+        self.assertTrue(self.repository.add_items_to_cart(customer, [(Product(2, "", Decimal("2.50"), "", 0), 2),
+                                                                     (Product(3, "", Decimal("2.50"), "", 0), 1)]))
+        self.assertEqual(len(self.repository.get_all_from_cart(customer)), 2)
+        order = self.repository.checkout_cart(customer, "Work")
+        self.assertEqual(order.get_total_price(), Decimal("7.50"))
+        self.assertEqual((self._stock(self.catalog_pool, 2), self._stock(self.catalog_pool, 3)), (8, 9))
+        self.assertEqual(self.repository.get_all_from_cart(customer), [])
+        self.assertIsNone(self.repository.checkout_cart(customer, "Work"))
+        self.assertEqual(len(list(self.repository.get_order_history(5))), 2)
+        self.assertEqual({product.get_product_id(): quantity for product, quantity in self.repository.get_orders_by_customer(5).items()},
+                         {1: 4, 2: 2, 3: 1})
+        self.assertEqual(self._rows(self.catalog_pool, "SELECT COUNT(*) FROM orders")[0][0], 0)
+
+    def test_rebalance_moves_buckets_while_serving(self):
+        """Test case to check that resharding onto a new shard keeps every customer, cart and order reachable during and after the move"""
+        self.assertTrue(self.repository.update_columns(products={product_id: {"stockQuantity": 10000} for product_id in range(1, 6)}))
+        for customer_id in range(1, 41):
+            customer = Customer(customer_id, "", "", "")
+            self.assertTrue(self.repository.place_order(customer, [(Product(customer_id % 5 + 1, "", Decimal("2.50"), "", 0), 1)], "Home"))
+            self.assertTrue(self.repository.add_to_cart(customer, Product(1, "", Decimal("2.50"), "", 0), 1))
+        self.repository.delete_product(5)   # removed everywhere before the new shard copies the catalog
+        self.repository.create_product(Product(6, "Item6", Decimal("1.00"), "Late", 10))
+
+        errors = []
+        stop = threading.Event()
+
+        def client():
+            # Keeps reading and writing carts through the repository while buckets move
+            customer_id = 0
+            while not stop.is_set():
+                customer_id = customer_id % 40 + 1
+                customer = self.repository.get_customer_by_id(customer_id)
+                if customer is None or not self.repository.add_to_cart(customer, Product(2, "", Decimal("2.50"), "", 0), 1):
+                    errors.append(customer_id)
+
+        thread = threading.Thread(target=client)
+        thread.start()
+        try:
+            moves = Resharder(self.repository, settle=0.0).rebalance()   # one process: no other has to see the freeze
+        finally:
+            stop.set()
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(moves), ShardMap.BUCKETS // 3)
+        self.assertTrue(all(target == 2 for _, _, target in moves))
+        self.assertEqual(ShardMap.load(self.shard_map.path).assignment, self.shard_map.assignment)
+
+        counts = [self._rows(pool, "SELECT COUNT(*) FROM customers")[0][0] for pool in self.shard_pools]
+        self.assertEqual(sum(counts), 40)
+        self.assertTrue(all(counts))
+        self.assertEqual(self._rows(self.shard_pools[2], "SELECT product_id FROM products ORDER BY product_id"), [(1,), (2,), (3,), (4,), (6,)])
+        self.assertEqual([customer.get_customer_id() for customer in self.repository.get_all_customers()], list(range(1, 41)))
+        for customer_id in range(1, 41):
+            customer = Customer(customer_id, "", "", "")
+            self.assertEqual(len(list(self.repository.get_order_history(customer_id))), 1)
+            self.assertEqual(self.repository.get_all_from_cart(customer)[0]['product'].get_product_id(), 1)
+            self.assertIsNotNone(self.repository.checkout_cart(customer, "Home"))
+        self.assertEqual(Resharder(self.repository).cleanup(), 0)
+
+    def test_move_fences_off_other_processes(self):
+        """Test case to check that a process routing by its own copy of the map loses no write while buckets move"""
+        # A second repository with its own map loaded from the same file stands in for another serving process
+        id_allocator = self.repository.id_allocator
+        serving = ShardedOrderProcessorRepository(OrderProcessorRepositoryImpl(self.catalog_pool, id_allocator),
+                                                  [OrderProcessorRepositoryImpl(pool, id_allocator) for pool in self.shard_pools],
+                                                  ShardMap.load(self.shard_map.path), refresh_interval=0.05)
+        customer_ids = list(range(1, 9))
+        buckets = sorted({self.shard_map.bucket_of(customer_id) for customer_id in customer_ids})
+        added = dict.fromkeys(customer_ids, 0)
+        stop = threading.Event()
+
+        def client():
+            while not stop.is_set():
+                for customer_id in customer_ids:
+                    if serving.add_to_cart(Customer(customer_id, "", "", ""), Product(2, "", Decimal("2.50"), "", 0), 1):
+                        added[customer_id] += 1
+
+        thread = threading.Thread(target=client)
+        thread.start()
+        try:
+            resharder = Resharder(self.repository, settle=0.2)
+            resharder.sync_products(2)
+            for bucket in buckets:
+                resharder.move_bucket(bucket, 2)
+            time.sleep(0.1)
+        finally:
+            stop.set()
+            thread.join()
+            serving._executor.shutdown()
+        self.assertEqual(self.shard_map.frozen, set())
+        self.assertEqual(serving.shard_map.assignment, self.shard_map.assignment)
+        for customer_id in customer_ids:
+            self.assertEqual(self.shard_map.shard_of(customer_id), 2)
+            self.assertGreater(added[customer_id], 0)
+            cart = self.repository.get_all_from_cart(Customer(customer_id, "", "", ""))
+            self.assertEqual([line['quantity'] for line in cart], [added[customer_id]])
+
+    def test_frozen_bucket_holds_back_its_calls(self):
+        """Test case to check that calls for a bucket being moved wait for the move while other buckets are served"""
+        bucket = self.shard_map.bucket_of(1)
+        other = next(customer_id for customer_id in range(2, 41) if self.shard_map.bucket_of(customer_id) != bucket)
+        names = []
+        with self.repository.frozen([bucket]):
+            waiting = threading.Thread(target=lambda: names.append(self.repository.get_customer_by_id(1).get_name()))
+            waiting.start()
+            self.assertEqual(self.repository.get_customer_by_id(other).get_name(), f"User{other}")
+            waiting.join(0.1)
+            self.assertEqual(names, [])
+        waiting.join()
+        self.assertEqual(names, ["User1"])
+
+    def test_abandoned_order_history_does_not_block_a_move(self):
+        """Test case to check that an order history iterator left open keeps no bucket busy and still pages correctly"""
+        customer = Customer(1, "", "", "")
+        for _ in range(5):
+            self.assertTrue(self.repository.place_order(customer, [(Product(1, "", Decimal("2.50"), "", 0), 1)], "Home"))
+        history = self.repository.get_order_history(1, page_size=2)
+        first = next(history)
+        moved = threading.Event()
+
+        def move():
+            with self.repository.frozen([self.shard_map.bucket_of(1)]):
+                moved.set()
+
+        mover = threading.Thread(target=move)
+        mover.start()
+        mover.join(5)
+        self.assertTrue(moved.is_set())
+        self.assertEqual([order.get_order_id() for order in history], [first.get_order_id() + i for i in range(1, 5)])
+        self.assertEqual(len(list(self.repository.get_order_history(1, limit=3, page_size=2))), 3)
+
+    def test_shard_map_spreads_ids_and_plans_minimal_moves(self):
+        """Test case to check that sequential ids spread evenly over buckets and a new shard only takes its share"""
+        sizes = [0] * ShardMap.BUCKETS
+        for customer_id in range(1, 25601):
+            sizes[self.shard_map.bucket_of(customer_id)] += 1
+        self.assertLess(max(sizes) - min(sizes), 10)
+        plan = self.shard_map.rebalance_plan(3)
+        self.assertEqual(len(plan), 85)
+        self.assertEqual({target for _, target in plan}, {2})
+        self.assertEqual(ShardMap.create(3).rebalance_plan(3), [])
+
+
+class ReplicaBackend(SqliteBackend):
+    """SQLite backend whose connections fail while its replica is switched off."""
+
+    def __init__(self, path, up, index):
+        super().__init__(path)
+        self.up = up
+        self.index = index
+
+    def connect(self):
+        if not self.up[self.index]:
+            raise ConnectionError("replica is down")
+        return super().connect()
+
+
+class TestReadReplicas(unittest.TestCase):
+    def setUp(self):
+        # A primary and two replicas, each a separate database whose customer 1 has a different name
+        self.directories = [tempfile.mkdtemp() for _ in range(3)]
+        self.pool = create_sqlite_pool(self.directories[0], min_size=0, max_size=2)
+        self.replica_pools = []
+        self.replica_up = [True, True]
+        for index, name in enumerate(["Replica0", "Replica1"]):
+            pool = create_sqlite_pool(self.directories[index + 1], min_size=0, max_size=2)
+            OrderProcessorRepositoryImpl(pool, IdAllocator(LocalCounterSource(pool))).create_customer(Customer(1, name, "r@mail.com", "pw"))
+            pool.close()
+            self.replica_pools.append(ConnectionPool.for_backend(ReplicaBackend(pool.backend.path, self.replica_up, index),
+                                                                 min_size=0, max_size=2, max_idle=0))
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool)))
+        self.repository.create_customer(Customer(1, "Primary", "p@mail.com", "pw"))
+        self.repository.create_product(Product(1, "Item", Decimal("2.50"), "Thing", 10))
+
+    def tearDown(self):
+        self.pool.close()
+        for pool in self.replica_pools:
+            pool.close()
+        for directory in self.directories:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _replicated(self, strategy="round_robin", read_your_writes=0.0, retry_interval=60.0):
+        replicas = ReplicaSet(self.replica_pools, strategy, retry_interval=retry_interval, acquire_timeout=0.1)
+        return OrderProcessorRepositoryImpl(self.pool, IdAllocator(LocalCounterSource(self.pool)), replicas=replicas,
+                                            read_your_writes=read_your_writes)
+
+    def _name(self, repository):
+        return repository.get_customer_by_id(1).get_name()
+
+    def test_reads_alternate_between_replicas_and_writes_go_to_the_primary(self):
+        """Test case to check that round-robin reads rotate over the replicas while writes stay on the primary"""
+        repository = self._replicated()
+        self.assertEqual([self._name(repository) for _ in range(4)], ["Replica0", "Replica1", "Replica0", "Replica1"])
+        checkouts = self.pool.stats()["checkouts"]
+        self.assertTrue(repository.update_customer(Customer(1, "Primary 2", "p@mail.com", "pw")))
+        self.assertEqual(self.pool.stats()["checkouts"], checkouts + 1)
+        self.assertEqual(self._name(self.repository), "Primary 2")
+        self.assertEqual({self._name(repository) for _ in range(2)}, {"Replica0", "Replica1"})
+        self.assertEqual([replica["reads"] for replica in repository.replicas.stats()], [3, 3])
+
+    def test_unavailable_replica_is_skipped_until_it_recovers(self):
+        """Test case to check that a replica that fails is marked down, skipped, and used again once it answers"""
+        repository = self._replicated()
+        self.replica_up[0] = False
+        self.assertEqual([self._name(repository) for _ in range(3)], ["Replica1"] * 3)
+        self.assertEqual([replica["up"] for replica in repository.replicas.stats()], [False, True])
+        self.assertEqual(repository.replicas.check(), 1)
+        self.replica_up[0] = True
+        self.assertEqual(repository.replicas.check(), 2)
+        self.assertEqual({self._name(repository) for _ in range(2)}, {"Replica0", "Replica1"})
+
+        # Without check(), a down replica is retried once retry_interval has passed
+        repository = self._replicated(retry_interval=0.05)
+        self.replica_up[1] = False
+        self.assertEqual([self._name(repository) for _ in range(2)], ["Replica0", "Replica0"])
+        self.replica_up[1] = True
+        time.sleep(0.1)
+        self.assertEqual(self._name(repository), "Replica1")   # the retry comes before the healthy replicas
+        self.assertEqual([replica["up"] for replica in repository.replicas.stats()], [True, True])
+
+    def test_least_loaded_avoids_a_busy_replica(self):
+        """Test case to check that least_loaded sends reads to the replica with fewer borrowed connections"""
+        repository = self._replicated("least_loaded")
+        with self.replica_pools[0].connection():
+            self.assertEqual([self._name(repository) for _ in range(3)], ["Replica1"] * 3)
+            with self.replica_pools[0].connection():
+                # Replica 0 exhausted: it is skipped rather than marked down
+                self.assertEqual(self._name(repository), "Replica1")
+        self.assertTrue(all(replica["up"] for replica in repository.replicas.stats()))
+
+    def test_thread_reads_its_own_writes_from_the_primary(self):
+        """Test case to check that the writing thread reads from the primary for read_your_writes seconds"""
+        repository = self._replicated(read_your_writes=60.0)
+        self.assertEqual(self._name(repository), "Replica0")
+        self.assertTrue(repository.create_product(Product(2, "Other", Decimal("1.00"), "", 1)))   # a write for no customer
+        self.assertEqual(self._name(repository), "Primary")
+        names = []
+        other = threading.Thread(target=lambda: names.append(self._name(repository)))
+        other.start()
+        other.join()
+        self.assertEqual(names, ["Replica1"])
+
+    def test_customer_reads_own_writes_through_the_async_facade(self):
+        """Test case to check that reads for a customer follow that customer's write to the primary on any thread"""
+        repository = self._replicated(read_your_writes=60.0)
+        facade = AsyncOrderProcessorRepositoryImpl(repository, max_workers=4)
+
+        async def scenario():
+            customer = Customer(1, "", "", "")
+            self.assertTrue(await facade.add_to_cart(customer, Product(1, "", Decimal("2.50"), "", 0), 2))
+            cart = await facade.get_all_from_cart(customer)
+            return cart, (await facade.get_customer_by_id(1)).get_name()
+
+        try:
+            cart, name = asyncio.run(scenario())
+        finally:
+            facade.close()
+        self.assertEqual([line['quantity'] for line in cart], [2])
+        self.assertEqual(name, "Primary")
+        names = []
+        other = threading.Thread(target=lambda: names.append(self._name(repository)))
+        other.start()
+        other.join()
+        self.assertEqual(names, ["Primary"])
+        self.assertIsNone(repository.get_product_by_id(1))   # reads for no customer still go to a replica
+
+    def test_all_replicas_down_falls_back_to_the_primary(self):
+        """Test case to check that reads are served by the primary when no replica can be used"""
+        repository = self._replicated()
+        self.replica_up[0] = self.replica_up[1] = False
+        self.assertEqual([self._name(repository) for _ in range(2)], ["Primary", "Primary"])
+        self.assertEqual(repository.replicas.primary_reads, 2)
+        self.assertEqual([customer.get_name() for customer in repository.iter_customers()], ["Primary"])
+        self.assertEqual(repository.replicas.primary_reads, 3)
+
+
+@unittest.skipUnless(os.environ.get("ECOM_SQLSERVER_TEST"), "set ECOM_SQLSERVER_TEST to the ODBC connection string of a scratch SQL Server database")
+class TestSqlServerIntegration(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = SqlServerBackend(os.environ["ECOM_SQLSERVER_TEST"])
+        SchemaBootstrapper(self.backend).create_all()
+        SchemaMigrator(self.backend).migrate()
+        self.pool = ConnectionPool.for_backend(self.backend, min_size=0, max_size=1, timeout=5.0)
+        self.repository = OrderProcessorRepositoryImpl(self.pool, IdAllocator(SequenceTableSource(self.pool)))
+        # Ids far above anything the application allocates, so a scratch database with data still works
+        self.customer = Customer(2000000000 + os.getpid() % 100000, "Aman", "aman@mail.com", "pw")
+        self.product = Product(self.customer.get_customer_id(), "Item", Decimal("2.50"), "", 5)
+        self.repository.create_customer(self.customer)
+        self.repository.create_product(self.product)
+
+    def tearDown(self):
+        self.repository.delete_customer(self.customer.get_customer_id())
+        self.repository.delete_product(self.product.get_product_id())
+        self.pool.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_group_commit_with_savepoints_commits(self):
+        """Test case to check that a batch with a savepoint per order is really committed and leaves no transaction open"""
+        intake = OrderIntake(self.repository, os.path.join(self.directory, "orders.wal"), batch_size=50, max_delay=0.2)
+        try:
+            good = intake.submit(self.customer, [(self.product, 2)], "Home")
+            short = intake.submit(self.customer, [(self.product, 100)], "Home")
+            self.assertTrue(good.result(timeout=10))
+            with self.assertRaises(InsufficientStock):
+                short.result(timeout=10)
+            self.assertEqual(intake.batches, 1)
+        finally:
+            intake.close()
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT @@TRANCOUNT")
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.close()
+        # A separate connection sees the order only if the batch was committed
+        connection = self.backend.connect()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT COUNT(*) FROM orders WHERE customer_id = ?", (self.customer.get_customer_id(),))
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("SELECT stockQuantity FROM products WHERE product_id = ?", (self.product.get_product_id(),))
+            self.assertEqual(cursor.fetchone()[0], 3)
+        finally:
+            connection.close()
+
+
 if __name__== "__main__":
    unittest.main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+from benchmark.local_db import create_local_pool
+from dao.AsyncOrderProcessorRepositoryImpl import AsyncOrderProcessorRepositoryImpl
+from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from entity.customer import Customer
+from entity.product import Product
+from util.IdAllocator import IdAllocator, LocalCounterSource
+
+PRODUCTS = 1000
+CUSTOMERS = 200
+
+
+def seed(repository):
+    repository.bulk_create_customers(Customer(customer_id, "User", f"user{customer_id}@mail.com", "pw") for customer_id in range(1, CUSTOMERS + 1))
+    repository.bulk_create_products(Product(product_id, f"Item{product_id}", 9.99, "Generated", 10 ** 6) for product_id in range(1, PRODUCTS + 1))
+
+
+def operation(repository, i):
+    # Browse-heavy mix: three product lookups and one customer lookup for every cart write
+    kind = i % 5
+    if kind == 4:
+        return repository.add_to_cart, (Customer(i % CUSTOMERS + 1, "", "", ""), Product(i % PRODUCTS + 1, "", 9.99, "", 0), 1)
+    if kind == 3:
+        return repository.get_customer_by_id, (i % CUSTOMERS + 1,)
+    return repository.get_product_by_id, (i * 7 % PRODUCTS + 1,)
+
+
+def run_sync(repository, clients, operations):
+    # One thread per client, the only way the blocking repository serves concurrent callers
+    counter = iter(range(operations))
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            method, args = operation(repository, i)
+            method(*args)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return operations / (time.perf_counter() - started)
+
+
+def run_async(repository, clients, operations):
+    async def main():
+        counter = iter(range(operations))
+
+        async def client():
+            for i in counter:
+                method, args = operation(repository, i)
+                await method(*args)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return operations / (time.perf_counter() - started)
+
+    return asyncio.run(main())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync vs async repository throughput on a local SQLite database.")
+    parser.add_argument("--operations", type=int, default=5000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    pool = create_local_pool(directory, min_size=0, max_size=args.pool_size, timeout=60.0)
+    try:
+        repository = OrderProcessorRepositoryImpl(pool, IdAllocator(LocalCounterSource(pool)))
+        seed(repository)
+        async_repository = AsyncOrderProcessorRepositoryImpl(repository)
+        print(f"{'clients':>8} {'sync ops/s':>12} {'async ops/s':>12}")
+        for clients in args.clients:
+            sync_rate = run_sync(repository, clients, args.operations)
+            async_rate = run_async(async_repository, clients, args.operations)
+            print(f"{clients:>8} {sync_rate:>12,.0f} {async_rate:>12,.0f}")
+        async_repository.close()
+    finally:
+        pool.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+from benchmark.datagen import DataGenerator
+from benchmark.local_db import create_local_pool
+from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from entity.customer import Customer
+from entity.product import Product
+from util.IdAllocator import IdAllocator, LocalCounterSource
+from util.SchemaMigrator import SchemaMigrator
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dao_baseline.json")
+
+# Share of each operation in the mixed scenarios
+SCENARIOS = {
+    "browse_heavy": {"get_product_by_id": 60, "get_customer_by_id": 15, "get_all_from_cart": 15, "add_to_cart": 8,
+                     "place_order": 2},
+    "checkout_heavy": {"get_product_by_id": 20, "get_all_from_cart": 20, "add_to_cart": 25, "remove_product_from_cart": 10,
+                       "place_order": 20, "get_orders_by_customer": 5},
+}
+
+# Full-table reads run this many times fewer iterations than point operations
+SCAN_DIVISOR = 50
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "iterations": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        "ops_per_sec": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def measure(operation: Callable[[], object], iterations: int) -> Dict[str, float]:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        before = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - before)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+class Workload:
+    """Random, seeded calls of each repository method against generated data."""
+
+    def __init__(self, repository: OrderProcessorRepositoryImpl, generator: DataGenerator, seed: int):
+        self.repository = repository
+        self.generator = generator
+        self.rng = random.Random(seed)
+        self.next_customer_id = generator.customers + 1
+        self.next_product_id = generator.products + 1
+        self.created_customers: List[int] = []
+        self.created_products: List[int] = []
+
+    def customer(self) -> Customer:
+        return Customer(self.rng.randint(1, self.generator.customers), "", "", "")
+
+    def product(self) -> Product:
+        return Product(self.rng.randint(1, self.generator.products), "", 0, "", 0)
+
+    def create_customer(self):
+        customer_id = self.next_customer_id
+        self.next_customer_id += 1
+        self.created_customers.append(customer_id)
+        return self.repository.create_customer(Customer(customer_id, "Bench", f"bench{customer_id}@example.com", "pw"))
+
+    def create_product(self):
+        product_id = self.next_product_id
+        self.next_product_id += 1
+        self.created_products.append(product_id)
+        return self.repository.create_product(Product(product_id, f"Bench {product_id}", 9.99, "Benchmark product", 1000))
+
+    def delete_customer(self):
+        # Deletes what create_customer added, so the generated data set stays intact
+        if not self.created_customers:
+            self.create_customer()
+        return self.repository.delete_customer(self.created_customers.pop())
+
+    def delete_product(self):
+        if not self.created_products:
+            self.create_product()
+        return self.repository.delete_product(self.created_products.pop())
+
+    def add_to_cart(self):
+        return self.repository.add_to_cart(self.customer(), self.product(), self.rng.randint(1, 3))
+
+    def add_items_to_cart(self):
+        return self.repository.add_items_to_cart(self.customer(), self._lines())
+
+    def remove_product_from_cart(self):
+        return self.repository.remove_product_from_cart(self.customer().get_customer_id(), self.product().get_product_id())
+
+    def remove_products_from_cart(self):
+        return self.repository.remove_products_from_cart(self.customer().get_customer_id(),
+                                                         [self.product().get_product_id() for _ in range(4)])
+
+    def get_all_from_cart(self):
+        return self.repository.get_all_from_cart(self.customer())
+
+    def _lines(self):
+        lines = [(self.product(), self.rng.randint(1, 3)) for _ in range(self.rng.randint(1, 4))]
+        # One line per product, as a checkout page would send it
+        return list({product.get_product_id(): (product, quantity) for product, quantity in lines}.values())
+
+    def place_order(self):
+        return self.repository.place_order(self.customer(), self._lines(), "1 Bench Street")
+
+    def checkout_cart(self):
+        # Fills the cart first, so every checkout has lines to order; the time includes that add
+        customer = self.customer()
+        self.repository.add_items_to_cart(customer, self._lines())
+        return self.repository.checkout_cart(customer, "1 Bench Street")
+
+    def get_orders_by_customer(self):
+        return self.repository.get_orders_by_customer(self.customer().get_customer_id())
+
+    def get_customer_by_id(self):
+        return self.repository.get_customer_by_id(self.customer().get_customer_id())
+
+    def get_product_by_id(self):
+        return self.repository.get_product_by_id(self.product().get_product_id())
+
+    def get_products_by_ids(self):
+        return self.repository.get_products_by_ids([self.product().get_product_id() for _ in range(10)])
+
+    def get_all_customers(self):
+        return self.repository.get_all_customers()
+
+
+# Every OrderProcessorRepository method, in an order where deletes follow the creates they undo
+MICROBENCHMARKS = [
+    "create_customer", "create_product", "get_customer_by_id", "get_product_by_id", "get_products_by_ids", "add_to_cart",
+    "add_items_to_cart", "get_all_from_cart", "remove_product_from_cart", "remove_products_from_cart", "place_order",
+    "checkout_cart", "get_orders_by_customer", "get_all_customers", "delete_product", "delete_customer",
+]
+
+
+def run_scenario(workload: Workload, mix: Dict[str, int], operations: int) -> Dict[str, float]:
+    names = list(mix)
+    choices = workload.rng.choices(names, weights=[mix[name] for name in names], k=operations)
+    latencies = []
+    started = time.perf_counter()
+    for name in choices:
+        operation = getattr(workload, name)
+        before = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - before)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run(scale: int = 10_000, seed: int = 42, iterations: int = 500, operations: int = 2000,
+        only: Optional[List[str]] = None, directory: Optional[str] = None, out=sys.stdout) -> Dict:
+    owned = directory is None
+    directory = directory or tempfile.mkdtemp()
+    pool = create_local_pool(directory, min_size=0, max_size=4)
+    try:
+        SchemaMigrator(pool.backend).migrate()
+        generator = DataGenerator(scale, seed)
+        started = time.perf_counter()
+        with pool.connection() as connection:
+            counts = generator.populate(connection)
+        print(f"Generated {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s", file=out)
+
+        repository = OrderProcessorRepositoryImpl(pool, IdAllocator(LocalCounterSource(pool)))
+        workload = Workload(repository, generator, seed)
+        results = {}
+        for name in MICROBENCHMARKS:
+            if only and name not in only:
+                continue
+            count = max(iterations // SCAN_DIVISOR, 1) if name == "get_all_customers" else iterations
+            results[f"micro.{name}"] = measure(getattr(workload, name), count)
+            print(f"{'micro.' + name:<32} p50 {results['micro.' + name]['p50_ms']:>9.3f} ms", file=out)
+        for name, mix in SCENARIOS.items():
+            if only and name not in only:
+                continue
+            results[f"mix.{name}"] = run_scenario(workload, mix, operations)
+            print(f"{'mix.' + name:<32} {results['mix.' + name]['ops_per_sec']:>9,.0f} ops/s", file=out)
+        return {
+            "meta": {"scale": scale, "seed": seed, "iterations": iterations, "operations": operations, "rows": counts,
+                     "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "machine": platform.machine()},
+            "results": results,
+        }
+    finally:
+        pool.close()
+        if owned:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float = 0.25, min_delta_ms: float = 0.05) -> List[str]:
+    """Regressions of `current` against `baseline`: p95 latency up or throughput down by more than `tolerance`.
+
+    Latency changes smaller than `min_delta_ms` are ignored, so sub-millisecond
+    jitter on fast point lookups does not fail a run.
+    """
+    regressions = []
+    for name, before in baseline.get("results", {}).items():
+        after = current.get("results", {}).get(name)
+        if after is None:
+            continue
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance) and after["p95_ms"] - before["p95_ms"] >= min_delta_ms:
+            regressions.append(f"{name}: p95 {before['p95_ms']:.3f} ms -> {after['p95_ms']:.3f} ms")
+        if before["ops_per_sec"] and after["ops_per_sec"] < before["ops_per_sec"] * (1 - tolerance) \
+                and name.startswith("mix."):
+            regressions.append(f"{name}: throughput {before['ops_per_sec']:,.0f} -> {after['ops_per_sec']:,.0f} ops/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DAO microbenchmarks and mixed workloads on generated data (embedded SQLite).")
+    parser.add_argument("--scale", type=int, default=10_000, help="number of customers; other tables are sized from it")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=500, help="calls per microbenchmark")
+    parser.add_argument("--operations", type=int, default=2000, help="calls per mixed scenario")
+    parser.add_argument("--only", nargs="+", help="run only these methods or scenarios")
+    parser.add_argument("--output", help="write the results JSON to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before failing")
+    args = parser.parse_args(argv)
+
+    report = run(args.scale, args.seed, args.iterations, args.operations, args.only)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(json.dumps(report, indent=2))
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    if baseline.get("meta", {}).get("scale") != args.scale:
+        print(f"Baseline was recorded at scale {baseline.get('meta', {}).get('scale')}; comparison may not be meaningful.")
+    regressions = compare(report, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print("No regressions against the baseline." if not regressions else f"{len(regressions)} regression(s).")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
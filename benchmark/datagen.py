@@ -0,0 +1,103 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+from decimal import Decimal
+from typing import Dict, Iterator, Tuple
+
+ADJECTIVES = ["Classic", "Slim", "Leather", "Cotton", "Wireless", "Smart", "Vintage", "Sport", "Travel", "Organic"]
+NOUNS = ["Belt", "Shirt", "Watch", "Shoe", "Bag", "Lamp", "Mug", "Jacket", "Bottle", "Headphones"]
+STREETS = ["Main St", "Oak Ave", "MG Road", "Park Lane", "Hill Rd"]
+
+
+class DataGenerator:
+    """Seeded synthetic customers, products, carts and orders.
+
+    `scale` is the number of customers; the other tables are sized from it
+    (products = scale / 2, cart lines = scale, orders = scale / 2 with
+    ~4 lines each), so scale 10_000 .. 10_000_000 covers the usual range.
+    Rows are generated lazily, so memory does not grow with the scale.
+    """
+
+    def __init__(self, scale: int = 10_000, seed: int = 42):
+        self.scale = scale
+        self.seed = seed
+        self.customers = max(scale, 1)
+        self.products = max(scale // 2, 1)
+        self.cart_lines = max(scale, 1)
+        self.orders = max(scale // 2, 1)
+        self.lines_per_order = 4
+
+    def _rng(self, table: str) -> random.Random:
+        # Independent stream per table so each table is reproducible on its own
+        return random.Random(f"{self.seed}:{table}")
+
+    def customer_rows(self) -> Iterator[Tuple]:
+        for customer_id in range(1, self.customers + 1):
+            yield customer_id, f"User{customer_id}"[:20], f"user{customer_id}@example.com", f"pw{customer_id}"
+
+    def product_rows(self) -> Iterator[Tuple]:
+        rng = self._rng("products")
+        for product_id in range(1, self.products + 1):
+            name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {product_id}"[:30]
+            price = Decimal(rng.randint(99, 99_999)).scaleb(-2)
+            yield product_id, name, price, f"{name} generated for benchmarks", rng.randint(10 ** 5, 10 ** 6)
+
+    def cart_rows(self) -> Iterator[Tuple]:
+        # Distinct (customer, product) pairs: a customer's lines use consecutive products
+        rng = self._rng("cart")
+        cart_id = 0
+        customer_id = 0
+        while cart_id < self.cart_lines:
+            customer_id = customer_id % self.customers + 1
+            first = rng.randint(1, self.products)
+            for offset in range(min(rng.randint(1, 3), self.products)):
+                if cart_id >= self.cart_lines:
+                    break
+                cart_id += 1
+                yield cart_id, customer_id, (first + offset - 1) % self.products + 1, rng.randint(1, 5)
+
+    def order_rows(self) -> Iterator[Tuple]:
+        rng = self._rng("orders")
+        for order_id in range(1, self.orders + 1):
+            order_date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            total = Decimal(rng.randint(999, 999_999)).scaleb(-2)
+            yield order_id, rng.randint(1, self.customers), order_date, total, f"{rng.randint(1, 999)} {rng.choice(STREETS)}"
+
+    def order_item_rows(self) -> Iterator[Tuple]:
+        rng = self._rng("order_items")
+        order_item_id = 0
+        for order_id in range(1, self.orders + 1):
+            for _ in range(self.lines_per_order):
+                order_item_id += 1
+                yield order_item_id, order_id, rng.randint(1, self.products), rng.randint(1, 3)
+
+    def populate(self, connection, chunk_size: int = 10_000) -> Dict[str, int]:
+        statements = [
+            ("customers", "INSERT INTO customers (customer_id, name, email, password) VALUES (?, ?, ?, ?)", self.customer_rows()),
+            ("products", "INSERT INTO products (product_id, name, price, description, stockQuantity) VALUES (?, ?, ?, ?, ?)",
+             self.product_rows()),
+            ("cart", "INSERT INTO cart (cart_id, customer_id, product_id, quantity) VALUES (?, ?, ?, ?)", self.cart_rows()),
+            ("orders", "INSERT INTO orders (order_id, customer_id, order_date, total_price, shipping_address) VALUES (?, ?, ?, ?, ?)",
+             self.order_rows()),
+            ("order_items", "INSERT INTO order_items (order_item_id, order_id, product_id, quantity) VALUES (?, ?, ?, ?)",
+             self.order_item_rows()),
+        ]
+        counts = {}
+        cursor = connection.cursor()
+        if hasattr(cursor, "fast_executemany"):
+            cursor.fast_executemany = True
+        try:
+            for table, sql, rows in statements:
+                counts[table] = 0
+                while True:
+                    chunk = [row for _, row in zip(range(chunk_size), rows)]
+                    if not chunk:
+                        break
+                    cursor.executemany(sql, chunk)
+                    counts[table] += len(chunk)
+                connection.commit()
+        finally:
+            cursor.close()
+        return counts
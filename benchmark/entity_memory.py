@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import gc
+import tracemalloc
+from entity.product import Product
+from entity.product_batch import ProductBatch
+
+
+class DictProduct:
+    # The pre-__slots__ layout of entity.Product (per-instance __dict__), kept here for comparison
+    def __init__(self, product_id, name, price, description, stockQuantity):
+        self.__product_id = product_id
+        self.__name = name
+        self.__price = price
+        self.__description = description
+        self.__stockQuantity = stockQuantity
+
+
+def rows(count):
+    # Shared strings, so only the per-row containers and numbers are measured
+    for product_id in range(1, count + 1):
+        yield product_id, "Item", 10.0 + product_id % 1000 / 100, "Generated product", product_id % 500
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    holder = build(rows(count))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del holder
+    return (after - before) / count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bytes per row for product representations.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    results = {
+        "dict-backed Product (before)": measure(lambda source: [DictProduct(*row) for row in source], args.rows),
+        "__slots__ Product (after)": measure(lambda source: [Product(*row) for row in source], args.rows),
+        "ProductBatch (columnar)": measure(ProductBatch.from_rows, args.rows),
+    }
+    print(f"{args.rows:,} products")
+    for label, bytes_per_row in results.items():
+        print(f"  {label:<30} {bytes_per_row:8.1f} bytes/row")
+
+
+if __name__ == "__main__":
+    main()
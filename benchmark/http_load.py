@@ -0,0 +1,135 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import shutil
+import subprocess
+import tempfile
+import time
+from urllib.parse import urlsplit
+from benchmark.dao_bench import summarize
+
+PRODUCTS = 1000
+CUSTOMERS = 200
+
+
+def default_paths():
+    # Browse-heavy mix: three product reads for every customer read, and a product page now and then
+    paths = []
+    for i in range(200):
+        paths.append(f"/customers/{i % CUSTOMERS + 1}" if i % 4 == 3 else f"/products/{i * 7 % PRODUCTS + 1}")
+    paths[::50] = ["/products?page_size=20"] * len(paths[::50])
+    return paths
+
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return int(head[9:12])
+
+
+async def connection(host: str, port: int, paths, depth: int, deadline: float, offset: int, latencies, statuses):
+    # Keeps `depth` requests in flight on one keep-alive connection; responses come back in request order
+    reader, writer = await asyncio.open_connection(host, port)
+    requests = [f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("ascii") for path in paths]
+    sent = []
+    i = offset
+    try:
+        while True:
+            now = time.perf_counter()
+            while len(sent) < depth and now < deadline:
+                writer.write(requests[i % len(requests)])
+                sent.append(now)
+                i += 1
+            if not sent:
+                return
+            await writer.drain()
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - sent.pop(0))
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(url: str, connections: int, depth: int, duration: float, paths):
+    parts = urlsplit(url)
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(connection(parts.hostname, parts.port or 80, paths, depth, deadline, n * 17, latencies, statuses)
+                           for n in range(connections)))
+    return summarize(latencies, time.perf_counter() - started), statuses, len(latencies)
+
+
+def start_local_server(directory: str, port: int, workers: int) -> subprocess.Popen:
+    # Seeded SQLite database served by main/server.py in its own process(es)
+    from benchmark.local_db import create_local_pool
+    from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+    from entity.customer import Customer
+    from entity.product import Product
+    from util.IdAllocator import IdAllocator, LocalCounterSource
+    from util.SchemaMigrator import SchemaMigrator
+
+    pool = create_local_pool(directory, min_size=0, max_size=1)
+    SchemaMigrator(pool.backend).migrate()
+    repository = OrderProcessorRepositoryImpl(pool, IdAllocator(LocalCounterSource(pool)))
+    repository.bulk_create_customers(Customer(customer_id, "User", f"user{customer_id}@mail.com", "pw") for customer_id in range(1, CUSTOMERS + 1))
+    repository.bulk_create_products(Product(product_id, f"Item{product_id}", 9.99, "Generated", 10 ** 6) for product_id in range(1, PRODUCTS + 1))
+    pool.close()
+
+    environment = dict(os.environ, ECOM_DB_BACKEND="sqlite", ECOM_SQLITE_PATH=os.path.join(directory, "bench.db"))
+    server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main", "server.py"),
+                               "--port", str(port), "--workers", str(workers), "--no-search"],
+                              env=environment, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            asyncio.run(run(f"http://127.0.0.1:{port}", 1, 1, 0.01, ["/health"]))
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("The local server did not start.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load generator: keep-alive connections with pipelined GETs.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--pipeline", type=int, default=1, help="requests in flight per connection")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--path", action="append", dest="paths", help="path to request (repeatable; default: product/customer mix)")
+    parser.add_argument("--local", action="store_true", help="start main/server.py on a seeded SQLite database first")
+    parser.add_argument("--workers", type=int, default=1, help="server workers with --local")
+    args = parser.parse_args(argv)
+
+    directory = server = None
+    url = args.url
+    if args.local:
+        directory = tempfile.mkdtemp()
+        port = urlsplit(url).port or 8080
+        server = start_local_server(directory, port, args.workers)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        stats, statuses, requests = asyncio.run(run(url, args.connections, args.pipeline, args.duration, args.paths or default_paths()))
+        print(f"{requests:,} requests in {args.duration:.0f}s over {args.connections} connections (pipeline {args.pipeline})")
+        print(f"{stats['ops_per_sec']:,.0f} req/s  p50 {stats['p50_ms']:.2f} ms  p95 {stats['p95_ms']:.2f} ms  p99 {stats['p99_ms']:.2f} ms")
+        print("status " + "  ".join(f"{status}: {count:,}" for status, count in sorted(statuses.items())))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from util.DatabaseBackend import SqliteBackend
+from util.SchemaBootstrapper import SchemaBootstrapper
+from util.SchemaMigrator import HOT_QUERIES, SchemaMigrator
+
+
+def generate(connection, rows, seed=42):
+    # rows cart lines and rows order lines spread over rows/20 customers and rows/4 orders
+    rng = random.Random(seed)
+    customers = max(rows // 20, 1)
+    products = max(rows // 100, 1)
+    orders = max(rows // 4, 1)
+    connection.executemany("INSERT INTO customers VALUES (?, ?, ?, ?)",
+                           ((i, "User", f"user{i}@mail.com", "pw") for i in range(1, customers + 1)))
+    connection.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?)",
+                           ((i, f"Item{i}", "9.99", "Generated product", 100) for i in range(1, products + 1)))
+    # Distinct (customer, product) pairs so the data is valid under the unique cart index
+    connection.executemany("INSERT INTO cart VALUES (?, ?, ?, ?)",
+                           ((i, (i - 1) % customers + 1, (i - 1) // customers % products + 1, 1) for i in range(1, rows + 1)))
+    connection.executemany("INSERT INTO orders VALUES (?, ?, DATE('now'), ?, ?)",
+                           ((i, rng.randint(1, customers), "19.98", "1 Main St") for i in range(1, orders + 1)))
+    connection.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?)",
+                           ((i, (i - 1) // 4 + 1, rng.randint(1, products), 2) for i in range(1, rows + 1)))
+    connection.commit()
+    return customers, products
+
+
+def time_queries(connection, customers, products, repeats, seed=7):
+    rng = random.Random(seed)
+    timings = {}
+    for name, sql, _, _ in HOT_QUERIES:
+        if sql.startswith("DELETE"):
+            # Measure the lookup the DELETE needs without destroying the dataset
+            sql = sql.replace("DELETE FROM cart", "SELECT cart_id FROM cart")
+        started = time.perf_counter()
+        for _ in range(repeats):
+            params = (rng.randint(1, customers),) if sql.count("?") == 1 else (rng.randint(1, customers), rng.randint(1, products))
+            connection.execute(sql, params).fetchall()
+        timings[name] = (time.perf_counter() - started) / repeats * 1000
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hot query latency before and after the index migrations.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    try:
+        backend = SqliteBackend(os.path.join(directory, "indexes.db"))
+        SchemaBootstrapper(backend).create_all()
+        connection = backend.connect()
+        started = time.perf_counter()
+        customers, products = generate(connection, args.rows)
+        print(f"Generated {args.rows:,} cart lines and order lines in {time.perf_counter() - started:.1f}s")
+
+        before = time_queries(connection, customers, products, args.repeats)
+        SchemaMigrator(backend).migrate(connection)
+        after = time_queries(connection, customers, products, args.repeats)
+        connection.close()
+
+        print(f"{'query':<26} {'before ms':>10} {'after ms':>10} {'speedup':>9}")
+        for name in before:
+            print(f"{name:<26} {before[name]:>10.3f} {after[name]:>10.3f} {before[name] / max(after[name], 1e-9):>8.0f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
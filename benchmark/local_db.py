@@ -0,0 +1,14 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.ConnectionPool import ConnectionPool
+from util.DatabaseBackend import SqliteBackend
+from util.SchemaBootstrapper import SchemaBootstrapper
+
+
+def create_local_pool(directory: str, **settings) -> ConnectionPool:
+    # Fresh embedded SQLite database with the application schema, for benchmarks that must run without SQL Server
+    backend = SqliteBackend(os.path.join(directory, "bench.db"))
+    SchemaBootstrapper(backend).create_all()
+    return ConnectionPool.for_backend(backend, **settings)
@@ -0,0 +1,94 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+from benchmark.dao_bench import summarize
+from dao.OrderIntake import OrderIntake
+from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from entity.customer import Customer
+from entity.product import Product
+from util.ConnectionPool import ConnectionPool
+from util.DatabaseBackend import SqliteBackend
+from util.IdAllocator import IdAllocator, SequenceTableSource
+from util.SchemaBootstrapper import SchemaBootstrapper
+from util.SchemaMigrator import SchemaMigrator
+
+PRODUCTS = 1000
+CUSTOMERS = 200
+
+
+def create_repository(directory: str, pool_size: int) -> OrderProcessorRepositoryImpl:
+    # synchronous=FULL so every database commit is as durable as an intake log append
+    backend = SqliteBackend(os.path.join(directory, "bench.db"), {"synchronous": "FULL"})
+    SchemaBootstrapper(backend).create_all()
+    SchemaMigrator(backend).migrate()
+    pool = ConnectionPool.for_backend(backend, min_size=0, max_size=pool_size, timeout=60.0)
+    repository = OrderProcessorRepositoryImpl(pool, IdAllocator(SequenceTableSource(pool)))
+    repository.bulk_create_customers(Customer(customer_id, "User", f"user{customer_id}@mail.com", "pw") for customer_id in range(1, CUSTOMERS + 1))
+    repository.bulk_create_products(Product(product_id, f"Item{product_id}", 9.99, "Generated", 10 ** 6) for product_id in range(1, PRODUCTS + 1))
+    return repository
+
+
+def run(place_order, clients: int, orders: int):
+    # `clients` threads place `orders` two-line orders between them
+    counter = iter(range(orders))
+    lock = threading.Lock()
+    latencies = []
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            customer = Customer(i % CUSTOMERS + 1, "", "", "")
+            lines = [(Product(i % PRODUCTS + 1, "", 9.99, "", 0), 1), (Product(i * 7 % PRODUCTS + 1, "", 9.99, "", 0), 2)]
+            before = time.perf_counter()
+            if not place_order(customer, lines, "Bench Street"):
+                raise RuntimeError("An order failed.")
+            latencies.append(time.perf_counter() - before)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="place_order with a commit per order vs group commits through the order intake.")
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--max-delay-ms", type=float, default=5.0)
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    repository = create_repository(directory, args.pool_size)
+    try:
+        print(f"{'clients':>8} {'mode':<8} {'orders/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'orders/commit':>14}")
+        for clients in args.clients:
+            stats = run(repository.place_order, clients, args.orders)
+            print(f"{clients:>8} {'direct':<8} {stats['ops_per_sec']:>10,.0f} {stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} {1:>14.1f}")
+            intake = OrderIntake(repository, os.path.join(directory, "orders.wal"), args.batch_size, args.max_delay_ms / 1000)
+            try:
+                stats = run(intake.place_order, clients, args.orders)
+            finally:
+                intake.close()
+            print(f"{clients:>8} {'intake':<8} {stats['ops_per_sec']:>10,.0f} {stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+                  f"{intake.orders / max(intake.batches, 1):>14.1f}")
+    finally:
+        repository.pool.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from entity.product_batch import to_cents
+from util.PricingEngine import CartLines, PricingEngine
+
+CENT = Decimal("0.01")
+
+
+def generate(carts, lines_per_cart, seed=42):
+    rng = random.Random(seed)
+    return [[(rng.randint(1, 10_000), Decimal(rng.randint(99, 99_999)).scaleb(-2), rng.randint(1, 5))
+             for _ in range(rng.randint(1, 2 * lines_per_cart - 1))] for _ in range(carts)]
+
+
+def decimal_loop(carts, tax_bp, promotions):
+    # One cart at a time with Decimal arithmetic, rounding like the engine
+    totals = []
+    for lines in carts:
+        taxable = Decimal(0)
+        for product_id, price, quantity in lines:
+            line = price * quantity
+            taxable += line - (line * promotions.get(product_id, 0) / 10000).quantize(CENT, rounding=ROUND_HALF_UP)
+        totals.append(taxable + (taxable * tax_bp / 10000).quantize(CENT, rounding=ROUND_HALF_UP))
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-cart Decimal pricing vs the columnar integer-cents engine.")
+    parser.add_argument("--carts", type=int, default=10_000)
+    parser.add_argument("--lines", type=int, default=5, help="average lines per cart")
+    args = parser.parse_args(argv)
+
+    carts = generate(args.carts, args.lines)
+    promotions = {product_id: 1000 for product_id in range(1, 10_001, 7)}
+    engine = PricingEngine(tax_rate_bp=1800, promotions=promotions)
+
+    started = time.perf_counter()
+    expected = decimal_loop(carts, 1800, promotions)
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    lines = CartLines()
+    for index, cart in enumerate(carts):
+        for product_id, price, quantity in cart:
+            lines.add_line(product_id, to_cents(price), quantity)
+        lines.end_cart(index)
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    priced = engine.price(lines)
+    price_seconds = time.perf_counter() - started
+
+    assert [priced.get_total(index) for index in range(len(priced))] == expected
+    print(f"{'Decimal loop':<28} {loop_seconds * 1000:>9.1f} ms")
+    print(f"{'engine: load columns':<28} {load_seconds * 1000:>9.1f} ms")
+    print(f"{'engine: price':<28} {price_seconds * 1000:>9.1f} ms  ({args.carts / price_seconds:,.0f} carts/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import shutil
+import string
+import tempfile
+import time
+from itertools import islice
+from dao.ProductSearchIndex import ProductSearchIndex
+from benchmark.dao_bench import summarize
+
+COLORS = ["red", "blue", "green", "black", "white", "grey", "navy", "olive", "pink", "yellow", "orange", "purple"]
+MATERIALS = ["cotton", "linen", "wool", "leather", "steel", "oak", "bamboo", "ceramic", "glass", "denim", "silk", "copper"]
+NOUNS = ["shirt", "jeans", "jacket", "lamp", "table", "chair", "mug", "bottle", "backpack", "wallet", "scarf", "boots",
+         "kettle", "pan", "knife", "desk", "shelf", "rug", "pillow", "blanket", "watch", "headphones", "speaker", "charger"]
+
+
+def words(rng: random.Random, count: int):
+    return ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))) for _ in range(count)]
+
+
+def generate(products: int, seed: int = 42):
+    # (product_id, name, price, description, stock) rows: brand + colour + material + noun names, free-text descriptions
+    rng = random.Random(seed)
+    brands = words(rng, max(products // 200, 50))
+    vocabulary = words(rng, 20_000)
+    for product_id in range(1, products + 1):
+        name = f"{rng.choice(brands)} {rng.choice(COLORS)} {rng.choice(MATERIALS)} {rng.choice(NOUNS)}"
+        description = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(6, 12)))
+        yield product_id, name, rng.randint(99, 99_999) / 100, description, rng.randint(0, 50)
+
+
+def queries(products: int, count: int, seed: int = 7):
+    # Brand or descriptive lookups for indexed products, some typed as prefixes, some with filters
+    rng = random.Random(seed)
+    generated = list(islice(generate(products), 10_000))
+    for _ in range(count):
+        _, name, _, description, _ = rng.choice(generated)
+        brand, color, material, noun = name.split()
+        kind = rng.randrange(4)
+        if kind == 0:
+            yield f"{brand} {noun}", {}
+        elif kind == 1:
+            yield f"{color} {material} {noun} {brand[:3]}", {}
+        elif kind == 2:
+            yield f"{rng.choice(description.split())} {noun[:4]}", {"max_price": 500}
+        else:
+            yield f"{brand} {color}", {"min_stock": 1}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build, save and memory-map a product search index, then time queries.")
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "products.idx")
+        index = ProductSearchIndex()
+        started = time.perf_counter()
+        for row in generate(args.products):
+            index.add_row(*row)
+        print(f"{'build':<12} {time.perf_counter() - started:>9.1f} s")
+        started = time.perf_counter()
+        index.save(path)
+        index.close()
+        print(f"{'save':<12} {time.perf_counter() - started:>9.1f} s  ({os.path.getsize(path) / 2 ** 20:.0f} MiB)")
+
+        started = time.perf_counter()
+        index = ProductSearchIndex.open(path)
+        print(f"{'open (mmap)':<12} {(time.perf_counter() - started) * 1000:>9.2f} ms")
+        latencies = []
+        matched = 0
+        workload = list(queries(args.products, args.queries))
+        started = time.perf_counter()
+        for query, filters in workload:
+            before = time.perf_counter()
+            matched += bool(index.search(query, 20, **filters))
+            latencies.append(time.perf_counter() - before)
+        stats = summarize(latencies, time.perf_counter() - started)
+        print(f"{'query':<12} p50 {stats['p50_ms']:.3f} ms  p95 {stats['p95_ms']:.3f} ms  p99 {stats['p99_ms']:.3f} ms  "
+              f"({matched}/{len(workload)} with hits)")
+        index.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from benchmark.datagen import DataGenerator
+from benchmark.local_db import create_local_pool
+from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from entity.customer import Customer
+from util.DBConnection import DBConnection
+from util.IdAllocator import IdAllocator, LocalCounterSource
+
+
+def cursor_per_call(pool, customer_id):
+    # get_customer_by_id as it was before the statement registry: a new cursor and SQL text on every call
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT * FROM customers WHERE customer_id = ?", (customer_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    return Customer(row[0], row[1], row[2], row[3]) if row else None
+
+
+def time_lookups(lookup, customer_ids):
+    started = time.perf_counter()
+    for customer_id in customer_ids:
+        lookup(customer_id)
+    return (time.perf_counter() - started) / len(customer_ids) * 1_000_000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Repeated get_customer_by_id with a cursor per call vs cached statement cursors.")
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--sqlserver", action="store_true",
+                        help="read the configured SQL Server database instead of a generated SQLite one (read-only)")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    if args.sqlserver:
+        # pyodbc prepares per cursor, so this is where reusing the cursor saves the re-prepare
+        pool = DBConnection.get_pool()
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT MAX(customer_id) FROM customers")
+            args.customers = cursor.fetchone()[0] or 1
+            cursor.close()
+    else:
+        # sqlite3 already caches prepared statements per connection by SQL text; expect a small difference here
+        pool = create_local_pool(directory, min_size=1, max_size=1)
+        with pool.connection() as connection:
+            DataGenerator(args.customers).populate(connection)
+    try:
+        repository = OrderProcessorRepositoryImpl(pool, IdAllocator(LocalCounterSource(pool)))
+        rng = random.Random(1)
+        customer_ids = [rng.randint(1, args.customers) for _ in range(args.lookups)]
+
+        # Best of several rounds, alternating, so both paths see the same warm page cache
+        before, after = [], []
+        for _ in range(args.rounds):
+            before.append(time_lookups(lambda customer_id: cursor_per_call(pool, customer_id), customer_ids))
+            after.append(time_lookups(repository.get_customer_by_id, customer_ids))
+        print(f"{'cursor per call':<24} {min(before):>8.2f} us/lookup")
+        print(f"{'cached statement cursor':<24} {min(after):>8.2f} us/lookup")
+        print(f"{'speedup':<24} {min(before) / min(after):>8.2f}x")
+    finally:
+        pool.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Dict, Optional, Tuple
+from entity.customer import Customer
+from entity.product import Product
+from entity.order import Order
+
+class AsyncOrderProcessorRepository(ABC):
+    @abstractmethod
+    async def create_customer(self, customer: Customer) -> bool:
+        pass
+
+    @abstractmethod
+    async def create_product(self, product: Product) -> bool:
+        pass
+
+    @abstractmethod
+    async def delete_product(self, product_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def delete_customer(self, customer_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def add_to_cart(self, customer: Customer, product: Product, quantity: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def add_items_to_cart(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]]) -> bool:
+        pass
+
+    @abstractmethod
+    async def remove_product_from_cart(self, customer_id: int, product_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def remove_products_from_cart(self, customer_id: int, product_ids: Iterable[int]) -> int:
+        pass
+
+    @abstractmethod
+    async def get_all_from_cart(self, customer: Customer) -> List[Dict[Product, int]]:
+        pass
+
+    @abstractmethod
+    async def place_order(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]], shipping_address: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def checkout_cart(self, customer: Customer, shipping_address: str) -> Optional[Order]:
+        pass
+
+    @abstractmethod
+    async def get_orders_by_customer(self, customer_id: int) -> Dict[Product, int]:
+        pass
+
+    @abstractmethod
+    async def get_customer_by_id(self, customer_id: int) -> Optional[Customer]:
+        pass
+
+    @abstractmethod
+    async def get_product_by_id(self, product_id: int) -> Optional[Tuple[int, str, float, str, int]]:
+        pass
+
+    @abstractmethod
+    async def get_products_by_ids(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        pass
+
+    @abstractmethod
+    async def get_all_customers(self) -> List[Customer]:
+        pass
@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import date
+from typing import Iterable, List, Dict, Optional, Tuple
+from dao.AsyncOrderProcessorRepository import AsyncOrderProcessorRepository
+from dao.OrderProcessorRepository import OrderProcessorRepository
+from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from entity.customer import Customer
+from entity.product import Product
+from entity.order import Order
+
+class AsyncOrderProcessorRepositoryImpl(AsyncOrderProcessorRepository):
+    """Non-blocking facade over a synchronous repository.
+
+    pyodbc has no async API, so each call runs on a bounded thread executor
+    sized to the connection pool; the event loop only awaits the result and
+    can keep any number of operations in flight while at most `max_workers`
+    of them hold a database connection.
+    """
+
+    def __init__(self, repository: Optional[OrderProcessorRepository] = None, max_workers: Optional[int] = None):
+        self.repository = repository if repository is not None else OrderProcessorRepositoryImpl()
+        if max_workers is None:
+            pool = getattr(self.repository, "pool", None)
+            max_workers = pool.max_size if pool is not None else 10
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ecom-db")
+
+    async def _run(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(method, *args))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    async def create_customer(self, customer: Customer) -> bool:
+        return await self._run(self.repository.create_customer, customer)
+
+    async def create_product(self, product: Product) -> bool:
+        return await self._run(self.repository.create_product, product)
+
+    async def delete_product(self, product_id: int) -> bool:
+        return await self._run(self.repository.delete_product, product_id)
+
+    async def delete_customer(self, customer_id: int) -> bool:
+        return await self._run(self.repository.delete_customer, customer_id)
+
+    async def add_to_cart(self, customer: Customer, product: Product, quantity: int) -> bool:
+        return await self._run(self.repository.add_to_cart, customer, product, quantity)
+
+    async def add_items_to_cart(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]]) -> bool:
+        return await self._run(self.repository.add_items_to_cart, customer, product_quantity_map)
+
+    async def remove_product_from_cart(self, customer_id: int, product_id: int) -> bool:
+        return await self._run(self.repository.remove_product_from_cart, customer_id, product_id)
+
+    async def remove_products_from_cart(self, customer_id: int, product_ids: Iterable[int]) -> int:
+        return await self._run(self.repository.remove_products_from_cart, customer_id, list(product_ids))
+
+    async def get_all_from_cart(self, customer: Customer) -> List[Dict[Product, int]]:
+        return await self._run(self.repository.get_all_from_cart, customer)
+
+    async def place_order(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]], shipping_address: str) -> bool:
+        return await self._run(self.repository.place_order, customer, product_quantity_map, shipping_address)
+
+    async def checkout_cart(self, customer: Customer, shipping_address: str) -> Optional[Order]:
+        return await self._run(self.repository.checkout_cart, customer, shipping_address)
+
+    async def get_orders_by_customer(self, customer_id: int) -> Dict[Product, int]:
+        return await self._run(self.repository.get_orders_by_customer, customer_id)
+
+    async def get_customer_by_id(self, customer_id: int) -> Optional[Customer]:
+        return await self._run(self.repository.get_customer_by_id, customer_id)
+
+    async def get_product_by_id(self, product_id: int) -> Optional[Tuple[int, str, float, str, int]]:
+        return await self._run(self.repository.get_product_by_id, product_id)
+
+    async def get_products_by_ids(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        return await self._run(self.repository.get_products_by_ids, list(product_ids))
+
+    async def get_all_customers(self) -> List[Customer]:
+        return await self._run(self.repository.get_all_customers)
+
+    async def get_all_products(self) -> List[Product]:
+        return await self._run(self.repository.get_all_products)
+
+    async def update_customer(self, customer: Customer) -> bool:
+        return await self._run(self.repository.update_customer, customer)
+
+    async def get_customers_page(self, page_size: int = 50, after_id: Optional[int] = None) -> Tuple[List[Customer], Optional[int]]:
+        return await self._run(self.repository.get_customers_page, page_size, after_id)
+
+    async def get_products_page(self, page_size: int = 50, after_id: Optional[int] = None) -> Tuple[List[Product], Optional[int]]:
+        return await self._run(self.repository.get_products_page, page_size, after_id)
+
+    async def get_order_history_page(self, customer_id: int, page_size: int = 20, after_order_id: Optional[int] = None,
+                                     start_date: Optional[date] = None, end_date: Optional[date] = None) -> Tuple[List[Order], Optional[int]]:
+        return await self._run(self.repository.get_order_history_page, customer_id, page_size, after_order_id, start_date, end_date)
+
+    async def search_products(self, query: str, limit: int = 20, min_price=None, max_price=None,
+                              min_stock: Optional[int] = None) -> List[Product]:
+        return await self._run(self.repository.search_products, query, limit, min_price, max_price, min_stock)
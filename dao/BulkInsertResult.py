@@ -0,0 +1,16 @@
+from typing import List, Tuple
+
+
+class BulkInsertResult:
+    def __init__(self):
+        self.inserted = 0
+        self.errors: List[Tuple[int, str]] = []  # (0-based position in the input, error message)
+
+    def get_failed(self) -> int:
+        return len(self.errors)
+
+    def add_error(self, index: int, message: str):
+        self.errors.append((index, message))
+
+    def __repr__(self):
+        return f"BulkInsertResult(inserted={self.inserted}, failed={len(self.errors)})"
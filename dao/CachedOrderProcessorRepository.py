@@ -0,0 +1,164 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dao.OrderProcessorRepository import OrderProcessorRepository
+from typing import Iterable, List, Dict, Optional, Tuple
+from entity.customer import Customer
+from entity.product import Product
+from entity.order import Order
+from util.LRUCache import LRUCache
+
+class CachedOrderProcessorRepository(OrderProcessorRepository):
+    """Read-through product catalog cache in front of another repository.
+
+    Product lookups are served from an LRU/TTL cache; every write that can
+    change a product row (create, delete, stock decrement in place_order)
+    invalidates the affected entries so stock checks never see stale data
+    written through this process.
+    """
+
+    ALL_PRODUCTS = "__all_products__"
+
+    def __init__(self, repository: OrderProcessorRepository, max_entries: int = 10000, ttl: Optional[float] = 60.0,
+                 cache: Optional[LRUCache] = None):
+        self.repository = repository
+        self.cache = cache if cache is not None else LRUCache(max_entries=max_entries, ttl=ttl)
+
+    def __getattr__(self, name):
+        # Anything the cache does not care about goes straight to the wrapped repository
+        return getattr(self.repository, name)
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self.cache.stats()
+
+    def invalidate_product(self, product_id: int):
+        self.cache.invalidate(product_id)
+        self.cache.invalidate(self.ALL_PRODUCTS)
+
+    def create_customer(self, customer: Customer) -> bool:
+        return self.repository.create_customer(customer)
+
+    def create_product(self, product: Product) -> bool:
+        try:
+            return self.repository.create_product(product)
+        finally:
+            self.invalidate_product(product.get_product_id())
+
+    def bulk_create_products(self, products, chunk_size: int = 1000, progress=None):
+        try:
+            return self.repository.bulk_create_products(products, chunk_size, progress)
+        finally:
+            self.cache.clear()
+
+    def delete_product(self, product_id: int) -> bool:
+        try:
+            return self.repository.delete_product(product_id)
+        finally:
+            self.invalidate_product(product_id)
+
+    def delete_customer(self, customer_id: int) -> bool:
+        return self.repository.delete_customer(customer_id)
+
+    def add_to_cart(self, customer: Customer, product: Product, quantity: int) -> bool:
+        return self.repository.add_to_cart(customer, product, quantity)
+
+    def add_items_to_cart(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]]) -> bool:
+        return self.repository.add_items_to_cart(customer, product_quantity_map)
+
+    def remove_product_from_cart(self, customer_id: int, product_id: int) -> bool:
+        return self.repository.remove_product_from_cart(customer_id, product_id)
+
+    def remove_products_from_cart(self, customer_id: int, product_ids: Iterable[int]) -> int:
+        return self.repository.remove_products_from_cart(customer_id, product_ids)
+
+    def get_all_from_cart(self, customer: Customer) -> List[Dict[Product, int]]:
+        return self.repository.get_all_from_cart(customer)
+
+    def place_order(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]], shipping_address: str) -> bool:
+        try:
+            return self.repository.place_order(customer, product_quantity_map, shipping_address)
+        finally:
+            # Stock changed (or may have, if the commit outcome is unknown)
+            for product, _ in product_quantity_map:
+                self.cache.invalidate(product.get_product_id())
+            self.cache.invalidate(self.ALL_PRODUCTS)
+
+    def checkout_cart(self, customer: Customer, shipping_address: str) -> Optional[Order]:
+        order = None
+        try:
+            order = self.repository.checkout_cart(customer, shipping_address)
+            return order
+        finally:
+            if order is None:
+                self.cache.clear()  # which products the cart held is unknown here, and the outcome may be too
+            else:
+                for item in order.get_items():
+                    self.cache.invalidate(item.get_product_id())
+                self.cache.invalidate(self.ALL_PRODUCTS)
+
+    def update_columns(self, customers: Optional[Dict[int, Dict[str, object]]] = None,
+                       products: Optional[Dict[int, Dict[str, object]]] = None) -> bool:
+        try:
+            return self.repository.update_columns(customers, products)
+        finally:
+            for product_id in products or {}:
+                self.cache.invalidate(product_id)
+            if products:
+                self.cache.invalidate(self.ALL_PRODUCTS)
+
+    def get_orders_by_customer(self, customer_id: int) -> Dict[Product, int]:
+        return self.repository.get_orders_by_customer(customer_id)
+
+    def get_customer_by_id(self, customer_id: int) -> Optional[Customer]:
+        return self.repository.get_customer_by_id(customer_id)
+
+    def get_product_by_id(self, product_id: int) -> Optional[Tuple[int, str, float, str, int]]:
+        row = self.cache.get(product_id)
+        if row is None:
+            generation = self.cache.generation
+            row = self.repository.get_product_by_id(product_id)
+            if row is not None:
+                row = tuple(row)
+                self.cache.put(product_id, row, generation=generation)
+        return row
+
+    def get_products_by_ids(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        # Cached products are served from memory; the rest are read in one query and cached
+        product_ids = list(dict.fromkeys(product_ids))
+        products = {}
+        missing = []
+        for product_id in product_ids:
+            row = self.cache.get(product_id)
+            if row is None:
+                missing.append(product_id)
+            else:
+                products[product_id] = Product(*row)
+        if missing:
+            generation = self.cache.generation
+            for product_id, product in self.repository.get_products_by_ids(missing).items():
+                self.cache.put(product_id, self._row(product), generation=generation)
+                products[product_id] = product
+        return {product_id: products[product_id] for product_id in product_ids if product_id in products}
+
+    def get_all_customers(self) -> List[Customer]:
+        return self.repository.get_all_customers()
+
+    def get_all_products(self) -> List[Product]:
+        # Rows are cached, not Products: callers may change the objects they get, which must not reach the cache
+        rows = self.cache.get(self.ALL_PRODUCTS)
+        if rows is None:
+            generation = self.cache.generation
+            products = self.repository.get_all_products()
+            if products:  # an empty list may just be a swallowed error, so it is not cached
+                rows = tuple(self._row(product) for product in products)
+                self.cache.put(self.ALL_PRODUCTS, rows, generation=generation)
+                for row in rows:
+                    self.cache.put(row[0], row, generation=generation)
+            return products
+        return [Product(*row) for row in rows]
+
+    @staticmethod
+    def _row(product: Product) -> Tuple[int, str, float, str, int]:
+        return (product.get_product_id(), product.get_name(), product.get_price(),
+                product.get_description(), product.get_stockQuantity())
@@ -0,0 +1,303 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from exception.productnotfound import ProductNotFound
+from util.ConnectionPool import ConnectionPool
+from util.IdAllocator import IdAllocator
+
+
+class CartStore:
+    """Write-behind, in-memory cart lines keyed by (customer_id, product_id).
+
+    Adds and removals change the in-memory cart and are appended to a local
+    journal; dirty lines reach the cart table in coalesced batches, either
+    every `flush_interval` seconds or when flush() is called (on checkout).
+    Journal records hold the resulting absolute quantity, so replaying them
+    after a crash is idempotent even if some were already flushed. Each
+    change is fsynced before it is acknowledged, so it survives an OS crash
+    or power loss too; with fsync=False only a process crash is covered.
+    Assumes a customer's cart is only written through one CartStore.
+    """
+
+    def __init__(self, pool: ConnectionPool, id_allocator: IdAllocator, journal_path: Optional[str] = None,
+                 flush_interval: Optional[float] = 1.0, max_cached_carts: int = 10000, fsync: bool = True):
+        self.pool = pool
+        self.id_allocator = id_allocator
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.max_cached_carts = max_cached_carts
+        self.fsync = fsync
+
+        self._carts: Dict[int, Dict[int, int]] = {}   # customer_id -> {product_id: quantity}
+        self._dirty: Dict[int, Set[int]] = {}         # customer_id -> product_ids not yet in the cart table
+        self._known_products: Set[int] = set()        # product_ids seen in the products table
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushes = 0
+
+        if journal_path is not None:
+            self._replay()
+            self._journal = open(journal_path, "a", encoding="utf-8")
+
+    def start(self):
+        if self.flush_interval and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="cart-write-behind", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        # Stops the background flusher and writes out everything still pending
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def add(self, customer_id: int, product_id: int, quantity: int) -> int:
+        with self._lock:
+            cart = self._load(customer_id)
+            if product_id not in cart:
+                self._check_product(product_id)
+            new_quantity = cart.get(product_id, 0) + quantity
+            self._set(customer_id, product_id, new_quantity)
+            return new_quantity
+
+    def remove(self, customer_id: int, product_id: int) -> bool:
+        with self._lock:
+            if product_id not in self._load(customer_id):
+                return False
+            self._set(customer_id, product_id, 0)
+            return True
+
+    def discard_lines(self, customer_id: int, product_ids) -> int:
+        # Forgets lines that left the cart table (checked out); lines changed since the last flush are kept
+        with self._lock:
+            cart = self._carts.get(customer_id)
+            if cart is None:
+                return 0
+            dirty = self._dirty.get(customer_id, ())
+            discarded = [product_id for product_id in product_ids if product_id in cart and product_id not in dirty]
+            for product_id in discarded:
+                del cart[product_id]
+            return len(discarded)
+
+    def get_cart(self, customer_id: int) -> Dict[int, int]:
+        with self._lock:
+            return dict(self._load(customer_id))
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(products) for products in self._dirty.values())
+
+    def flush(self, customer_id: Optional[int] = None) -> int:
+        """Writes dirty lines (of one customer, or all) in a single transaction; returns lines written.
+
+        If that transaction fails, lines whose product or customer no longer
+        exists are dropped and every customer's lines are written on their own, so one
+        bad line cannot hold back the others; the first error left is raised
+        once the rest are written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                customers = [customer_id] if customer_id is not None else list(self._dirty)
+                lines = [(customer, product_id, self._carts[customer].get(product_id, 0))
+                         for customer in customers for product_id in self._dirty.get(customer, ())]
+            if not lines:
+                return 0
+
+            error = None
+            try:
+                self._write(lines)
+                written = lines
+            except Exception:
+                lines = self._drop_orphan_lines(lines)
+                by_customer: Dict[int, List[Tuple[int, int, int]]] = {}
+                for line in lines:
+                    by_customer.setdefault(line[0], []).append(line)
+                written = []
+                for customer_lines in by_customer.values():
+                    try:
+                        self._write(customer_lines)
+                        written.extend(customer_lines)
+                    except Exception as e:
+                        error = error or e
+
+            with self._lock:
+                self._mark_clean(written)
+                self._compact_journal()
+                self._evict_clean_carts()
+                self.flushes += 1
+            if error is not None:
+                raise error
+            return len(written)
+
+    def _write(self, lines: List[Tuple[int, int, int]]):
+        inserts = [line for line in lines if line[2] > 0]
+        cart_ids = self.id_allocator.next_ids("cart", len(inserts)) if inserts else []
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                # Replace each dirty line: delete whatever is stored, then insert the current quantity
+                cursor.executemany("DELETE FROM cart WHERE customer_id = ? AND product_id = ?",
+                                   [(customer, product_id) for customer, product_id, _ in lines])
+                if inserts:
+                    cursor.executemany("INSERT INTO cart (cart_id, customer_id, product_id, quantity) VALUES (?, ?, ?, ?)",
+                                       [(cart_id, customer, product_id, quantity)
+                                        for cart_id, (customer, product_id, quantity) in zip(cart_ids, inserts)])
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def _mark_clean(self, lines: Iterable[Tuple[int, int, int]]):
+        for customer, product_id, quantity in lines:
+            # A line changed again while we were writing stays dirty for the next flush
+            if self._carts.get(customer, {}).get(product_id, 0) == quantity:
+                dirty = self._dirty.get(customer)
+                if dirty is not None:
+                    dirty.discard(product_id)
+                    if not dirty:
+                        del self._dirty[customer]
+
+    def _drop_orphan_lines(self, lines: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        # Forgets lines whose product or customer was deleted since they were added; returns the lines left to write
+        products = self._existing("products", "product_id", {product_id for _, product_id, quantity in lines if quantity > 0})
+        customers = self._existing("customers", "customer_id", {customer for customer, _, quantity in lines if quantity > 0})
+        gone = {line for line in lines if line[2] > 0 and (line[1] not in products or line[0] not in customers)}
+        if gone:
+            with self._lock:
+                for customer, product_id, _ in gone:
+                    print(f"Dropping cart line of customer {customer} for product {product_id}: one of them no longer exists.")
+                    if product_id not in products:
+                        self._known_products.discard(product_id)
+                    self._carts.get(customer, {}).pop(product_id, None)
+                    dirty = self._dirty.get(customer)
+                    if dirty is not None:
+                        dirty.discard(product_id)
+                        if not dirty:
+                            del self._dirty[customer]
+        return [line for line in lines if line not in gone]
+
+    def _existing(self, table: str, key: str, ids: Set[int]) -> Set[int]:
+        ids = sorted(ids)
+        existing = set()
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    cursor.execute(f"SELECT {key} FROM {table} WHERE {key} IN ({', '.join('?' for _ in chunk)})", chunk)
+                    existing.update(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.close()
+        return existing
+
+    def _check_product(self, product_id: int):
+        if product_id in self._known_products:
+            return
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT 1 FROM products WHERE product_id = ?", (product_id,))
+                if cursor.fetchone() is None:
+                    raise ProductNotFound(f"Product ID {product_id} does not exist.")
+            finally:
+                cursor.close()
+        self._known_products.add(product_id)
+
+    def _set(self, customer_id: int, product_id: int, quantity: int):
+        cart = self._carts[customer_id]
+        if quantity > 0:
+            cart[product_id] = quantity
+        else:
+            cart.pop(product_id, None)
+        self._dirty.setdefault(customer_id, set()).add(product_id)
+        self._append_journal([(customer_id, product_id, quantity)])
+
+    def _load(self, customer_id: int) -> Dict[int, int]:
+        cart = self._carts.get(customer_id)
+        if cart is None:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute("SELECT product_id, quantity FROM cart WHERE customer_id = ?", (customer_id,))
+                    cart = {}
+                    for product_id, quantity in cursor.fetchall():
+                        cart[product_id] = cart.get(product_id, 0) + quantity
+                finally:
+                    cursor.close()
+            self._carts[customer_id] = cart
+        return cart
+
+    def _evict_clean_carts(self):
+        # Oldest clean carts are dropped first; they are reloaded from the table on next use
+        excess = len(self._carts) - self.max_cached_carts
+        for customer_id in list(self._carts):
+            if excess <= 0:
+                break
+            if customer_id not in self._dirty:
+                del self._carts[customer_id]
+                excess -= 1
+
+    def _append_journal(self, lines: List[Tuple[int, int, int]]):
+        if self._journal is None:
+            return
+        self._journal.write("".join(json.dumps({"c": c, "p": p, "q": q}) + "\n" for c, p, q in lines))
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _compact_journal(self):
+        # Rewrite the journal with only the lines still pending, atomically
+        if self._journal is None:
+            return
+        pending = [(customer, product_id, self._carts[customer].get(product_id, 0))
+                   for customer, products in self._dirty.items() for product_id in products]
+        self._journal.close()
+        temporary = self.journal_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            handle.write("".join(json.dumps({"c": c, "p": p, "q": q}) + "\n" for c, p, q in pending))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        latest: Dict[Tuple[int, int], int] = {}
+        with open(self.journal_path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn final write from the crash
+                latest[(record["c"], record["p"])] = record["q"]
+        with self._lock:
+            for (customer_id, product_id), quantity in latest.items():
+                self._load(customer_id)
+                cart = self._carts[customer_id]
+                if quantity > 0:
+                    cart[product_id] = quantity
+                else:
+                    cart.pop(product_id, None)
+                self._dirty.setdefault(customer_id, set()).add(product_id)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing carts: {e}")
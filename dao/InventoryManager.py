@@ -0,0 +1,168 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+from dao.OrderWriter import OrderWriter
+from exception.insufficientstock import InsufficientStock
+from exception.productnotfound import ProductNotFound
+from util.ConnectionPool import ConnectionPool
+from util.DatabaseBackend import SqlServerBackend
+from util.IdAllocator import IdAllocator, SequenceTableSource
+from util.PricingEngine import PricingEngine
+
+# Lock conflicts worth retrying: SQLite busy/locked, SQL Server deadlock victim (1205) and lock timeout (1222)
+_TRANSIENT_MARKERS = ("database is locked", "database table is locked", "deadlock", "1205", "1222", "40001")
+
+
+def is_transient(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in _TRANSIENT_MARKERS)
+
+
+class InventoryManager:
+    """Optimistic stock reservations.
+
+    Stock is taken with a conditional row update (`stockQuantity >= ?`), so
+    concurrent checkouts of a hot SKU never oversell and never lock more than
+    the product rows involved. A reservation holds stock for `ttl` seconds;
+    confirm() turns reservations into an order, release() gives the stock
+    back, and the reaper releases holds that expired.
+    """
+
+    def __init__(self, pool: ConnectionPool, id_allocator: Optional[IdAllocator] = None, ttl: float = 900.0,
+                 max_attempts: int = 5, backoff: float = 0.01, clock: Callable[[], float] = time.time,
+                 pricing_engine: Optional[PricingEngine] = None):
+        self.pool = pool
+        self.backend = pool.backend if pool.backend is not None else SqlServerBackend()
+        self.id_allocator = id_allocator if id_allocator is not None else IdAllocator(SequenceTableSource(pool))
+        self.order_writer = OrderWriter(self.backend)
+        self.pricing_engine = pricing_engine if pricing_engine is not None else PricingEngine()
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.clock = clock
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def reserve(self, customer_id: int, product_id: int, quantity: int, ttl: Optional[float] = None) -> int:
+        return self.reserve_many(customer_id, [(product_id, quantity)], ttl)[0]
+
+    def reserve_many(self, customer_id: int, lines: List[Tuple[int, int]], ttl: Optional[float] = None) -> List[int]:
+        """Holds stock for every (product_id, quantity) line, all or nothing; returns reservation ids."""
+        if any(quantity <= 0 for _, quantity in lines):
+            raise ValueError("Reserved quantities must be positive.")
+        reservation_ids = list(self.id_allocator.next_ids("stock_reservations", len(lines)))
+        expires_at = int(self.clock() + (self.ttl if ttl is None else ttl))
+
+        def attempt(cursor):
+            try:
+                self.order_writer.decrement_stock(cursor, lines)
+            except InsufficientStock:
+                self._raise_for_missing_products(cursor, lines)
+                raise
+            cursor.executemany(
+                "INSERT INTO stock_reservations (reservation_id, product_id, customer_id, quantity, expires_at) VALUES (?, ?, ?, ?, ?)",
+                [(reservation_id, product_id, customer_id, quantity, expires_at)
+                 for reservation_id, (product_id, quantity) in zip(reservation_ids, lines)]
+            )
+            return reservation_ids
+
+        return self._with_retry(attempt)
+
+    def release(self, reservation_id: int) -> bool:
+        """Returns the held stock; False if the reservation was already confirmed, released or reaped."""
+        def attempt(cursor):
+            cursor.execute("SELECT product_id, quantity FROM stock_reservations WHERE reservation_id = ?", (reservation_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return False
+            cursor.execute("DELETE FROM stock_reservations WHERE reservation_id = ?", (reservation_id,))
+            if cursor.rowcount != 1:
+                return False  # someone else released it between our SELECT and DELETE
+            cursor.execute("UPDATE products SET stockQuantity = stockQuantity + ? WHERE product_id = ?", (row[1], row[0]))
+            return True
+
+        return self._with_retry(attempt)
+
+    def confirm(self, customer_id: int, reservation_ids: List[int], shipping_address: str) -> int:
+        """Turns the customer's live reservations into one order (stock is already taken); returns the order id."""
+        order_id = self.id_allocator.next_id("orders")
+        order_item_ids = self.id_allocator.next_ids("order_items", len(reservation_ids))
+        placeholders = ", ".join("?" for _ in reservation_ids)
+
+        def attempt(cursor):
+            cursor.execute(
+                "SELECT r.product_id, r.quantity, p.price FROM stock_reservations r JOIN products p ON p.product_id = r.product_id "
+                f"WHERE r.reservation_id IN ({placeholders}) AND r.customer_id = ? AND r.expires_at >= ? ORDER BY r.reservation_id",
+                list(reservation_ids) + [customer_id, int(self.clock())]
+            )
+            rows = cursor.fetchall()
+            cursor.execute(f"DELETE FROM stock_reservations WHERE reservation_id IN ({placeholders})", list(reservation_ids))
+            if len(rows) != len(reservation_ids) or cursor.rowcount != len(reservation_ids):
+                raise InsufficientStock("One or more reservations expired or were released before checkout.")
+            lines = [(row[0], row[1]) for row in rows]
+            total_price = self.pricing_engine.price_order((row[0], row[2], row[1]) for row in rows)
+            self.order_writer.write(cursor, order_id, order_item_ids, customer_id, lines, total_price, shipping_address,
+                                    decrement_stock=False)
+            return order_id
+
+        return self._with_retry(attempt)
+
+    def reap_expired(self, batch_size: int = 500) -> int:
+        """Releases reservations whose time ran out; returns how many were released."""
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(self.backend.limit("SELECT reservation_id FROM stock_reservations WHERE expires_at < ?", batch_size),
+                               (int(self.clock()),))
+                expired = [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        return sum(1 for reservation_id in expired if self.release(reservation_id))
+
+    def start_reaper(self, interval: float = 30.0):
+        if self._reaper is None:
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._reap_loop, args=(interval,), name="reservation-reaper", daemon=True)
+            self._reaper.start()
+
+    def stop_reaper(self):
+        if self._reaper is not None:
+            self._stop.set()
+            self._reaper.join()
+            self._reaper = None
+
+    def _reap_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.reap_expired()
+            except Exception as e:
+                print(f"Error releasing expired reservations: {e}")
+
+    def _raise_for_missing_products(self, cursor, lines: List[Tuple[int, int]]):
+        product_ids = sorted({product_id for product_id, _ in lines})
+        cursor.execute(f"SELECT product_id FROM products WHERE product_id IN ({', '.join('?' for _ in product_ids)})", product_ids)
+        missing = set(product_ids) - {row[0] for row in cursor.fetchall()}
+        if missing:
+            raise ProductNotFound(f"Product ID {min(missing)} does not exist.")
+
+    def _with_retry(self, attempt):
+        # Each attempt is one short transaction; lock conflicts are retried with jittered exponential backoff
+        for number in range(1, self.max_attempts + 1):
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    result = attempt(cursor)
+                    connection.commit()
+                    return result
+                except Exception as e:
+                    connection.rollback()
+                    if number == self.max_attempts or not is_transient(e):
+                        raise
+                finally:
+                    cursor.close()
+            time.sleep(self.backoff * (2 ** (number - 1)) * (0.5 + random.random()))
@@ -0,0 +1,224 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from decimal import Decimal
+from typing import Deque, Dict, List, Optional, Tuple
+from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from entity.customer import Customer
+from entity.product import Product
+from exception.intakefull import IntakeFull
+from util.WriteAheadLog import WriteAheadLog
+
+
+class OrderIntake:
+    """Accepts orders into a durable local log and writes them to the database in group commits.
+
+    submit() prices the order, reserves its ids, appends it to the write-ahead
+    log (fsynced before returning) and queues it. A committer thread writes up
+    to `batch_size` orders, or whatever arrived within `max_delay` seconds of
+    the first, in one transaction with a savepoint per order, so an order short
+    of stock is rejected alone. Each caller's Future resolves to True or to the
+    order's exception. A batch whose transaction fails as a whole (lost
+    connection, say) is retried every `retry_delay` seconds. At most
+    `max_pending` orders wait at a time; submit() blocks while the queue is
+    full and raises IntakeFull after `timeout`.
+
+    Orders in the log but not marked done are written again when the intake is
+    reopened. Their ids were reserved up front, so an order that had already
+    been committed is recognised by its order_id and skipped. Needs an id
+    source shared by every process (SequenceTableSource, the default).
+    """
+
+    def __init__(self, repository: OrderProcessorRepositoryImpl, log_path: str, batch_size: int = 100,
+                 max_delay: float = 0.005, max_pending: int = 10000, max_log_bytes: int = 64 * 2 ** 20,
+                 retry_delay: float = 1.0):
+        self.repository = repository
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_log_bytes = max_log_bytes
+        self.retry_delay = retry_delay
+        self.log = WriteAheadLog(log_path)
+
+        self._queue: Deque[Tuple[dict, Future]] = deque()
+        self._condition = threading.Condition()
+        self._outstanding = 0   # accepted (logged or about to be) and not yet done
+        self._closed = False
+        self.batches = 0
+        self.orders = 0
+
+        self.replayed = self._replay()
+        self._thread = threading.Thread(target=self._run, name="order-intake", daemon=True)
+        self._thread.start()
+
+    def submit(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]], shipping_address: str,
+               timeout: Optional[float] = None) -> Future:
+        total_price = self.repository.calculate_total_price(product_quantity_map)
+        lines = [[product.get_product_id(), quantity] for product, quantity in product_quantity_map]
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._closed or self._outstanding < self.max_pending, timeout):
+                raise IntakeFull(f"{self._outstanding} orders are already waiting to be written.")
+            if self._closed:
+                raise RuntimeError("The order intake is closed.")
+            self._outstanding += 1
+        try:
+            # Ids are fixed before the order is logged, which is what makes a replay idempotent
+            allocator = self.repository.id_allocator
+            entry = {"order_id": allocator.next_id("orders"),
+                     "first_item_id": allocator.next_ids("order_items", len(lines))[0],
+                     "customer_id": customer.get_customer_id(), "lines": lines,
+                     "total_price": str(total_price), "shipping_address": shipping_address}
+            self.log.append(entry)
+        except Exception:
+            with self._condition:
+                self._outstanding -= 1
+                self._condition.notify_all()
+            raise
+        future = Future()
+        with self._condition:
+            self._queue.append((entry, future))
+            self._condition.notify_all()
+        return future
+
+    def place_order(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]], shipping_address: str,
+                    timeout: Optional[float] = None) -> bool:
+        # Same contract as the repository's place_order: True once the order is committed
+        try:
+            return self.submit(customer, product_quantity_map, shipping_address, timeout).result()
+        except Exception as e:
+            print(f"Error placing order: {e}")
+            return False
+        finally:
+            self.repository.note_write(customer.get_customer_id())   # the caller's next reads go to the primary, which has the order
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return self._outstanding
+
+    def close(self):
+        # Writes out every accepted order, then stops the committer
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self.log.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                # Give more orders up to max_delay to join the first one
+                deadline = time.monotonic() + self.max_delay
+                while len(self._queue) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[dict, Future]], retry: bool = True):
+        try:
+            errors = self._write([entry for entry, _ in batch])
+        except Exception as e:
+            print(f"Error committing order batch: {e}")
+            with self._condition:
+                if retry and not self._closed:
+                    self._queue.extendleft(reversed(batch))
+                    self._condition.wait(self.retry_delay)
+                    return
+                # Not marked done: the orders stay in the log for the next replay
+                self._outstanding -= len(batch)
+                self._condition.notify_all()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        try:
+            self.log.append({"done": [entry["order_id"] for entry, _ in batch]})
+        except Exception as e:
+            print(f"Error marking orders done in the intake log: {e}")
+        self.batches += 1
+        self.orders += len(batch)
+        for (_, future), error in zip(batch, errors):
+            if error is None:
+                future.set_result(True)
+            else:
+                future.set_exception(error)
+        with self._condition:
+            self._outstanding -= len(batch)
+            # Nothing can be mid-append while _outstanding is 0, so the log can start over
+            if self._outstanding == 0 and self.log.size() > self.max_log_bytes:
+                self.log.reset()
+            self._condition.notify_all()
+
+    def _write(self, entries: List[dict]) -> List[Optional[Exception]]:
+        # One transaction for the batch; a failing order is rolled back to its savepoint and the rest commit
+        backend = self.repository.backend
+        errors: List[Optional[Exception]] = [None] * len(entries)
+        with self.repository.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                opening = backend.open_transaction("orders")
+                if opening is not None:
+                    cursor.execute(opening)
+                    cursor.fetchall()
+                for i, entry in enumerate(entries):
+                    savepoint = f"intake_order_{i}"
+                    cursor.execute(backend.savepoint(savepoint))
+                    try:
+                        lines = [(product_id, quantity) for product_id, quantity in entry["lines"]]
+                        self.repository.order_writer.write(
+                            cursor, entry["order_id"], range(entry["first_item_id"], entry["first_item_id"] + len(lines)),
+                            entry["customer_id"], lines, Decimal(entry["total_price"]), entry["shipping_address"])
+                    except Exception as e:
+                        cursor.execute(backend.rollback_to_savepoint(savepoint))
+                        errors[i] = e
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        return errors
+
+    def _replay(self) -> int:
+        # Orders logged but never marked done, minus those whose commit made it before the crash
+        pending: Dict[int, dict] = {}
+        for record in self.log.records():
+            if "done" in record:
+                for order_id in record["done"]:
+                    pending.pop(order_id, None)
+            else:
+                pending[record["order_id"]] = record
+        for order_id in self._committed(list(pending)):
+            del pending[order_id]
+        self.log.reset(pending.values())
+
+        # Written before any new order is accepted, so their ids are in the tables first
+        entries = list(pending.values())
+        for start in range(0, len(entries), self.batch_size):
+            batch = [(entry, Future()) for entry in entries[start:start + self.batch_size]]
+            self._outstanding += len(batch)
+            self._commit(batch, retry=False)
+        return len(entries)
+
+    def _committed(self, order_ids: List[int]) -> List[int]:
+        committed = []
+        chunk_size = self.repository.IN_CHUNK_SIZE
+        with self.repository.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for start in range(0, len(order_ids), chunk_size):
+                    chunk = order_ids[start:start + chunk_size]
+                    cursor.execute(f"SELECT order_id FROM orders WHERE order_id IN ({', '.join('?' for _ in chunk)})", chunk)
+                    committed.extend(row[0] for row in cursor.fetchall())
+            finally:
+                cursor.close()
+        return committed
@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Tuple
+from typing import Iterable, List, Dict, Optional, Tuple
 from entity.customer import Customer
 from entity.product import Product
+from entity.order import Order
 from entity.cart import Cart
 
 class OrderProcessorRepository(ABC):
@@ -25,10 +26,18 @@ class OrderProcessorRepository(ABC):
     def add_to_cart(self, customer: Customer, product: Product, quantity: int) -> bool:
         pass
 
+    @abstractmethod
+    def add_items_to_cart(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]]) -> bool:
+        pass
+
     @abstractmethod
     def remove_product_from_cart(self, customer_id: int, product_id: int) -> bool:
         pass
 
+    @abstractmethod
+    def remove_products_from_cart(self, customer_id: int, product_ids: Iterable[int]) -> int:
+        pass
+
     @abstractmethod
     def get_all_from_cart(self, customer: Customer) -> List[Dict[Product, int]]:
         pass
@@ -37,6 +46,10 @@ class OrderProcessorRepository(ABC):
     def place_order(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]], shipping_address: str) -> bool:
         pass
 
+    @abstractmethod
+    def checkout_cart(self, customer: Customer, shipping_address: str) -> Optional[Order]:
+        pass
+
     @abstractmethod
     def get_orders_by_customer(self, customer_id: int) -> Dict[Product, int]:
         pass
@@ -49,6 +62,10 @@ class OrderProcessorRepository(ABC):
     def get_product_by_id(self, product_id: int) -> Optional[Tuple[int, str, float, str, int]]:
         pass
 
+    @abstractmethod
+    def get_products_by_ids(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        pass
+
     @abstractmethod
     def get_all_customers(self) -> List[Customer]:
         pass
@@ -1,55 +1,240 @@
 import sys
 import os
+import threading
+import time
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from dao.OrderProcessorRepository import OrderProcessorRepository
-from typing import List, Dict, Optional, Tuple
+from contextlib import contextmanager
+from itertools import islice
+from datetime import date
+from decimal import Decimal
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 from entity.customer import Customer
 from entity.product import Product
 from entity.cart import Cart
+from entity.order import Order
+from entity.order_item import OrderItem
+from entity.product_batch import ProductBatch
 from exception.customernotfound import CustomerNotFound
 from exception.productnotfound import ProductNotFound
+from util.ConnectionPool import ConnectionPool
 from util.DBConnection import DBConnection
+from util.DatabaseBackend import SqlServerBackend
+from util.IdAllocator import IdAllocator, SequenceTableSource
+from util.Instrumentation import instrumented
+from util.PricingEngine import PricingEngine
+from util.PropertyUtil import PropertyUtil
+from util.ReplicaSet import ReplicaSet, writes
+from dao.OrderWriter import OrderWriter
+from dao.BulkInsertResult import BulkInsertResult
+from dao.CartStore import CartStore
+from dao.ProductListener import ProductListener
+from dao.ProductSearchIndex import ProductSearchIndex
+from dao import Statements
 
 class OrderProcessorRepositoryImpl(OrderProcessorRepository):
-    def __init__(self):
-        self.connection = DBConnection.get_connection()
+    # Ids per IN (...) list; SQL Server accepts at most 2100 parameters per statement
+    IN_CHUNK_SIZE = 1000
+    # Columns update_columns() may write
+    UPDATABLE_COLUMNS = {
+        "customers": ("customer_id", {"name", "email", "password"}),
+        "products": ("product_id", {"name", "price", "description", "stockQuantity"}),
+    }
 
+    def __init__(self, pool: Optional[ConnectionPool] = None, id_allocator: Optional[IdAllocator] = None,
+                 cart_store: Optional[CartStore] = None, pricing_engine: Optional[PricingEngine] = None,
+                 search_index: Optional[ProductSearchIndex] = None, replicas: Optional[ReplicaSet] = None,
+                 read_your_writes: Optional[float] = None):
+        # Each operation borrows a connection from the pool and returns it when done
+        self.pool = pool if pool is not None else DBConnection.get_pool()
+        # Read-only methods are served by the replicas, if any; writes always use the pool (the primary).
+        # For read_your_writes seconds after a write, reads for the same customer (or from the same thread) use the primary again.
+        self.replicas = replicas if replicas is not None or pool is not None else DBConnection.get_replicas()
+        self.read_your_writes = read_your_writes if read_your_writes is not None else PropertyUtil.get_read_your_writes()
+        # SQL dialect of the pooled connections; pools built without a backend are assumed to be SQL Server
+        self.backend = self.pool.backend if self.pool.backend is not None else SqlServerBackend()
+        self.id_allocator = id_allocator if id_allocator is not None else IdAllocator(SequenceTableSource(self.pool))
+        self.order_writer = OrderWriter(self.backend)
+        # Optional write-behind cart: cart changes stay in memory and reach the cart table in batches
+        self.cart_store = cart_store
+        # Order totals are computed in integer cents
+        self.pricing_engine = pricing_engine if pricing_engine is not None else PricingEngine()
+        # Told about products created and deleted through this repository, after the commit
+        self.product_listeners: List[ProductListener] = []
+        self.search_index = search_index
+        if search_index is not None:
+            self.add_product_listener(search_index)
+        self._call_stats = threading.local()
+        # customer_id -> time of their last write, oldest first; async callers write and read on different threads
+        self._recent_writes: Dict[int, float] = {}
+        self._recent_lock = threading.Lock()
+
+    def add_product_listener(self, listener: ProductListener):
+        self.product_listeners.append(listener)
+
+    def _notify(self, event: str, *args):
+        # A failing listener must not turn a committed write into a reported failure
+        for listener in self.product_listeners:
+            try:
+                getattr(listener, event)(*args)
+            except Exception as e:
+                print(f"Error notifying product listener: {e}")
+
+    def note_write(self, customer_id: Optional[int] = None):
+        now = time.monotonic()
+        self._call_stats.last_write = now
+        if customer_id is None or self.replicas is None:
+            return
+        with self._recent_lock:
+            self._recent_writes.pop(customer_id, None)
+            self._recent_writes[customer_id] = now
+            # Entries past the window are at the front; dropping them keeps the dict to the recent writers
+            for oldest, written in list(islice(self._recent_writes.items(), 100)):
+                if now - written < self.read_your_writes:
+                    break
+                del self._recent_writes[oldest]
+
+    def _wrote_recently(self, customer_id: Optional[int]) -> bool:
+        now = time.monotonic()
+        last_write = getattr(self._call_stats, "last_write", None)
+        if last_write is not None and now - last_write < self.read_your_writes:
+            return True
+        if customer_id is None:
+            return False
+        with self._recent_lock:
+            written = self._recent_writes.get(customer_id)
+        return written is not None and now - written < self.read_your_writes
+
+    @contextmanager
+    def _reading(self, kind: str = "statements", customer_id: Optional[int] = None):
+        # pool.statements()/connection() for a read-only method: a replica, or the primary just after
+        # this thread, or the customer the read is for, wrote
+        if self.replicas is None or self._wrote_recently(customer_id):
+            with getattr(self.pool, kind)() as resource:
+                yield resource
+        else:
+            with self.replicas.borrow(kind, self.pool) as resource:
+                yield resource
+
+    @property
+    def last_round_trips(self) -> int:
+        # Round-trips used by this thread's most recent place_order or checkout_cart (statements plus commit)
+        return getattr(self._call_stats, "round_trips", 0)
+
+    @writes
+    @instrumented
     def create_product(self, product: Product) -> bool:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(
-                "INSERT INTO products (product_id, name, price, description, stockQuantity) VALUES (?, ?, ?, ?, ?)",
-                (product.get_product_id(), product.get_name(), product.get_price(), product.get_description(), product.get_stockQuantity())
-            )
-            self.connection.commit()
+            with self.pool.statements() as statements:
+                statements.execute(Statements.INSERT_PRODUCT, (product.get_product_id(), product.get_name(), product.get_price(),
+                                                        product.get_description(), product.get_stockQuantity()))
+                statements.commit()
+            self._notify("product_created", product)
             return True
         except Exception as e:
             print(f"Error creating product: {e}")
             return False
 
+    @writes
+    @instrumented
+    def bulk_create_products(self, products: Iterable[Product], chunk_size: int = 1000,
+                             progress: Optional[Callable[[BulkInsertResult], None]] = None) -> BulkInsertResult:
+        return self._bulk_insert(
+            Statements.INSERT_PRODUCT.sql,
+            ((product.get_product_id(), product.get_name(), product.get_price(), product.get_description(), product.get_stockQuantity())
+             for product in products),
+            chunk_size, progress,
+            inserted=self._products_inserted if self.product_listeners else None
+        )
+
+    def _products_inserted(self, rows: List[tuple]):
+        for row in rows:
+            self._notify("product_created", Product(*row))
+
+    @writes
+    @instrumented
     def create_customer(self, customer: Customer) -> bool:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(
-                "INSERT INTO customers (customer_id, name, email, password) VALUES (?, ?, ?, ?)",
-                (customer.get_customer_id(), customer.get_name(), customer.get_email(), customer.get_password())
-            )
-            self.connection.commit()
-            return True
+            with self.pool.statements() as statements:
+                statements.execute(Statements.INSERT_CUSTOMER, (customer.get_customer_id(), customer.get_name(), customer.get_email(),
+                                                         customer.get_password()))
+                statements.commit()
+                return True
         except Exception as e:
             print(f"Error creating customer: {e}")
             return False
 
+    @writes
+    @instrumented
+    def bulk_create_customers(self, customers: Iterable[Customer], chunk_size: int = 1000,
+                              progress: Optional[Callable[[BulkInsertResult], None]] = None) -> BulkInsertResult:
+        return self._bulk_insert(
+            Statements.INSERT_CUSTOMER.sql,
+            ((customer.get_customer_id(), customer.get_name(), customer.get_email(), customer.get_password())
+             for customer in customers),
+            chunk_size, progress
+        )
+
+    def _bulk_insert(self, sql: str, rows: Iterable[tuple], chunk_size: int,
+                     progress: Optional[Callable[[BulkInsertResult], None]],
+                     inserted: Optional[Callable[[List[tuple]], None]] = None) -> BulkInsertResult:
+        # Consumes `rows` lazily, one chunk in memory at a time, and commits once per chunk;
+        # `inserted` gets the rows of each chunk that were committed
+        result = BulkInsertResult()
+        rows = iter(rows)
+        position = 0
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            if hasattr(cursor, "fast_executemany"):
+                cursor.fast_executemany = True
+            try:
+                while True:
+                    try:
+                        chunk = list(islice(rows, chunk_size))
+                    except Exception as e:
+                        # The source itself failed (e.g. a bad entity); report it and stop reading
+                        result.add_error(position, f"Error reading input: {e}")
+                        break
+                    if not chunk:
+                        break
+                    try:
+                        cursor.executemany(sql, chunk)
+                        connection.commit()
+                        result.inserted += len(chunk)
+                        committed = chunk
+                    except Exception:
+                        # Fall back to row-by-row inside one transaction to pinpoint the bad rows
+                        connection.rollback()
+                        committed = []
+                        for offset, row in enumerate(chunk):
+                            try:
+                                cursor.execute(sql, row)
+                                result.inserted += 1
+                                committed.append(row)
+                            except Exception as e:
+                                result.add_error(position + offset, str(e))
+                        connection.commit()
+                    if inserted is not None and committed:
+                        inserted(committed)
+                    position += len(chunk)
+                    if progress is not None:
+                        progress(result)
+            finally:
+                cursor.close()
+        return result
+
+    @writes
+    @instrumented
     def delete_product(self, product_id: int) -> bool:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT * FROM products WHERE product_id = ?", (product_id,))
-            if cursor.fetchone() is None:
-                raise ProductNotFound(f"Product ID {product_id} does not exist.")
-            
-            cursor.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
-            self.connection.commit()
+            with self.pool.statements() as statements:
+                if statements.fetchone(Statements.PRODUCT_BY_ID, (product_id,)) is None:
+                    raise ProductNotFound(f"Product ID {product_id} does not exist.")
+
+                statements.execute(Statements.DELETE_PRODUCT, (product_id,))
+                statements.commit()
+            self._notify("product_deleted", product_id)
             return True
         except ProductNotFound as e:
             print(e)
@@ -58,16 +243,17 @@ class OrderProcessorRepositoryImpl(OrderProcessorRepository):
             print(f"Error deleting product: {e}")
             return False
 
+    @writes
+    @instrumented
     def delete_customer(self, customer_id: int) -> bool:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT * FROM customers WHERE customer_id = ?", (customer_id,))
-            if cursor.fetchone() is None:
-                raise CustomerNotFound(f"Customer ID {customer_id} does not exist.")
-            
-            cursor.execute("DELETE FROM customers WHERE customer_id = ?", (customer_id,))
-            self.connection.commit()
-            return True
+            with self.pool.statements() as statements:
+                if statements.fetchone(Statements.CUSTOMER_BY_ID, (customer_id,)) is None:
+                    raise CustomerNotFound(f"Customer ID {customer_id} does not exist.")
+
+                statements.execute(Statements.DELETE_CUSTOMER, (customer_id,))
+                statements.commit()
+                return True
         except CustomerNotFound as e:
             print(e)
             return False
@@ -75,48 +261,144 @@ class OrderProcessorRepositoryImpl(OrderProcessorRepository):
             print(f"Error deleting customer: {e}")
             return False
 
+    @writes
+    @instrumented
     def add_to_cart(self, customer: Customer, product: Product, quantity: int) -> bool:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT MAX(cart_id) FROM cart")
-            max_cart_id = cursor.fetchone()[0]
-            new_cart_id = 1 if max_cart_id is None else max_cart_id + 1
-            
-            cursor.execute(
-                "INSERT INTO cart (cart_id, customer_id, product_id, quantity) VALUES (?, ?, ?, ?)",
-                (new_cart_id, customer.get_customer_id(), product.get_product_id(), quantity)
-            )
-            self.connection.commit()
-            return True
+            if self.cart_store is not None:
+                self.cart_store.add(customer.get_customer_id(), product.get_product_id(), quantity)
+                return True
+
+            # One line per (customer, product): merge into an existing line, insert only if there is none
+            params = (quantity, customer.get_customer_id(), product.get_product_id())
+            with self.pool.statements() as statements:
+                merged = statements.execute(Statements.ADD_CART_QUANTITY, params) > 0
+                if merged:
+                    statements.commit()
+                else:
+                    statements.rollback()
+            if merged:
+                return True
+
+            # A cart id is only spent on an insert; it is reserved with no transaction open, so a block refill never waits on us
+            new_cart_id = self.id_allocator.next_id("cart")
+            with self.pool.statements() as statements:
+                try:
+                    statements.execute(Statements.INSERT_CART_LINE,
+                                       (new_cart_id, customer.get_customer_id(), product.get_product_id(), quantity))
+                except Exception:
+                    # A concurrent add inserted the line first (unique cart index); merge into it
+                    statements.rollback()
+                    if statements.execute(Statements.ADD_CART_QUANTITY, params) == 0:
+                        raise
+                statements.commit()
+                return True
+        except Exception as e:
+            print(f"Error adding to cart: {e}")
+            return False
+
+    @writes
+    @instrumented
+    def add_items_to_cart(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]]) -> bool:
+        try:
+            customer_id = customer.get_customer_id()
+            wanted: Dict[int, int] = {}
+            for product, quantity in product_quantity_map:
+                wanted[product.get_product_id()] = wanted.get(product.get_product_id(), 0) + quantity
+            if self.cart_store is not None:
+                for product_id, quantity in wanted.items():
+                    self.cart_store.add(customer_id, product_id, quantity)
+                return True
+            if not wanted:
+                return True
+
+            # One read finds the lines to merge into; the rest are inserted, each group in a single executemany
+            cart_ids = self.id_allocator.next_ids("cart", len(wanted))
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    for attempt in range(2):
+                        try:
+                            existing = set()
+                            for chunk in self._in_chunks(list(wanted)):
+                                cursor.execute("SELECT product_id FROM cart WHERE customer_id = ? "
+                                               f"AND product_id IN ({', '.join('?' for _ in chunk)})", [customer_id] + chunk)
+                                existing.update(row[0] for row in cursor.fetchall())
+                            updates = [(quantity, customer_id, product_id) for product_id, quantity in wanted.items() if product_id in existing]
+                            inserts = [(product_id, quantity) for product_id, quantity in wanted.items() if product_id not in existing]
+                            if updates:
+                                cursor.executemany(Statements.ADD_CART_QUANTITY.sql, updates)
+                            if inserts:
+                                cursor.executemany(Statements.INSERT_CART_LINE.sql,
+                                                   [(cart_id, customer_id, product_id, quantity)
+                                                    for cart_id, (product_id, quantity) in zip(cart_ids, inserts)])
+                            connection.commit()
+                            return True
+                        except Exception:
+                            # A concurrent add inserted one of the lines first (unique cart index); read again and merge
+                            connection.rollback()
+                            if attempt:
+                                raise
+                finally:
+                    cursor.close()
         except Exception as e:
             print(f"Error adding to cart: {e}")
             return False
 
+    @writes
+    @instrumented
     def remove_product_from_cart(self, customer_id: int, product_id: int) -> bool:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("""DELETE FROM cart WHERE customer_id = ? AND product_id = ?""", (customer_id, product_id))
-            self.connection.commit()
-            return cursor.rowcount > 0  # Returns True if a row was deleted
+            if self.cart_store is not None:
+                return self.cart_store.remove(customer_id, product_id)
+
+            with self.pool.statements() as statements:
+                deleted = statements.execute(Statements.DELETE_CART_LINE, (customer_id, product_id))
+                statements.commit()
+                return deleted > 0  # Returns True if a row was deleted
         except Exception as e:
             print(f"Error removing product from cart: {e}")
-            self.connection.rollback()
             return False
-        finally:
-            cursor.close()
 
+    @writes
+    @instrumented
+    def remove_products_from_cart(self, customer_id: int, product_ids: Iterable[int]) -> int:
+        # Returns the number of lines removed
+        try:
+            product_ids = list(dict.fromkeys(product_ids))
+            if self.cart_store is not None:
+                return sum(self.cart_store.remove(customer_id, product_id) for product_id in product_ids)
+
+            removed = 0
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    for chunk in self._in_chunks(product_ids):
+                        cursor.execute(f"DELETE FROM cart WHERE customer_id = ? AND product_id IN ({', '.join('?' for _ in chunk)})",
+                                       [customer_id] + chunk)
+                        removed += cursor.rowcount
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            return removed
+        except Exception as e:
+            print(f"Error removing products from cart: {e}")
+            return 0
+
+    @instrumented
     def get_all_from_cart(self, customer: Customer) -> List[Dict[Product, int]]:
         cart_items = []
-        cursor = self.connection.cursor()
-    
+
         try:
-            cursor.execute("SELECT p.product_id, p.name, p.price, c.quantity "
-                           "FROM cart c "
-                           "JOIN products p ON c.product_id = p.product_id "
-                           "WHERE c.customer_id = ?", (customer.get_customer_id(),))
-        
-            rows = cursor.fetchall()
-        
+            if self.cart_store is not None:
+                return self._cart_items_from_store(customer.get_customer_id())
+
+            with self._reading(customer_id=customer.get_customer_id()) as statements:
+                rows = statements.fetchall(Statements.CART_ITEMS, (customer.get_customer_id(),))
+
             for row in rows:
                 product = Product(
                     product_id=row[0],
@@ -126,97 +408,185 @@ class OrderProcessorRepositoryImpl(OrderProcessorRepository):
                     stockQuantity=0  # Not needed here, but you can set it to 0 or leave it
                 )
                 cart_items.append({'product': product, 'quantity': row[3]})  # Use row[3] for quantity
-        
+
         except Exception as e:
             print("Error retrieving cart items:", e)
-        finally:
-            cursor.close()
-    
+
         return cart_items
 
+    def _cart_items_from_store(self, customer_id: int) -> List[Dict[Product, int]]:
+        # Quantities come from memory; only the product details are read, in one query
+        cart = self.cart_store.get_cart(customer_id)
+        if not cart:
+            return []
+        return [{'product': product, 'quantity': cart[product_id]} for product_id, product in self.get_products_by_ids(cart).items()]
+
+    @writes
+    @instrumented
     def place_order(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]], shipping_address: str) -> bool:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT MAX(order_id) FROM orders")
-            max_order_id = cursor.fetchone()[0]
-            new_order_id = 1 if max_order_id is None else max_order_id + 1
-            
-            total_price = self.calculate_total_price(product_quantity_map)
-            cursor.execute(
-                "INSERT INTO orders (customer_id, order_id, order_date, total_price, shipping_address) VALUES (?, ?, GETDATE(), ?, ?)",
-                (customer.get_customer_id(), new_order_id, total_price, shipping_address)
-            )
-            
-            # Fetch the max order_item_id from the order_items table
-            cursor.execute("SELECT MAX(order_item_id) FROM order_items")
-            max_order_item_id = cursor.fetchone()[0]
-            new_order_item_id = 1 if max_order_item_id is None else max_order_item_id + 1
-            
-            for product, quantity in product_quantity_map:
-                cursor.execute(
-                    "INSERT INTO order_items (order_item_id, order_id, product_id, quantity) VALUES (?, ?, ?, ?)",
-                    (new_order_item_id, new_order_id, product.get_product_id(), quantity)
-                )
-                new_order_item_id += 1  # Increment for each order item
-
-                cursor.execute(""" 
-                UPDATE products 
-                SET stockQuantity = stockQuantity - ? 
-                WHERE product_id = ? 
-                """, (quantity, product.get_product_id()))
-            self.connection.commit()
-            return True
+            if self.cart_store is not None:
+                self.cart_store.flush(customer.get_customer_id())  # checkout sees the cart table up to date
+            # Ids are reserved before the connection is borrowed so a block refill never waits on our own transaction
+            new_order_id = self.id_allocator.next_id("orders")
+            order_item_ids = self.id_allocator.next_ids("order_items", len(product_quantity_map))
+
+            # The whole order is one unit of work on one borrowed connection
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    total_price = self.calculate_total_price(product_quantity_map)
+                    lines = [(product.get_product_id(), quantity) for product, quantity in product_quantity_map]
+                    round_trips = self.order_writer.write(
+                        cursor, new_order_id, order_item_ids, customer.get_customer_id(),
+                        lines, total_price, shipping_address
+                    )
+                    connection.commit()
+                    self._call_stats.round_trips = round_trips + 1
+                    return True
+                except Exception:
+                    connection.rollback()  # Rollback in case of any errors
+                    raise
+                finally:
+                    cursor.close()
         except Exception as e:
             print(f"Error placing order: {e}")
-            self.connection.rollback()  # Rollback in case of any errors
             return False
-        finally:
-            cursor.close()
 
+    @writes
+    @instrumented
+    def checkout_cart(self, customer: Customer, shipping_address: str) -> Optional[Order]:
+        """Turns the customer's cart into an order inside the database and returns it, or None on failure.
+
+        Stock, the order row and its lines are all derived from the cart table
+        in one transaction (order_items via INSERT ... SELECT), so the cost is
+        a fixed handful of round-trips however many lines the cart has.
+        """
+        try:
+            customer_id = customer.get_customer_id()
+            if self.cart_store is not None:
+                self.cart_store.flush(customer_id)
+            with self.pool.statements() as statements:
+                line_count = statements.fetchone(Statements.CART_LINE_COUNT, (customer_id,))[0]
+            if not line_count:
+                raise ValueError(f"The cart of customer {customer_id} is empty.")
+            # Ids are reserved before the connection is borrowed so a block refill never waits on our own transaction
+            new_order_id = self.id_allocator.next_id("orders")
+            order_item_ids = self.id_allocator.next_ids("order_items", line_count)
+
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    lines = self.order_writer.take_cart(cursor, customer_id)
+                    if len(lines) != line_count:
+                        raise ValueError(f"The cart of customer {customer_id} changed during checkout.")
+                    total_price = self.pricing_engine.price_order((product_id, price, quantity) for product_id, _, price, quantity in lines)
+                    round_trips = self.order_writer.write_cart(cursor, new_order_id, order_item_ids, customer_id, total_price, shipping_address)
+                    connection.commit()
+                    # line count + take_cart + write_cart + commit
+                    self._call_stats.round_trips = 1 + 2 + round_trips + 1
+                except Exception:
+                    connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+
+            if self.cart_store is not None:
+                self.cart_store.discard_lines(customer_id, [line[0] for line in lines])
+            order = Order(new_order_id, customer_id, date.today(), total_price, shipping_address)
+            for order_item_id, (product_id, name, price, quantity) in zip(order_item_ids, lines):
+                product = Product(product_id=product_id, name=name, price=price, description='', stockQuantity=0)
+                order.add_item(OrderItem(order_item_id, new_order_id, product_id, quantity, product))
+            return order
+        except Exception as e:
+            print(f"Error checking out cart: {e}")
+            return None
+
+    @instrumented
     def get_orders_by_customer(self, customer_id: int) -> Dict[Product, int]:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(
-                "SELECT oi.product_id, oi.quantity, p.price, p.description, p.stockQuantity "
-                "FROM orders o "
-                "JOIN order_items oi ON o.order_id = oi.order_id "
-                "JOIN products p ON oi.product_id = p.product_id "
-                "WHERE o.customer_id = ?", 
-                (customer_id,)
-            )
-            rows = cursor.fetchall()
+            with self._reading(customer_id=customer_id) as statements:
+                rows = statements.fetchall(Statements.ORDERED_PRODUCTS, (customer_id,))
             orders = {}
             for row in rows:
                 product_id = row[0]          # product_id from order_items
                 quantity = row[1]            # quantity from order_items
-                price = row[2]               # price from products
-                description = row[3]         # description from products
-                stock_quantity = row[4]      # stockQuantity from products
 
                 product = Product(
-                    product_id=product_id, 
-                    name=None,
-                    price=price,
-                    description=description, 
-                    stockQuantity=stock_quantity
-                ) 
+                    product_id=product_id,
+                    name=row[2],
+                    price=row[3],
+                    description=row[4],
+                    stockQuantity=row[5]
+                )
                 orders[product] = quantity  # quantity
             return orders
         except Exception as e:
             print(f"Error retrieving orders: {e}")
             return {}
 
-    def calculate_total_price(self, product_quantity_map: List[Tuple[Product, int]]) -> float:
-        total_price = 0.0
-        for product, quantity in product_quantity_map:
-            total_price += float(product.get_price() * quantity)
-        return total_price
-    
+    def get_order_history(self, customer_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                          after_order_id: Optional[int] = None, limit: Optional[int] = None,
+                          page_size: int = 500) -> Iterator[Order]:
+        """Streams the customer's orders, oldest first, each with its OrderItem lines and their products.
+
+        One query joins orders, order_items and products ordered by order_id; rows are grouped into
+        Order aggregates in a single pass, so memory holds one order at a time. start_date is
+        inclusive and end_date exclusive; after_order_id/limit give keyset pages of whole orders.
+        """
+        conditions = ["customer_id = ?"]
+        params = [customer_id]
+        if start_date is not None:
+            conditions.append("order_date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("order_date < ?")
+            params.append(end_date)
+        if after_order_id is not None:
+            conditions.append("order_id > ?")
+            params.append(after_order_id)
+        orders_sql = ("SELECT order_id, customer_id, order_date, total_price, shipping_address FROM orders "
+                      f"WHERE {' AND '.join(conditions)}")
+        if limit is not None:
+            # Limit whole orders (not joined rows) before the join
+            orders_sql = self.backend.limit(orders_sql + " ORDER BY order_id", limit)
+
+        sql = ("SELECT o.order_id, o.customer_id, o.order_date, o.total_price, o.shipping_address, "
+               "oi.order_item_id, oi.product_id, oi.quantity, p.name, p.price, p.description, p.stockQuantity "
+               f"FROM ({orders_sql}) o "
+               "LEFT JOIN order_items oi ON oi.order_id = o.order_id "
+               "LEFT JOIN products p ON p.product_id = oi.product_id "
+               "ORDER BY o.order_id, oi.order_item_id")
+
+        order = None
+        for row in self._stream_rows(sql, tuple(params), page_size, customer_id):
+            if order is None or order.get_order_id() != row[0]:
+                if order is not None:
+                    yield order
+                order = Order(row[0], row[1], row[2], row[3], row[4])
+            if row[5] is not None:
+                # product is None when the product was deleted (order_items.product_id ON DELETE SET NULL)
+                product = Product(row[6], row[8], row[9], row[10], row[11]) if row[8] is not None else None
+                order.add_item(OrderItem(row[5], row[0], row[6], row[7], product))
+        if order is not None:
+            yield order
+
+    @instrumented
+    def get_order_history_page(self, customer_id: int, page_size: int = 20, after_order_id: Optional[int] = None,
+                               start_date: Optional[date] = None, end_date: Optional[date] = None) -> Tuple[List[Order], Optional[int]]:
+        orders = list(self.get_order_history(customer_id, start_date, end_date, after_order_id, limit=page_size))
+        next_key = orders[-1].get_order_id() if len(orders) == page_size else None
+        return orders, next_key
+
+    def calculate_total_price(self, product_quantity_map: List[Tuple[Product, int]]) -> Decimal:
+        return self.pricing_engine.price_order(
+            (product.get_product_id(), product.get_price(), quantity) for product, quantity in product_quantity_map)
+
+    @instrumented
     def get_customer_by_id(self, customer_id: int) -> Customer:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT * FROM customers WHERE customer_id = ?", (customer_id,))
-            row = cursor.fetchone()
+            with self._reading(customer_id=customer_id) as statements:
+                row = statements.fetchone(Statements.CUSTOMER_BY_ID, (customer_id,))
             if row:
                 return Customer(row[0], row[1], row[2], row[3])  # Adjust index based on your schema
             else:
@@ -225,54 +595,179 @@ class OrderProcessorRepositoryImpl(OrderProcessorRepository):
             print(f"Error retrieving customer: {e}")
             return None
 
+    @instrumented
     def get_product_by_id(self, product_id: int) -> Optional[Tuple[int, str, float, str, int]]:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT * FROM products WHERE product_id = ?", (product_id,))
-            return cursor.fetchone()  # Returns a tuple of product details
+            with self._reading() as statements:
+                return statements.fetchone(Statements.PRODUCT_BY_ID, (product_id,))  # Returns a tuple of product details
         except Exception as e:
             print(f"Error retrieving product: {e}")
             return None
 
+    @instrumented
+    def get_products_by_ids(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        # Found products keyed by id, in the order asked for; unknown ids are left out
+        product_ids = list(dict.fromkeys(product_ids))
+        try:
+            rows = {}
+            with self._reading("connection") as connection:
+                cursor = connection.cursor()
+                try:
+                    for chunk in self._in_chunks(product_ids):
+                        cursor.execute("SELECT product_id, name, price, description, stockQuantity FROM products "
+                                       f"WHERE product_id IN ({', '.join('?' for _ in chunk)})", chunk)
+                        for row in cursor.fetchall():
+                            rows[row[0]] = row
+                finally:
+                    cursor.close()
+            return {product_id: Product(*rows[product_id]) for product_id in product_ids if product_id in rows}
+        except Exception as e:
+            print(f"Error retrieving products: {e}")
+            return {}
+
+    @instrumented
+    def search_products(self, query: str, limit: int = 20, min_price=None, max_price=None,
+                        min_stock: Optional[int] = None) -> List[Product]:
+        # Ranked by the search index, then read in one query; stock is checked again on the rows read,
+        # since orders change it without a catalog event
+        if self.search_index is None:
+            print("Product search is not enabled.")
+            return []
+        hits = self.search_index.search(query, limit, min_price, max_price, min_stock)
+        products = self.get_products_by_ids(product_id for product_id, _ in hits)
+        return [product for product in products.values()
+                if min_stock is None or (product.get_stockQuantity() or 0) >= min_stock]
+
+    @instrumented
     def get_all_customers(self) -> List[Customer]:
         customers = []
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT * FROM customers")
-            rows = cursor.fetchall()
+            with self._reading() as statements:
+                rows = statements.fetchall(Statements.ALL_CUSTOMERS)
             for row in rows:
                 customer = Customer(row[0], row[1], row[2], row[3])
                 customers.append(customer)
         except Exception as e:
             print(f"Error retrieving customers: {e}")
-        finally:
-            cursor.close()
         return customers
 
+    @instrumented
     def get_all_products(self) -> List[Product]:
         products = []
         try:
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT * FROM products")
-            rows = cursor.fetchall()
+            with self._reading() as statements:
+                rows = statements.fetchall(Statements.ALL_PRODUCTS)
             for row in rows:
                 product = Product(row[0], row[1], row[2], row[3], row[4])
                 products.append(product)
         except Exception as e:
             print(f"Error retrieving products: {e}")
-        finally:
-            cursor.close()
         return products
 
+    def iter_customers(self, page_size: int = 500, after_id: Optional[int] = None) -> Iterator[Customer]:
+        # Keyset order by customer_id; rows are pulled page_size at a time and built lazily
+        sql, params = self._keyset_query("SELECT customer_id, name, email, password FROM customers", "customer_id", after_id)
+        for row in self._stream_rows(sql, params, page_size):
+            yield Customer(row[0], row[1], row[2], row[3])
+
+    def iter_products(self, page_size: int = 500, after_id: Optional[int] = None) -> Iterator[Product]:
+        sql, params = self._keyset_query("SELECT product_id, name, price, description, stockQuantity FROM products", "product_id", after_id)
+        for row in self._stream_rows(sql, params, page_size):
+            yield Product(row[0], row[1], row[2], row[3], row[4])
+
+    @instrumented
+    def load_product_batch(self, after_id: Optional[int] = None, limit: Optional[int] = None, page_size: int = 500) -> ProductBatch:
+        # Columnar bulk read: no Product object is created per row
+        sql, params = self._keyset_query("SELECT product_id, name, price, description, stockQuantity FROM products", "product_id", after_id)
+        return ProductBatch.from_rows(islice(self._stream_rows(sql, params, page_size), limit))
+
+    @instrumented
+    def get_customers_page(self, page_size: int = 50, after_id: Optional[int] = None) -> Tuple[List[Customer], Optional[int]]:
+        # Returns one page plus the key to pass as after_id for the next page (None when exhausted)
+        sql, params = self._keyset_query("SELECT customer_id, name, email, password FROM customers", "customer_id", after_id)
+        customers = [Customer(row[0], row[1], row[2], row[3])
+                     for row in self._stream_rows(self.backend.limit(sql, page_size), params, page_size)]
+        next_key = customers[-1].get_customer_id() if len(customers) == page_size else None
+        return customers, next_key
+
+    @instrumented
+    def get_products_page(self, page_size: int = 50, after_id: Optional[int] = None) -> Tuple[List[Product], Optional[int]]:
+        sql, params = self._keyset_query("SELECT product_id, name, price, description, stockQuantity FROM products", "product_id", after_id)
+        products = [Product(row[0], row[1], row[2], row[3], row[4])
+                    for row in self._stream_rows(self.backend.limit(sql, page_size), params, page_size)]
+        next_key = products[-1].get_product_id() if len(products) == page_size else None
+        return products, next_key
+
+    def _in_chunks(self, values: List[int]) -> Iterator[List[int]]:
+        for start in range(0, len(values), self.IN_CHUNK_SIZE):
+            yield values[start:start + self.IN_CHUNK_SIZE]
+
+    @staticmethod
+    def _keyset_query(select: str, key: str, after_id: Optional[int]) -> Tuple[str, tuple]:
+        if after_id is None:
+            return f"{select} ORDER BY {key}", ()
+        return f"{select} WHERE {key} > ? ORDER BY {key}", (after_id,)
+
+    def _stream_rows(self, sql: str, params: tuple, page_size: int, customer_id: Optional[int] = None) -> Iterator[tuple]:
+        # Holds one pooled connection while the caller iterates; closing the generator early releases it
+        with self._reading("connection", customer_id) as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(page_size)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                cursor.close()
+
+    @writes
+    @instrumented
     def update_customer(self, customer: Customer) -> bool:
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(
-                "UPDATE customers SET name = ?, email = ?, password = ? WHERE customer_id = ?",
-                (customer.get_name(), customer.get_email(), customer.get_password(), customer.get_customer_id())
-            )
-            self.connection.commit()
-            return cursor.rowcount > 0  # Return True if a row was updated
+            with self.pool.statements() as statements:
+                updated = statements.execute(Statements.UPDATE_CUSTOMER, (customer.get_name(), customer.get_email(),
+                                                                   customer.get_password(), customer.get_customer_id()))
+                statements.commit()
+                return updated > 0  # Return True if a row was updated
         except Exception as e:
             print(f"Error updating customer: {e}")
             return False
+
+    @writes
+    @instrumented
+    def update_columns(self, customers: Optional[Dict[int, Dict[str, object]]] = None,
+                       products: Optional[Dict[int, Dict[str, object]]] = None) -> bool:
+        """Writes just the given columns, {id: {column: value}}, of customers and products in one transaction.
+
+        Rows changing the same set of columns share one executemany.
+        """
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    for table, changes in (("customers", customers or {}), ("products", products or {})):
+                        key, allowed = self.UPDATABLE_COLUMNS[table]
+                        groups: Dict[Tuple[str, ...], List[tuple]] = {}
+                        for entity_id, columns in changes.items():
+                            names = tuple(sorted(columns))
+                            if not names or not allowed.issuperset(names):
+                                raise ValueError(f"Cannot update columns {list(names)} of {table}.")
+                            groups.setdefault(names, []).append(tuple(columns[name] for name in names) + (entity_id,))
+                        for names, rows in groups.items():
+                            cursor.executemany(f"UPDATE {table} SET {', '.join(f'{name} = ?' for name in names)} WHERE {key} = ?", rows)
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"Error updating columns: {e}")
+            return False
+        if products and self.product_listeners:
+            for product in self.get_products_by_ids(products).values():
+                self._notify("product_updated", product)
+        return True
+
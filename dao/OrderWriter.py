@@ -0,0 +1,129 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, Iterable, List, Sequence, Tuple
+from exception.insufficientstock import InsufficientStock
+from util.DatabaseBackend import DatabaseBackend
+
+
+class OrderWriter:
+    """Writes one order with a fixed number of statements, however many lines it has.
+
+    All order_items go in a single executemany and all stock decrements in one
+    set-based UPDATE guarded by `stockQuantity >= ?`, so a line that would
+    oversell makes the UPDATE touch fewer rows and the order is rejected.
+    """
+
+    # Each product uses 5 parameters in the stock UPDATE; SQL Server allows 2100 per statement
+    STOCK_CHUNK_SIZE = 400
+
+    def __init__(self, backend: DatabaseBackend):
+        self.backend = backend
+
+    def write(self, cursor, order_id: int, order_item_ids: Iterable[int], customer_id: int,
+              lines: List[Tuple[int, int]], total_price, shipping_address: str, decrement_stock: bool = True) -> int:
+        """Writes the order on `cursor` (no commit) and returns the number of round-trips used.
+
+        Pass decrement_stock=False when the stock was already taken, e.g. by inventory reservations.
+        """
+        round_trips = self.decrement_stock(cursor, lines) if decrement_stock else 0
+        round_trips += self._insert_order(cursor, order_id, customer_id, total_price, shipping_address)
+
+        if hasattr(cursor, "fast_executemany"):
+            cursor.fast_executemany = True  # pyodbc: send every row in one parameter array
+        cursor.executemany(
+            "INSERT INTO order_items (order_item_id, order_id, product_id, quantity) VALUES (?, ?, ?, ?)",
+            [(order_item_id, order_id, product_id, quantity)
+             for order_item_id, (product_id, quantity) in zip(order_item_ids, lines)]
+        )
+        return round_trips + 1
+
+    def take_cart(self, cursor, customer_id: int) -> List[tuple]:
+        """Takes stock for the customer's cart table lines and returns them as (product_id, name, price, quantity) rows.
+
+        Uses 2 round-trips. The stock UPDATE reads the cart through a locking
+        read, so the lines returned are the ones write_cart() copies into the
+        order; it must run on the same transaction, before write_cart().
+        """
+        cart = self.backend.locking_read("cart")
+        quantity = f"(SELECT SUM(cart.quantity) FROM {cart} WHERE cart.customer_id = ? AND cart.product_id = products.product_id)"
+        cursor.execute(
+            f"UPDATE products SET stockQuantity = stockQuantity - {quantity} "
+            f"WHERE product_id IN (SELECT product_id FROM {cart} WHERE customer_id = ?) AND stockQuantity >= {quantity}",
+            (customer_id, customer_id, customer_id)
+        )
+        updated = cursor.rowcount
+        lines = self.read_cart(cursor, customer_id)
+        if updated != len(lines):
+            raise InsufficientStock(f"Insufficient stock for at least one product in the cart of customer {customer_id}.")
+        return lines
+
+    def lock_cart(self, cursor, customer_id: int):
+        # Write-locks the customer's cart rows until the transaction ends, so read_cart() and write_cart() see the same lines
+        cursor.execute("UPDATE cart SET quantity = quantity WHERE customer_id = ?", (customer_id,))
+
+    def read_cart(self, cursor, customer_id: int) -> List[tuple]:
+        # (product_id, name, price, quantity) per product in the cart, in product_id order
+        cursor.execute(
+            "SELECT c.product_id, p.name, p.price, SUM(c.quantity) FROM cart c JOIN products p ON p.product_id = c.product_id "
+            "WHERE c.customer_id = ? GROUP BY c.product_id, p.name, p.price ORDER BY c.product_id",
+            (customer_id,)
+        )
+        return cursor.fetchall()
+
+    def write_cart(self, cursor, order_id: int, order_item_ids: Sequence[int], customer_id: int,
+                   total_price, shipping_address: str) -> int:
+        """Moves the cart lines read by take_cart() into a new order server-side and empties the cart; returns round-trips.
+
+        order_item_ids must be consecutive, one per cart line in product_id order.
+        """
+        round_trips = self._insert_order(cursor, order_id, customer_id, total_price, shipping_address)
+        cursor.execute(
+            "INSERT INTO order_items (order_item_id, order_id, product_id, quantity) "
+            "SELECT ? + ROW_NUMBER() OVER (ORDER BY product_id) - 1, ?, product_id, SUM(quantity) "
+            "FROM cart WHERE customer_id = ? GROUP BY product_id",
+            (order_item_ids[0], order_id, customer_id)
+        )
+        if cursor.rowcount != len(order_item_ids):
+            raise ValueError(f"The cart of customer {customer_id} changed during checkout.")
+        cursor.execute("DELETE FROM cart WHERE customer_id = ?", (customer_id,))
+        return round_trips + 2
+
+    def _insert_order(self, cursor, order_id: int, customer_id: int, total_price, shipping_address: str) -> int:
+        cursor.execute(
+            "INSERT INTO orders (customer_id, order_id, order_date, total_price, shipping_address) "
+            f"VALUES (?, ?, {self.backend.current_date()}, ?, ?)",
+            (customer_id, order_id, total_price, shipping_address)
+        )
+        return 1
+
+    def decrement_stock(self, cursor, lines: List[Tuple[int, int]]) -> int:
+        # Lines for the same product are summed so the guard sees the full quantity
+        wanted: Dict[int, int] = {}
+        for product_id, quantity in lines:
+            wanted[product_id] = wanted.get(product_id, 0) + quantity
+
+        items = list(wanted.items())
+        round_trips = 0
+        for start in range(0, len(items), self.STOCK_CHUNK_SIZE):
+            chunk = items[start:start + self.STOCK_CHUNK_SIZE]
+            case = "CASE product_id " + " ".join("WHEN ? THEN ?" for _ in chunk) + " END"
+            case_params = [value for item in chunk for value in item]
+            cursor.execute(
+                f"UPDATE products SET stockQuantity = stockQuantity - {case} "
+                f"WHERE product_id IN ({', '.join('?' for _ in chunk)}) AND stockQuantity >= {case}",
+                case_params + [product_id for product_id, _ in chunk] + case_params
+            )
+            round_trips += 1
+            if cursor.rowcount != len(chunk):
+                raise InsufficientStock(
+                    f"Insufficient stock for at least one of products {[product_id for product_id, _ in chunk]}."
+                )
+        return round_trips
+
+    def restock(self, cursor, lines: List[Tuple[int, int]]) -> int:
+        # Gives back stock taken by decrement_stock(), in one executemany
+        cursor.executemany("UPDATE products SET stockQuantity = stockQuantity + ? WHERE product_id = ?",
+                           [(quantity, product_id) for product_id, quantity in lines])
+        return 1
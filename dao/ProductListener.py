@@ -0,0 +1,18 @@
+from abc import ABC, abstractmethod
+from entity.product import Product
+
+
+class ProductListener(ABC):
+    """Told about catalog changes after the repository has committed them."""
+
+    @abstractmethod
+    def product_created(self, product: Product):
+        pass
+
+    @abstractmethod
+    def product_deleted(self, product_id: int):
+        pass
+
+    def product_updated(self, product: Product):
+        # The row as it is after the update; by default handled like a newly created product
+        self.product_created(product)
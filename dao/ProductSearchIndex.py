@@ -0,0 +1,383 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bisect
+import heapq
+import json
+import mmap
+import re
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from dao.ProductListener import ProductListener
+from entity.product import Product
+from entity.product_batch import to_cents
+
+MAGIC = b"ESEARCH1\n"
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+# Score of a query term by where it matched; a product's score is the sum over all query terms
+NAME_EXACT, NAME_PREFIX, DESCRIPTION_EXACT, DESCRIPTION_PREFIX = 8, 4, 2, 1
+
+# Arrays of an index file, in file order, with their typecodes; postings are sorted document numbers
+_SECTIONS = (("product_ids", "q"), ("price_cents", "q"), ("stock", "q"), ("token_offsets", "q"), ("tokens", "B"),
+             ("name_offsets", "q"), ("name_postings", "I"), ("description_offsets", "q"), ("description_postings", "I"))
+
+
+def tokenize(text) -> List[str]:
+    return _TOKEN.findall(text.casefold()) if text else []
+
+
+class _MemorySegment:
+    # Products added since the index file was written; postings hold index-wide document numbers
+    def __init__(self, first_doc: int):
+        self.first_doc = first_doc
+        self.product_ids = array("q")
+        self.price_cents = array("q")
+        self.stock = array("q")
+        self.postings: Dict[str, Tuple[array, array]] = {}   # token -> (name documents, description documents)
+        self._vocabulary: Optional[List[str]] = None         # sorted tokens, rebuilt after a new token appears
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def add(self, product_id: int, price_cents: int, stock: int, name_tokens: List[str], description_tokens: List[str]) -> int:
+        doc = self.first_doc + len(self.product_ids)
+        self.product_ids.append(product_id)
+        self.price_cents.append(price_cents)
+        self.stock.append(stock)
+        for field, tokens in ((0, name_tokens), (1, description_tokens)):
+            for token in set(tokens):
+                lists = self.postings.get(token)
+                if lists is None:
+                    lists = self.postings[token] = (array("I"), array("I"))
+                    self._vocabulary = None
+                lists[field].append(doc)
+        return doc
+
+    def matches(self, term: str, max_expansions: int) -> Iterator[Tuple[str, Sequence[int], Sequence[int]]]:
+        # (token, name documents, description documents) for the term and the tokens it is a prefix of
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        position = bisect.bisect_left(vocabulary, term)
+        end = min(len(vocabulary), position + max_expansions)
+        while position < end and vocabulary[position].startswith(term):
+            name, description = self.postings[vocabulary[position]]
+            yield vocabulary[position], name, description
+            position += 1
+
+    def all_tokens(self) -> Iterator[Tuple[str, Sequence[int], Sequence[int]]]:
+        for token, (name, description) in self.postings.items():
+            yield token, name, description
+
+
+class _MappedSegment:
+    # An index file mapped read-only; arrays are memoryviews straight over the mapped pages
+    first_doc = 0
+
+    def __init__(self, path: str):
+        with open(path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        try:
+            if self._mmap[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a product search index.")
+            header_end = self._mmap.find(b"\n", len(MAGIC))
+            header = json.loads(self._mmap[len(MAGIC):header_end])
+            if header["byteorder"] != sys.byteorder:
+                raise ValueError(f"{path} was written on a {header['byteorder']}-endian machine; rebuild it here.")
+            data_start = (header_end + 1 + 7) // 8 * 8
+            view = memoryview(self._mmap)
+            self._views.append(view)
+            for name, typecode in _SECTIONS:
+                offset, length = header["sections"][name]
+                start = data_start + offset
+                section = view[start:start + length * array(typecode).itemsize].cast(typecode)
+                self._views.append(section)
+                setattr(self, name, section)
+        except Exception:
+            self.close()
+            raise
+        self.count = header["products"]
+        self.token_count = header["tokens"]
+
+    def __len__(self):
+        return self.count
+
+    def doc_of(self, product_id: int) -> Optional[int]:
+        position = bisect.bisect_left(self.product_ids, product_id)
+        if position < self.count and self.product_ids[position] == product_id:
+            return position
+        return None
+
+    def _token(self, position: int) -> bytes:
+        return bytes(self.tokens[self.token_offsets[position]:self.token_offsets[position + 1]])
+
+    def _postings(self, position: int) -> Tuple[Sequence[int], Sequence[int]]:
+        return (self.name_postings[self.name_offsets[position]:self.name_offsets[position + 1]],
+                self.description_postings[self.description_offsets[position]:self.description_offsets[position + 1]])
+
+    def matches(self, term: str, max_expansions: int) -> Iterator[Tuple[str, Sequence[int], Sequence[int]]]:
+        # Tokens are stored in UTF-8 byte order, which is also code point order
+        key = term.encode("utf-8")
+        low, high = 0, self.token_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._token(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        end = min(self.token_count, low + max_expansions)
+        while low < end:
+            token = self._token(low)
+            if not token.startswith(key):
+                break
+            yield (token.decode("utf-8"),) + self._postings(low)
+            low += 1
+
+    def all_tokens(self) -> Iterator[Tuple[str, Sequence[int], Sequence[int]]]:
+        for position in range(self.token_count):
+            yield (self._token(position).decode("utf-8"),) + self._postings(position)
+
+    def close(self):
+        # Views must be released before the mapping can be closed
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+
+class ProductSearchIndex(ProductListener):
+    """In-process inverted index over product names and descriptions, with price and stock filters.
+
+    Every query term must match a token of the name or description, either
+    whole or as a prefix; products rank by where their terms matched (name
+    before description, whole token before prefix). The index is kept up to
+    date from catalog events. save() writes the live products, compacted and
+    ordered by product id, to one file that open() memory-maps, so startup
+    reads only a header and pages load as queries touch them; changes made
+    after opening are held in memory until the next save().
+    """
+
+    def __init__(self, max_expansions: int = 50):
+        self.path = None
+        self.max_expansions = max_expansions   # vocabulary tokens a prefix may expand to, per segment
+        self._base: Optional[_MappedSegment] = None
+        self._memory = _MemorySegment(0)
+        self._docs: Dict[int, int] = {}         # product_id -> document, for products added since the file was written
+        self._deleted: Set[int] = set()         # documents of deleted or replaced products
+        self._lock = threading.RLock()
+
+    @classmethod
+    def open(cls, path: str, max_expansions: int = 50) -> "ProductSearchIndex":
+        index = cls(max_expansions)
+        index._base = _MappedSegment(path)
+        index._memory = _MemorySegment(len(index._base))
+        index.path = path
+        return index
+
+    @classmethod
+    def open_or_build(cls, path: str, products: Callable[[], Iterable[Product]], max_expansions: int = 50) -> "ProductSearchIndex":
+        # `products` is only called, and the file only written, when there is no index file yet
+        if os.path.exists(path):
+            return cls.open(path, max_expansions)
+        index = cls(max_expansions)
+        for product in products():
+            index.add(product)
+        index.save(path)
+        return index
+
+    def __len__(self):
+        with self._lock:
+            return (len(self._base) if self._base is not None else 0) + len(self._memory) - len(self._deleted)
+
+    def product_created(self, product: Product):
+        self.add(product)
+
+    def product_deleted(self, product_id: int):
+        self.remove(product_id)
+
+    def add(self, product: Product):
+        self.add_row(product.get_product_id(), product.get_name(), product.get_price(), product.get_description(),
+                     product.get_stockQuantity())
+
+    def add_row(self, product_id: int, name, price, description, stock_quantity):
+        # Adding a product id that is already indexed replaces it
+        name_tokens, description_tokens = tokenize(name), tokenize(description)
+        with self._lock:
+            self._remove(product_id)
+            self._docs[product_id] = self._memory.add(product_id, to_cents(price) if price is not None else 0,
+                                                      stock_quantity or 0, name_tokens, description_tokens)
+
+    def remove(self, product_id: int) -> bool:
+        with self._lock:
+            return self._remove(product_id)
+
+    def _remove(self, product_id: int) -> bool:
+        doc = self._docs.pop(product_id, None)
+        if doc is None and self._base is not None:
+            doc = self._base.doc_of(product_id)
+        if doc is None or doc in self._deleted:
+            return False
+        self._deleted.add(doc)
+        return True
+
+    def search(self, query: str, limit: int = 20, min_price=None, max_price=None,
+               min_stock: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Up to `limit` (product_id, score) pairs, best first; equal scores go to the lower product id.
+
+        Prices are inclusive bounds in currency units; stock is as of the last catalog event.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+        low = to_cents(min_price) if min_price is not None else None
+        high = to_cents(max_price) if max_price is not None else None
+        with self._lock:
+            # Rarest term first: its documents are the candidates the other terms are checked against
+            per_term = sorted((self._postings(term) for term in terms), key=lambda lists: sum(len(docs) for _, docs in lists))
+            scores = None
+            for lists in per_term:
+                scores = self._score_term(lists, scores)
+                if not scores:
+                    return []
+
+            hits = []
+            memory = self._memory
+            for doc, score in scores.items():
+                if doc in self._deleted:
+                    continue
+                segment = memory if doc >= memory.first_doc else self._base
+                local = doc - segment.first_doc
+                if low is not None and segment.price_cents[local] < low:
+                    continue
+                if high is not None and segment.price_cents[local] > high:
+                    continue
+                if min_stock is not None and segment.stock[local] < min_stock:
+                    continue
+                hits.append((score, -segment.product_ids[local]))
+        return [(-negative_id, score) for score, negative_id in heapq.nlargest(limit, hits)]
+
+    def _postings(self, term: str) -> List[Tuple[int, Sequence[int]]]:
+        # (weight, documents) lists matching `term`, lowest weight first
+        lists = []
+        for segment in (self._base, self._memory):
+            if segment is None:
+                continue
+            for token, name, description in segment.matches(term, self.max_expansions):
+                exact = token == term
+                if len(name):
+                    lists.append((NAME_EXACT if exact else NAME_PREFIX, name))
+                if len(description):
+                    lists.append((DESCRIPTION_EXACT if exact else DESCRIPTION_PREFIX, description))
+        lists.sort(key=lambda item: item[0])
+        return lists
+
+    @staticmethod
+    def _score_term(lists: List[Tuple[int, Sequence[int]]], scores: Optional[Dict[int, int]]) -> Dict[int, int]:
+        # Adds the term's best weight per document to `scores`, keeping only documents the term matches
+        if scores is None or sum(len(docs) for _, docs in lists) <= 4 * len(scores):
+            weights = {}
+            for weight, docs in lists:
+                weights.update(dict.fromkeys(docs, weight))   # later lists weigh more and overwrite
+            if scores is None:
+                return weights
+            return {doc: scores[doc] + weights[doc] for doc in scores.keys() & weights.keys()}
+
+        # Few candidates against long postings: binary-search each candidate instead of reading the postings
+        matched = {}
+        for doc, score in scores.items():
+            for weight, docs in reversed(lists):
+                position = bisect.bisect_left(docs, doc)
+                if position < len(docs) and docs[position] == doc:
+                    matched[doc] = score + weight
+                    break
+        return matched
+
+    def save(self, path: Optional[str] = None):
+        """Writes the live products to `path` (default: the file the index was opened from) and maps the new file."""
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to save the product search index to.")
+        with self._lock:
+            columns = self._compacted()
+            temporary = path + ".tmp"
+            self._write(temporary, columns)
+            # The old mapping is closed before the rename, which Windows refuses for mapped files
+            if self._base is not None:
+                self._base.close()
+            os.replace(temporary, path)
+            self._base = _MappedSegment(path)
+            self._memory = _MemorySegment(len(self._base))
+            self._docs = {}
+            self._deleted = set()
+            self.path = path
+
+    def _compacted(self) -> Dict[str, array]:
+        # Live products renumbered in product id order, as file sections; holds no view of the mapping on return
+        base, memory = self._base, self._memory
+        live = []
+        for segment in (base, memory):
+            if segment is None:
+                continue
+            for local, product_id in enumerate(segment.product_ids):
+                if segment.first_doc + local not in self._deleted:
+                    live.append((product_id, segment, local))
+        live.sort(key=lambda item: item[0])
+        remap = array("q", [-1]) * (memory.first_doc + len(memory))
+        for new_doc, (_, segment, local) in enumerate(live):
+            remap[segment.first_doc + local] = new_doc
+
+        sources: Dict[str, List[Tuple[Sequence[int], Sequence[int]]]] = {}
+        for segment in (base, memory):
+            if segment is not None:
+                for token, name, description in segment.all_tokens():
+                    sources.setdefault(token, []).append((name, description))
+
+        columns = {
+            "product_ids": array("q", (product_id for product_id, _, _ in live)),
+            "price_cents": array("q", (segment.price_cents[local] for _, segment, local in live)),
+            "stock": array("q", (segment.stock[local] for _, segment, local in live)),
+            "token_offsets": array("q", [0]), "tokens": array("B"),
+            "name_offsets": array("q", [0]), "name_postings": array("I"),
+            "description_offsets": array("q", [0]), "description_postings": array("I"),
+        }
+        for token in sorted(sources):
+            name = sorted(remap[doc] for lists in sources[token] for doc in lists[0] if remap[doc] >= 0)
+            description = sorted(remap[doc] for lists in sources[token] for doc in lists[1] if remap[doc] >= 0)
+            if not name and not description:
+                continue   # only deleted products had it
+            columns["tokens"].frombytes(token.encode("utf-8"))
+            columns["token_offsets"].append(len(columns["tokens"]))
+            columns["name_postings"].extend(name)
+            columns["name_offsets"].append(len(columns["name_postings"]))
+            columns["description_postings"].extend(description)
+            columns["description_offsets"].append(len(columns["description_postings"]))
+        return columns
+
+    @staticmethod
+    def _write(path: str, columns: Dict[str, array]):
+        sections = {}
+        offset = 0
+        for name, _ in _SECTIONS:
+            sections[name] = [offset, len(columns[name])]
+            offset += -(-len(columns[name]) * columns[name].itemsize // 8) * 8
+        header = {"products": len(columns["product_ids"]), "tokens": len(columns["token_offsets"]) - 1,
+                  "byteorder": sys.byteorder, "sections": sections}
+        with open(path, "wb") as handle:
+            handle.write(MAGIC + json.dumps(header).encode("utf-8") + b"\n")
+            handle.write(b"\0" * (-handle.tell() % 8))
+            for name, _ in _SECTIONS:
+                columns[name].tofile(handle)
+                handle.write(b"\0" * (-(len(columns[name]) * columns[name].itemsize) % 8))
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._base is not None:
+                self._base.close()
+                self._base = None
@@ -0,0 +1,95 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decimal import Decimal
+from typing import Dict, Iterator, Optional, Tuple
+from entity.product_batch import to_cents
+from util.ConnectionPool import ConnectionPool
+from util.PricingEngine import CartLines, PricedCarts, PricingEngine
+
+
+class RepricingJob:
+    """Prices every stored cart, or re-checks every order, at current product prices.
+
+    Lines are streamed in key order with one query and priced by the engine
+    `carts_per_batch` carts at a time, so memory stays flat however many
+    carts or orders there are.
+    """
+
+    def __init__(self, pool: ConnectionPool, engine: Optional[PricingEngine] = None, carts_per_batch: int = 1000,
+                 page_size: int = 5000):
+        self.pool = pool
+        self.engine = engine if engine is not None else PricingEngine()
+        self.carts_per_batch = carts_per_batch
+        self.page_size = page_size
+        self.unpriced_orders = 0   # orders the last reconcile_orders() skipped because a product was deleted
+
+    def quote_carts(self, customer_discount_bp: Optional[Dict[int, int]] = None) -> Iterator[PricedCarts]:
+        """Yields priced batches of carts keyed by customer_id; customer_discount_bp gives per-customer promotions."""
+        sql = ("SELECT c.customer_id, c.product_id, p.price, c.quantity FROM cart c "
+               "JOIN products p ON p.product_id = c.product_id ORDER BY c.customer_id, c.product_id")
+        for lines in self._batches(sql):
+            discounts = None
+            if customer_discount_bp:
+                discounts = [customer_discount_bp.get(customer_id, 0) for customer_id in lines.keys]
+            yield self.engine.price(lines, cart_discount_bp=discounts)
+
+    def reconcile_orders(self, tolerance_cents: int = 0) -> Iterator[Tuple[int, Decimal, Decimal]]:
+        """Yields (order_id, stored total, total at current prices) for orders that differ by more than tolerance_cents.
+
+        order_items keeps no price of its own, so an order with a line whose
+        product was deleted has no current total; such orders are skipped
+        rather than reported, and counted in unpriced_orders.
+        """
+        sql = ("SELECT o.order_id, oi.product_id, p.price, oi.quantity, o.total_price FROM orders o "
+               "JOIN order_items oi ON oi.order_id = o.order_id "
+               "LEFT JOIN products p ON p.product_id = oi.product_id ORDER BY o.order_id")
+        stored: Dict[int, int] = {}
+        unpriced = set()
+        self.unpriced_orders = 0
+        for lines in self._batches(sql, stored, unpriced):
+            priced = self.engine.price(lines)
+            for index, order_id in enumerate(priced.keys):
+                if order_id in unpriced:
+                    continue
+                if abs(priced.total_cents[index] - stored[order_id]) > tolerance_cents:
+                    yield order_id, Decimal(stored[order_id]).scaleb(-2), priced.get_total(index)
+            self.unpriced_orders += len(unpriced)
+            stored.clear()
+            unpriced.clear()
+
+    def _batches(self, sql: str, extra: Optional[Dict[int, int]] = None, unpriced: Optional[set] = None) -> Iterator[CartLines]:
+        # Rows are (key, product_id, price, quantity[, key total]) ordered by key; a key never spans two batches.
+        # A line without a price is left out and its key added to `unpriced`.
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql)
+                lines = CartLines()
+                key = None
+                while True:
+                    rows = cursor.fetchmany(self.page_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        if row[0] != key:
+                            if key is not None:
+                                lines.end_cart(key)
+                                if len(lines) >= self.carts_per_batch:
+                                    yield lines
+                                    lines = CartLines()
+                            key = row[0]
+                            if extra is not None:
+                                extra[key] = to_cents(row[4])
+                        if row[2] is None:
+                            if unpriced is not None:
+                                unpriced.add(key)
+                        else:
+                            lines.add_line(row[1], to_cents(row[2]), row[3])
+                if key is not None:
+                    lines.end_cart(key)
+                if len(lines):
+                    yield lines
+            finally:
+                cursor.close()
@@ -0,0 +1,217 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from dao.ShardedOrderProcessorRepository import ShardedOrderProcessorRepository
+from util.ConnectionPool import ConnectionPool
+
+CUSTOMER_COLUMNS = "customer_id, name, email, password"
+CART_COLUMNS = "cart_id, customer_id, product_id, quantity"
+ORDER_COLUMNS = "order_id, customer_id, order_date, total_price, shipping_address"
+ORDER_ITEM_COLUMNS = "order_item_id, order_id, product_id, quantity"
+PRODUCT_COLUMNS = "product_id, name, price, description, stockQuantity"
+
+
+class Resharder:
+    """Moves buckets of customers, with their carts and orders, between shards while the repository serves.
+
+    A move copies the bucket to the target shard while it is still served by
+    the source, then freezes the bucket in the saved shard map and waits
+    `settle` seconds: long enough for every process sharing the map to reload
+    it and hold back its calls for the bucket, and for calls already under
+    way to finish. Only then does it copy what changed meanwhile, point the
+    map at the target (which lifts the freeze) and delete the rows left on
+    the source, so no write can land on the source after its last copy.
+    """
+
+    CHUNK_SIZE = 500   # customers per copy transaction; keeps IN lists under SQL Server's parameter limit
+    SETTLE_MARGIN = 1.0   # seconds on top of the refresh interval for calls routed just before the freeze
+
+    def __init__(self, repository: ShardedOrderProcessorRepository, progress: Optional[Callable[[str], None]] = None,
+                 settle: Optional[float] = None):
+        self.repository = repository
+        self.shard_map = repository.shard_map
+        self.progress = progress
+        self.settle = settle if settle is not None else repository.refresh_interval + self.SETTLE_MARGIN
+
+    def rebalance(self) -> List[Tuple[int, int, int]]:
+        # Evens out the buckets over all configured shards; returns (bucket, from shard, to shard) per move
+        moves = []
+        for index in range(len(self.repository.shards)):
+            self.sync_products(index)
+        for bucket, target in self.shard_map.rebalance_plan(len(self.repository.shards)):
+            source = self.shard_map.shard_of_bucket(bucket)
+            self.move_bucket(bucket, target)
+            moves.append((bucket, source, target))
+        return moves
+
+    def move_bucket(self, bucket: int, target: int) -> int:
+        """Moves one bucket to shard `target`; returns the number of customers moved.
+
+        The target shard must already hold the products (see sync_products()).
+        """
+        source = self.shard_map.shard_of_bucket(bucket)
+        if source == target:
+            return 0
+        source_pool = self.repository.shards[source].pool
+        target_pool = self.repository.shards[target].pool
+        copied = self._bucket_customers(source_pool, bucket)
+        self._sync(source_pool, target_pool, copied)
+        with self.repository.frozen([bucket]):
+            self.shard_map.freeze([bucket])
+            try:
+                time.sleep(self.settle)   # other processes reload the map and stop routing the bucket to the source
+                customer_ids = self._bucket_customers(source_pool, bucket)
+                # Customers deleted since the first copy are in `copied` only; _sync deletes them from the target
+                self._sync(source_pool, target_pool, sorted(set(copied) | set(customer_ids)))
+                self.shard_map.assign(bucket, target)
+            except BaseException:
+                self.shard_map.thaw([bucket])
+                raise
+        self._delete(source_pool, customer_ids)
+        self._report(f"Moved bucket {bucket} ({len(customer_ids)} customers) from shard {source} to shard {target}.")
+        return len(customer_ids)
+
+    def sync_products(self, index: int) -> int:
+        # Copies catalog products the shard lacks, e.g. on a new shard; returns how many were copied
+        pool = self.repository.shards[index].pool
+        copied = 0
+        after_id = None
+        while True:
+            products, after_id = self.repository.catalog.get_products_page(1000, after_id)
+            product_ids = [product.get_product_id() for product in products]
+            if product_ids:
+                existing = {row[0] for row in self._select(pool, "SELECT product_id FROM products WHERE product_id IN ({})", product_ids)}
+                missing = [(product.get_product_id(), product.get_name(), product.get_price(), product.get_description(),
+                            product.get_stockQuantity()) for product in products if product.get_product_id() not in existing]
+                if missing:
+                    self._write(pool, [(f"INSERT INTO products ({PRODUCT_COLUMNS}) VALUES (?, ?, ?, ?, ?)", missing)])
+                    copied += len(missing)
+            if after_id is None:
+                break
+        if copied:
+            self._report(f"Copied {copied} products to shard {index}.")
+        return copied
+
+    def cleanup(self) -> int:
+        """Undoes what an interrupted move left behind; returns the number of customers deleted.
+
+        Lifts freezes left in the map and deletes customers from shards the map
+        does not assign them to. Run it only while no move is in progress.
+        """
+        if self.shard_map.frozen:
+            self._report(f"Lifted the freeze on buckets {sorted(self.shard_map.frozen)}.")
+            self.shard_map.thaw(list(self.shard_map.frozen))
+        removed = 0
+        for index, shard in enumerate(self.repository.shards):
+            stray = [customer_id for customer_id in self._customer_ids(shard.pool) if self.shard_map.shard_of(customer_id) != index]
+            self._delete(shard.pool, stray)
+            removed += len(stray)
+        return removed
+
+    def counts(self) -> List[Dict[str, int]]:
+        # Buckets and customers per shard
+        counts = []
+        for index, shard in enumerate(self.repository.shards):
+            with shard.pool.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute("SELECT COUNT(*) FROM customers")
+                    customers = cursor.fetchone()[0]
+                finally:
+                    cursor.close()
+            counts.append({"buckets": len(self.shard_map.buckets_of(index)), "customers": customers})
+        return counts
+
+    def _bucket_customers(self, pool: ConnectionPool, bucket: int) -> List[int]:
+        # The hash is computed here rather than in SQL, so the scan reads only the key column
+        return [customer_id for customer_id in self._customer_ids(pool) if self.shard_map.bucket_of(customer_id) == bucket]
+
+    def _customer_ids(self, pool: ConnectionPool) -> List[int]:
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT customer_id FROM customers")
+                customer_ids = []
+                while True:
+                    rows = cursor.fetchmany(5000)
+                    if not rows:
+                        return customer_ids
+                    customer_ids.extend(row[0] for row in rows)
+            finally:
+                cursor.close()
+
+    def _sync(self, source: ConnectionPool, target: ConnectionPool, customer_ids: List[int]):
+        """Makes the target's rows of these customers equal to the source's, one transaction per chunk.
+
+        Customers are upserted (or deleted when gone from the source), carts are
+        replaced, and orders, which are never changed once written, are added
+        when missing.
+        """
+        for start in range(0, len(customer_ids), self.CHUNK_SIZE):
+            chunk = customer_ids[start:start + self.CHUNK_SIZE]
+            customers = self._select(source, f"SELECT {CUSTOMER_COLUMNS} FROM customers WHERE customer_id IN ({{}})", chunk)
+            cart = self._select(source, f"SELECT {CART_COLUMNS} FROM cart WHERE customer_id IN ({{}})", chunk)
+            orders = self._select(source, f"SELECT {ORDER_COLUMNS} FROM orders WHERE customer_id IN ({{}})", chunk)
+            items = self._select(source, "SELECT oi.order_item_id, oi.order_id, oi.product_id, oi.quantity FROM order_items oi "
+                                         "JOIN orders o ON o.order_id = oi.order_id WHERE o.customer_id IN ({})", chunk)
+
+            present = {row[0] for row in self._select(target, "SELECT customer_id FROM customers WHERE customer_id IN ({})", chunk)}
+            placed = {row[0] for row in self._select(target, "SELECT order_id FROM orders WHERE customer_id IN ({})", chunk)}
+            source_ids = {row[0] for row in customers}
+            gone = sorted(present - source_ids)
+            new_orders = [row for row in orders if row[0] not in placed]
+            new_order_ids = {row[0] for row in new_orders}
+            placeholders = ", ".join("?" for _ in chunk)
+            statements = [
+                ("UPDATE customers SET name = ?, email = ?, password = ? WHERE customer_id = ?",
+                 [tuple(row[1:]) + (row[0],) for row in customers if row[0] in present]),
+                (f"INSERT INTO customers ({CUSTOMER_COLUMNS}) VALUES (?, ?, ?, ?)", [tuple(row) for row in customers if row[0] not in present]),
+                (f"DELETE FROM cart WHERE customer_id IN ({placeholders})", [tuple(chunk)]),
+                (f"INSERT INTO cart ({CART_COLUMNS}) VALUES (?, ?, ?, ?)", [tuple(row) for row in cart]),
+                (f"INSERT INTO orders ({ORDER_COLUMNS}) VALUES (?, ?, ?, ?, ?)", [tuple(row) for row in new_orders]),
+                (f"INSERT INTO order_items ({ORDER_ITEM_COLUMNS}) VALUES (?, ?, ?, ?)",
+                 [tuple(row) for row in items if row[1] in new_order_ids]),
+            ]
+            if gone:
+                statements.append((f"DELETE FROM customers WHERE customer_id IN ({', '.join('?' for _ in gone)})", [tuple(gone)]))
+            self._write(target, statements)
+
+    def _delete(self, pool: ConnectionPool, customer_ids: List[int]):
+        # Carts, orders and order items go with their customers (ON DELETE CASCADE)
+        for start in range(0, len(customer_ids), self.CHUNK_SIZE):
+            chunk = customer_ids[start:start + self.CHUNK_SIZE]
+            self._write(pool, [(f"DELETE FROM customers WHERE customer_id IN ({', '.join('?' for _ in chunk)})", [tuple(chunk)])])
+
+    @staticmethod
+    def _select(pool: ConnectionPool, sql: str, values: List[int]) -> List[tuple]:
+        # `sql` has one {} where the placeholders for `values` go
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql.format(", ".join("?" for _ in values)), values)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def _write(pool: ConnectionPool, statements: Iterable[Tuple[str, List[tuple]]]):
+        # Every (sql, rows) as one executemany, all in one transaction
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for sql, rows in statements:
+                    if rows:
+                        cursor.executemany(sql, rows)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def _report(self, message: str):
+        if self.progress is not None:
+            self.progress(message)
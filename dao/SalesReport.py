@@ -0,0 +1,195 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from util.ColumnarFile import read_columns, write_columns
+from util.DatabaseBackend import DatabaseBackend
+
+# report name -> (key column, value columns) of the cumulative totals kept between runs
+REPORTS = {
+    "product_sales": ("product_id", ("units", "revenue_cents")),
+    "daily_revenue": ("day", ("orders", "revenue_cents")),
+    "customer_revenue": ("customer_id", ("orders", "revenue_cents")),
+}
+
+# Each worker aggregates its order_id range inside the database and returns only the grouped rows.
+# Money is summed as integer cents; ROUND(..., 0) is half away from zero, i.e. half up for prices.
+_RANGE = "o.order_id >= ? AND o.order_id < ? AND o.order_date >= ? AND o.order_date < ?"
+_PARTITION_QUERIES = {
+    # order_items has no unit price, so product revenue uses the product's current price
+    "product_sales": "SELECT oi.product_id, SUM(oi.quantity), SUM(oi.quantity * CAST(ROUND(p.price * 100, 0) AS BIGINT)) "
+                     "FROM orders o JOIN order_items oi ON oi.order_id = o.order_id "
+                     f"JOIN products p ON p.product_id = oi.product_id WHERE {_RANGE} GROUP BY oi.product_id",
+    "daily_revenue": "SELECT o.order_date, COUNT(*), SUM(CAST(ROUND(o.total_price * 100, 0) AS BIGINT)) "
+                     f"FROM orders o WHERE {_RANGE} GROUP BY o.order_date",
+    "customer_revenue": "SELECT o.customer_id, COUNT(*), SUM(CAST(ROUND(o.total_price * 100, 0) AS BIGINT)) "
+                        f"FROM orders o WHERE {_RANGE} GROUP BY o.customer_id",
+}
+
+
+def day_number(value) -> int:
+    # DATE as YYYYMMDD; pyodbc returns date objects, SQLite ISO text
+    return int(str(value)[:10].replace("-", ""))
+
+
+def aggregate_partition(backend: DatabaseBackend, low: int, high: int, first_day: date, end_day: date,
+                        page_size: int = 5000) -> Dict[str, Dict[int, List[int]]]:
+    """Totals of the orders with low <= order_id < high and first_day <= order_date < end_day; runs in a worker process."""
+    totals = {}
+    connection = backend.connect()
+    try:
+        cursor = connection.cursor()
+        try:
+            for name, sql in _PARTITION_QUERIES.items():
+                table = totals[name] = {}
+                cursor.execute(sql, (low, high, first_day, end_day))
+                while True:
+                    rows = cursor.fetchmany(page_size)
+                    if not rows:
+                        break
+                    for key, count, cents in rows:
+                        table[day_number(key) if name == "daily_revenue" else key] = [int(count), int(cents or 0)]
+        finally:
+            cursor.close()
+    finally:
+        connection.close()
+    return totals
+
+
+def merge_into(target: Dict[str, Dict[int, List[int]]], partial: Dict[str, Dict[int, List[int]]]):
+    for name, table in partial.items():
+        merged = target.setdefault(name, {})
+        for key, values in table.items():
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = list(values)
+            else:
+                for index, value in enumerate(values):
+                    entry[index] += value
+
+
+class SalesReport:
+    """Incremental sales aggregation over key-range partitions of orders, in a process pool.
+
+    Each run aggregates the days after the watermark up to (not including)
+    `until`, adds them to the cumulative totals of the previous run and writes
+    a new generation of columnar files. watermark.json is replaced last and
+    names that generation, so a crash mid-run leaves the previous one intact
+    and the next run redoes the same days. The watermark is a date rather
+    than an order id because ids come from per-process blocks and are not
+    committed in id order; a day before `until` no longer receives orders.
+    """
+
+    def __init__(self, backend: DatabaseBackend, output_dir: str, workers: Optional[int] = None,
+                 partitions_per_worker: int = 4):
+        self.backend = backend
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.partitions_per_worker = partitions_per_worker
+
+    def watermark(self) -> Optional[Dict]:
+        path = os.path.join(self.output_dir, "watermark.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+
+    def load(self, report: str) -> Dict[str, object]:
+        # Columns of a report from the current generation
+        watermark = self.watermark()
+        if watermark is None:
+            return {}
+        return read_columns(os.path.join(self.output_dir, watermark["generation"], report + ".col"))
+
+    def run(self, until: Optional[date] = None) -> Dict[str, object]:
+        until = until or date.today()
+        watermark = self.watermark()
+        first_day = date.fromisoformat(watermark["through"]) + timedelta(days=1) if watermark else date.min
+        if first_day >= until:
+            return {"orders": 0, "partitions": 0, "through": watermark["through"] if watermark else None}
+
+        connection = self.backend.connect()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT MIN(order_id), MAX(order_id), COUNT(*) FROM orders WHERE order_date >= ? AND order_date < ?",
+                           (first_day, until))
+            low, high, count = cursor.fetchone()
+            cursor.close()
+        finally:
+            connection.close()
+
+        totals = {name: {} for name in REPORTS}
+        if watermark is not None:
+            for name in REPORTS:
+                merge_into(totals, {name: self._rows_from_columns(name, self.load(name))})
+        partitions = self.partitions(low, high) if count else []
+        for partial in self._aggregate(partitions, first_day, until):
+            merge_into(totals, partial)
+
+        through = until - timedelta(days=1)
+        self._write_generation(totals, through, (watermark or {}).get("orders", 0) + count)
+        return {"orders": count, "partitions": len(partitions), "through": through.isoformat()}
+
+    def partitions(self, low: int, high: int) -> List[Tuple[int, int]]:
+        # Equal-width order_id ranges [start, end), a few per worker so an unlucky dense range does not hold up the rest
+        count = max(1, min(self.workers * self.partitions_per_worker, high - low + 1))
+        width = -(-(high - low + 1) // count)
+        return [(start, min(start + width, high + 1)) for start in range(low, high + 1, width)]
+
+    def _aggregate(self, partitions, first_day: date, until: date):
+        arguments = [(self.backend, start, end, first_day, until) for start, end in partitions]
+        if self.workers == 1 or len(partitions) <= 1:
+            return [aggregate_partition(*args) for args in arguments]
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(partitions))) as executor:
+            return list(executor.map(aggregate_partition, *zip(*arguments)))
+
+    @staticmethod
+    def _rows_from_columns(report: str, columns) -> Dict[int, List[int]]:
+        key, values = REPORTS[report]
+        if not columns:
+            return {}
+        return {key_value: list(row) for key_value, *row in zip(columns[key], *(columns[name] for name in values))}
+
+    def _stock_levels(self) -> Dict[int, int]:
+        connection = self.backend.connect()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT product_id, stockQuantity FROM products")
+            stock = {row[0]: row[1] or 0 for row in cursor.fetchall()}
+            cursor.close()
+        finally:
+            connection.close()
+        return stock
+
+    def _write_generation(self, totals: Dict[str, Dict[int, List[int]]], through: date, orders: int):
+        previous = self.watermark()
+        number = int(previous["generation"].split("-")[1]) + 1 if previous else 1
+        generation = f"gen-{number:06d}"
+        directory = os.path.join(self.output_dir, generation)
+        os.makedirs(directory, exist_ok=True)
+
+        stock = self._stock_levels()
+        for name, (key, values) in REPORTS.items():
+            keys = sorted(totals[name])
+            columns = {key: keys}
+            for index, value_name in enumerate(values):
+                columns[value_name] = [totals[name][key_value][index] for key_value in keys]
+            if name == "product_sales":
+                # Turnover = units sold / average inventory, with the average taken between the current stock and
+                # the stock before those units were sold: units / (stock + units / 2), in basis points
+                columns["stock"] = [stock.get(product_id, 0) for product_id in keys]
+                columns["turnover_bp"] = [units * 20000 // (2 * level + units) if units else 0
+                                          for units, level in zip(columns["units"], columns["stock"])]
+            write_columns(os.path.join(directory, name + ".col"), columns)
+
+        path = os.path.join(self.output_dir, "watermark.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump({"through": through.isoformat(), "generation": generation, "orders": orders}, handle)
+        os.replace(path + ".tmp", path)
+        if previous is not None:
+            shutil.rmtree(os.path.join(self.output_dir, previous["generation"]), ignore_errors=True)
@@ -0,0 +1,164 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from entity.customer import Customer
+from entity.product import Product
+from entity.lazy_product import LazyProduct
+from dao.OrderProcessorRepository import OrderProcessorRepository
+
+# Column -> getter; the base class getters read a LazyProduct's current value without loading it
+CUSTOMER_COLUMNS: Dict[str, Callable] = {"name": Customer.get_name, "email": Customer.get_email, "password": Customer.get_password}
+PRODUCT_COLUMNS: Dict[str, Callable] = {"name": Product.get_name, "price": Product.get_price,
+                                        "description": Product.get_description, "stockQuantity": Product.get_stockQuantity}
+
+
+class Session:
+    """Unit of work over a repository: an identity map, lazily loaded products and dirty tracking.
+
+    Within a session each customer and product is loaded at most once and is
+    always the same object, whichever call returned it. Loaded entities are
+    snapshotted; flush() compares them with their snapshots and writes only
+    the changed columns, all in one transaction. Products first seen through
+    a partial row are LazyProducts: the missing columns of every product
+    still waiting for them are read in one query on the first access.
+    A session is meant to be short-lived (one command or request) and used
+    by one thread.
+    """
+
+    def __init__(self, repository: OrderProcessorRepository):
+        self.repository = repository
+        self._customers: Dict[int, Optional[Customer]] = {}   # None remembers an id that does not exist
+        self._products: Dict[int, Optional[Product]] = {}
+        self._snapshots: Dict[Tuple[str, int], Dict[str, object]] = {}
+        self.loads = 0   # repository reads this session made
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        self.clear()
+
+    def get_customer(self, customer_id: int) -> Optional[Customer]:
+        if customer_id not in self._customers:
+            self.loads += 1
+            self._adopt_customer(customer_id, self.repository.get_customer_by_id(customer_id))
+        return self._customers[customer_id]
+
+    def get_product(self, product_id: int) -> Optional[Product]:
+        return self.get_products([product_id]).get(product_id)
+
+    def get_products(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        # Found products in the order asked for; only ids this session has not seen yet are read
+        product_ids = list(dict.fromkeys(product_ids))
+        unseen = [product_id for product_id in product_ids if product_id not in self._products]
+        if unseen:
+            self.loads += 1
+            found = self.repository.get_products_by_ids(unseen)
+            for product_id in unseen:
+                self._adopt_product(found.get(product_id), product_id)
+        return {product_id: self._products[product_id] for product_id in product_ids if self._products[product_id] is not None}
+
+    def get_cart(self, customer: Customer) -> List[Dict[str, object]]:
+        # Cart rows carry only name and price; the other columns load lazily
+        lines = self.repository.get_all_from_cart(customer)
+        self.loads += 1
+        cart = []
+        for line in lines:
+            row_product = line['product']
+            product = self._products.get(row_product.get_product_id())
+            if product is None:
+                product = self._adopt_product(LazyProduct(row_product.get_product_id(), self._load_missing,
+                                                          name=row_product.get_name(), price=row_product.get_price()))
+            cart.append({'product': product, 'quantity': line['quantity']})
+        return cart
+
+    def get_orders_by_customer(self, customer_id: int) -> Dict[Product, int]:
+        # Quantity ordered per product over all the customer's orders
+        self.loads += 1
+        ordered: Dict[Product, int] = {}
+        for row_product, quantity in self.repository.get_orders_by_customer(customer_id).items():
+            product = self._adopt_product(row_product)
+            ordered[product] = ordered.get(product, 0) + quantity
+        return ordered
+
+    def is_dirty(self) -> bool:
+        customers, products = self._changes()
+        return bool(customers or products)
+
+    def flush(self) -> Optional[bool]:
+        # True once the changes are written, False if the write failed, None when nothing had changed
+        customers, products = self._changes()
+        if not customers and not products:
+            return None
+        if not self.repository.update_columns(customers, products):
+            return False
+        for kind, changes in (("customer", customers), ("product", products)):
+            for entity_id, columns in changes.items():
+                self._snapshots[(kind, entity_id)].update(columns)
+        return True
+
+    def clear(self):
+        self._customers.clear()
+        self._products.clear()
+        self._snapshots.clear()
+
+    def _adopt_customer(self, customer_id: int, customer: Optional[Customer]) -> Optional[Customer]:
+        self._customers[customer_id] = customer
+        if customer is not None:
+            self._snapshots[("customer", customer_id)] = {column: get(customer) for column, get in CUSTOMER_COLUMNS.items()}
+        return customer
+
+    def _adopt_product(self, product: Optional[Product], product_id: Optional[int] = None) -> Optional[Product]:
+        # The session's own object wins over a freshly read copy of the same row
+        product_id = product.get_product_id() if product is not None else product_id
+        existing = self._products.get(product_id)
+        if existing is not None:
+            return existing
+        self._products[product_id] = product
+        if product is not None:
+            self._snapshots[("product", product_id)] = {column: get(product) for column, get in PRODUCT_COLUMNS.items()}
+        return product
+
+    def _load_missing(self, product: LazyProduct):
+        self._load_lazy()
+        if not product.is_loaded():
+            product.load(None, None, None, None)  # the product was deleted meanwhile
+
+    def _load_lazy(self):
+        # Fills every LazyProduct of the session in one query
+        waiting = {product_id: product for product_id, product in self._products.items()
+                   if isinstance(product, LazyProduct) and not product.is_loaded()}
+        if not waiting:
+            return
+        self.loads += 1
+        for product_id, row in self.repository.get_products_by_ids(waiting).items():
+            product = waiting[product_id]
+            snapshot = self._snapshots[("product", product_id)]
+            unset = {column: get(product) is None and snapshot[column] is None for column, get in PRODUCT_COLUMNS.items()}
+            product.load(row.get_name(), row.get_price(), row.get_description(), row.get_stockQuantity())
+            for column, get in PRODUCT_COLUMNS.items():
+                if unset[column]:
+                    snapshot[column] = get(product)   # loaded, not changed
+
+    def _changes(self) -> Tuple[Dict[int, Dict[str, object]], Dict[int, Dict[str, object]]]:
+        customers = {}
+        for customer_id, customer in self._customers.items():
+            if customer is not None:
+                changed = self._changed(("customer", customer_id), customer, CUSTOMER_COLUMNS)
+                if changed:
+                    customers[customer_id] = changed
+        products = {}
+        for product_id, product in self._products.items():
+            if product is not None:
+                changed = self._changed(("product", product_id), product, PRODUCT_COLUMNS)
+                if changed:
+                    products[product_id] = changed
+        return customers, products
+
+    def _changed(self, key: Tuple[str, int], entity, columns: Dict[str, Callable]) -> Dict[str, object]:
+        snapshot = self._snapshots[key]
+        return {column: get(entity) for column, get in columns.items() if get(entity) != snapshot[column]}
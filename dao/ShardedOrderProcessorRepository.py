@@ -0,0 +1,449 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from dao.BulkInsertResult import BulkInsertResult
+from dao.OrderProcessorRepository import OrderProcessorRepository
+from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from dao.ProductListener import ProductListener
+from entity.customer import Customer
+from entity.order import Order
+from entity.order_item import OrderItem
+from entity.product import Product
+from util.DBConnection import DBConnection
+from util.IdAllocator import IdAllocator, SequenceTableSource
+from util.PropertyUtil import PropertyUtil
+from util.ShardMap import ShardMap
+
+
+class ShardedOrderProcessorRepository(OrderProcessorRepository):
+    """Customers, carts and orders spread over several databases by a hash of customer_id.
+
+    Each shard is an OrderProcessorRepositoryImpl over its own pool, and the
+    ShardMap says which one holds a customer. The catalog node (the primary
+    database) owns the products and their stock and allocates every id, so
+    ids stay unique when customers move between shards. Every shard keeps a
+    copy of the products for its cart and order joins and foreign keys;
+    product writes go to the catalog and then to each shard, but stock is
+    only counted on the catalog (the copies keep the stockQuantity they were
+    created or last updated with). Listings across customers query all shards
+    at once and merge by customer_id, keeping each customer from the shard the
+    map assigns it to. Calls for a customer whose bucket is being moved wait
+    for the move to finish (see dao/Resharder.py): the mover's own calls at
+    once, other processes' once they reload the map with the bucket frozen.
+    """
+
+    def __init__(self, catalog: OrderProcessorRepositoryImpl, shards: List[OrderProcessorRepositoryImpl], shard_map: ShardMap,
+                 id_allocator: Optional[IdAllocator] = None, refresh_interval: float = 1.0):
+        if shard_map.shard_count() > len(shards):
+            raise ValueError(f"The shard map uses {shard_map.shard_count()} shards but only {len(shards)} are configured.")
+        self.catalog = catalog
+        self.shards = list(shards)
+        self.shard_map = shard_map
+        self.id_allocator = id_allocator if id_allocator is not None else catalog.id_allocator
+        self.refresh_interval = refresh_interval
+        self._executor = ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix="shard")
+        self._gate = threading.Condition()
+        self._frozen = set()                 # buckets being moved
+        self._active: Dict[int, int] = {}   # bucket -> calls in progress
+        self._next_refresh = time.monotonic() + refresh_interval
+
+    @classmethod
+    def from_properties(cls) -> Optional["ShardedOrderProcessorRepository"]:
+        # Sharded over ECOM_SHARDS with the configured database as the catalog node, or None when no shards are configured
+        shard_pools = DBConnection.get_shard_pools()
+        if not shard_pools:
+            return None
+        catalog_pool = DBConnection.get_pool()
+        id_allocator = IdAllocator(SequenceTableSource(catalog_pool))
+        catalog = OrderProcessorRepositoryImpl(catalog_pool, id_allocator, replicas=DBConnection.get_replicas())
+        shards = [OrderProcessorRepositoryImpl(pool, id_allocator) for pool in shard_pools]
+        return cls(catalog, shards, ShardMap.open(PropertyUtil.get_shard_map_path(), len(shards)))
+
+    @property
+    def search_index(self):
+        return self.catalog.search_index
+
+    @search_index.setter
+    def search_index(self, search_index):
+        self.catalog.search_index = search_index
+
+    def add_product_listener(self, listener: ProductListener):
+        self.catalog.add_product_listener(listener)
+
+    def close(self):
+        self._executor.shutdown()
+        self.catalog.pool.close()
+        for shard in self.shards:
+            shard.pool.close()
+
+    def shard_for(self, customer_id: int) -> OrderProcessorRepositoryImpl:
+        return self.shards[self.shard_map.shard_of(customer_id)]
+
+    @contextmanager
+    def frozen(self, buckets: Iterable[int]):
+        # Holds back new calls for customers in `buckets` and waits for the ones in progress; used while they move
+        buckets = set(buckets)
+        with self._gate:
+            self._frozen.update(buckets)
+            while any(self._active.get(bucket) for bucket in buckets):
+                self._gate.wait()
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._frozen.difference_update(buckets)
+                self._gate.notify_all()
+
+    @contextmanager
+    def _routed(self, customer_ids: Iterable[int]):
+        # Marks the customers' buckets busy for the duration and yields the shard map to route them with
+        buckets = {self.shard_map.bucket_of(customer_id) for customer_id in customer_ids}
+        with self._gate:
+            while True:
+                now = time.monotonic()
+                if now >= self._next_refresh:
+                    self.shard_map.reload_if_changed()   # a move made, or started, by another process
+                    self._next_refresh = now + self.refresh_interval
+                if not (self._frozen & buckets or self.shard_map.frozen & buckets):
+                    break
+                # A move in this process notifies when it ends; one in another process shows in the next reload
+                self._gate.wait(self.refresh_interval)
+            for bucket in buckets:
+                self._active[bucket] = self._active.get(bucket, 0) + 1
+        try:
+            yield self.shard_map
+        finally:
+            with self._gate:
+                for bucket in buckets:
+                    self._active[bucket] -= 1
+                    if not self._active[bucket]:
+                        del self._active[bucket]
+                self._gate.notify_all()
+
+    @contextmanager
+    def _shard(self, customer_id: int):
+        with self._routed([customer_id]) as shard_map:
+            yield self.shards[shard_map.shard_of(customer_id)]
+
+    def _scatter(self, call: Callable[[int, OrderProcessorRepositoryImpl], object]) -> List[object]:
+        # call(index, shard) on every shard in parallel; results in shard order
+        futures = [self._executor.submit(call, index, shard) for index, shard in enumerate(self.shards)]
+        return [future.result() for future in futures]
+
+    def _owned(self, index: int, customers: Iterable[Customer]) -> List[Customer]:
+        # Drops copies left on a shard the map no longer assigns them to (a move in progress or not cleaned up)
+        return [customer for customer in customers if self.shard_map.shard_of(customer.get_customer_id()) == index]
+
+    # Customers, carts and orders: routed to the customer's shard
+
+    def create_customer(self, customer: Customer) -> bool:
+        with self._shard(customer.get_customer_id()) as shard:
+            return shard.create_customer(customer)
+
+    def bulk_create_customers(self, customers: Iterable[Customer], chunk_size: int = 1000,
+                              progress: Optional[Callable[[BulkInsertResult], None]] = None) -> BulkInsertResult:
+        # Each chunk of the input is split by shard; errors keep their position in the whole input
+        result = BulkInsertResult()
+        customers = iter(customers)
+        position = 0
+        while True:
+            try:
+                chunk = list(islice(customers, chunk_size))
+            except Exception as e:
+                result.add_error(position, f"Error reading input: {e}")
+                break
+            if not chunk:
+                break
+            routable = []
+            for offset, customer in enumerate(chunk):
+                try:
+                    self.shard_map.bucket_of(customer.get_customer_id())
+                    routable.append((position + offset, customer))
+                except Exception as e:
+                    result.add_error(position + offset, f"Cannot route customer: {e}")
+            with self._routed(customer.get_customer_id() for _, customer in routable) as shard_map:
+                by_shard: Dict[int, List[Tuple[int, Customer]]] = {}
+                for entry in routable:
+                    by_shard.setdefault(shard_map.shard_of(entry[1].get_customer_id()), []).append(entry)
+                for index, entries in sorted(by_shard.items()):
+                    shard_result = self.shards[index].bulk_create_customers([customer for _, customer in entries], chunk_size)
+                    result.inserted += shard_result.inserted
+                    for offset, message in shard_result.errors:
+                        result.add_error(entries[offset][0], message)
+            position += len(chunk)
+            if progress is not None:
+                progress(result)
+        result.errors.sort()
+        return result
+
+    def delete_customer(self, customer_id: int) -> bool:
+        with self._shard(customer_id) as shard:
+            return shard.delete_customer(customer_id)
+
+    def update_customer(self, customer: Customer) -> bool:
+        with self._shard(customer.get_customer_id()) as shard:
+            return shard.update_customer(customer)
+
+    def get_customer_by_id(self, customer_id: int) -> Optional[Customer]:
+        with self._shard(customer_id) as shard:
+            return shard.get_customer_by_id(customer_id)
+
+    def add_to_cart(self, customer: Customer, product: Product, quantity: int) -> bool:
+        with self._shard(customer.get_customer_id()) as shard:
+            return shard.add_to_cart(customer, product, quantity)
+
+    def add_items_to_cart(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]]) -> bool:
+        with self._shard(customer.get_customer_id()) as shard:
+            return shard.add_items_to_cart(customer, product_quantity_map)
+
+    def remove_product_from_cart(self, customer_id: int, product_id: int) -> bool:
+        with self._shard(customer_id) as shard:
+            return shard.remove_product_from_cart(customer_id, product_id)
+
+    def remove_products_from_cart(self, customer_id: int, product_ids: Iterable[int]) -> int:
+        with self._shard(customer_id) as shard:
+            return shard.remove_products_from_cart(customer_id, product_ids)
+
+    def get_all_from_cart(self, customer: Customer) -> List[Dict[Product, int]]:
+        with self._shard(customer.get_customer_id()) as shard:
+            return shard.get_all_from_cart(customer)
+
+    def get_orders_by_customer(self, customer_id: int) -> Dict[Product, int]:
+        with self._shard(customer_id) as shard:
+            return shard.get_orders_by_customer(customer_id)
+
+    def get_order_history(self, customer_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                          after_order_id: Optional[int] = None, limit: Optional[int] = None,
+                          page_size: int = 500) -> Iterator[Order]:
+        # Page by page, each routed on its own and read in full before it is yielded, so a caller that
+        # stops iterating never keeps the customer's bucket busy (and a move waiting on it)
+        remaining = limit
+        while remaining is None or remaining > 0:
+            count = page_size if remaining is None else min(page_size, remaining)
+            with self._shard(customer_id) as shard:
+                page = list(shard.get_order_history(customer_id, start_date, end_date, after_order_id, count, page_size))
+            yield from page
+            if len(page) < count:
+                return
+            after_order_id = page[-1].get_order_id()
+            if remaining is not None:
+                remaining -= len(page)
+
+    def get_order_history_page(self, customer_id: int, page_size: int = 20, after_order_id: Optional[int] = None,
+                               start_date: Optional[date] = None, end_date: Optional[date] = None) -> Tuple[List[Order], Optional[int]]:
+        with self._shard(customer_id) as shard:
+            return shard.get_order_history_page(customer_id, page_size, after_order_id, start_date, end_date)
+
+    def place_order(self, customer: Customer, product_quantity_map: List[Tuple[Product, int]], shipping_address: str) -> bool:
+        # Stock is taken on the catalog node and committed, then the order is written on the customer's shard;
+        # if that fails the stock is given back
+        try:
+            customer_id = customer.get_customer_id()
+            lines = [(product.get_product_id(), quantity) for product, quantity in product_quantity_map]
+            total_price = self.calculate_total_price(product_quantity_map)
+            new_order_id = self.id_allocator.next_id("orders")
+            order_item_ids = self.id_allocator.next_ids("order_items", len(lines))
+            with self._shard(customer_id) as shard:
+                self._take_stock(lines)
+                try:
+                    with shard.pool.connection() as connection:
+                        cursor = connection.cursor()
+                        try:
+                            shard.order_writer.write(cursor, new_order_id, order_item_ids, customer_id, lines, total_price,
+                                                     shipping_address, decrement_stock=False)
+                            connection.commit()
+                        except Exception:
+                            connection.rollback()
+                            raise
+                        finally:
+                            cursor.close()
+                except Exception:
+                    self._return_stock(lines)
+                    raise
+                shard.note_write(customer_id)
+            return True
+        except Exception as e:
+            print(f"Error placing order: {e}")
+            return False
+
+    def checkout_cart(self, customer: Customer, shipping_address: str) -> Optional[Order]:
+        """Turns the customer's cart into an order on their shard, taking the stock on the catalog node.
+
+        The cart rows stay locked from the read to the commit, so the order
+        holds exactly the lines whose stock was taken; if the shard cannot
+        commit the order, the stock is given back.
+        """
+        try:
+            customer_id = customer.get_customer_id()
+            with self._shard(customer_id) as shard:
+                with shard.pool.connection() as connection:
+                    cursor = connection.cursor()
+                    try:
+                        shard.order_writer.lock_cart(cursor, customer_id)
+                        lines = shard.order_writer.read_cart(cursor, customer_id)
+                        if not lines:
+                            raise ValueError(f"The cart of customer {customer_id} is empty.")
+                        new_order_id = self.id_allocator.next_id("orders")
+                        order_item_ids = self.id_allocator.next_ids("order_items", len(lines))
+                        total_price = shard.pricing_engine.price_order((product_id, price, quantity) for product_id, _, price, quantity in lines)
+                        stock = [(product_id, quantity) for product_id, _, _, quantity in lines]
+                        self._take_stock(stock)
+                        try:
+                            shard.order_writer.write_cart(cursor, new_order_id, order_item_ids, customer_id, total_price, shipping_address)
+                            connection.commit()
+                        except Exception:
+                            self._return_stock(stock)
+                            raise
+                    except Exception:
+                        connection.rollback()
+                        raise
+                    finally:
+                        cursor.close()
+                shard.note_write(customer_id)
+            order = Order(new_order_id, customer_id, date.today(), total_price, shipping_address)
+            for order_item_id, (product_id, name, price, quantity) in zip(order_item_ids, lines):
+                product = Product(product_id=product_id, name=name, price=price, description='', stockQuantity=0)
+                order.add_item(OrderItem(order_item_id, new_order_id, product_id, quantity, product))
+            return order
+        except Exception as e:
+            print(f"Error checking out cart: {e}")
+            return None
+
+    def _take_stock(self, lines: List[Tuple[int, int]]):
+        self._on_catalog(lambda cursor: self.catalog.order_writer.decrement_stock(cursor, lines))
+
+    def _return_stock(self, lines: List[Tuple[int, int]]):
+        try:
+            self._on_catalog(lambda cursor: self.catalog.order_writer.restock(cursor, lines))
+        except Exception as e:
+            print(f"Error returning stock {lines} to the catalog: {e}")
+
+    def _on_catalog(self, work: Callable):
+        with self.catalog.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                work(cursor)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    # Listings across customers: every shard at once, merged by customer_id
+
+    def get_all_customers(self) -> List[Customer]:
+        results = self._scatter(lambda index, shard: self._owned(index, shard.get_all_customers()))
+        return sorted((customer for customers in results for customer in customers), key=Customer.get_customer_id)
+
+    def iter_customers(self, page_size: int = 500, after_id: Optional[int] = None) -> Iterator[Customer]:
+        streams = [self._owned_stream(index, shard.iter_customers(page_size, after_id)) for index, shard in enumerate(self.shards)]
+        return heapq.merge(*streams, key=Customer.get_customer_id)
+
+    def _owned_stream(self, index: int, customers: Iterator[Customer]) -> Iterator[Customer]:
+        for customer in customers:
+            if self.shard_map.shard_of(customer.get_customer_id()) == index:
+                yield customer
+
+    def get_customers_page(self, page_size: int = 50, after_id: Optional[int] = None) -> Tuple[List[Customer], Optional[int]]:
+        pages = self._scatter(lambda index, shard: shard.get_customers_page(page_size, after_id))
+        # Past the last key of a shard with more pages, rows of that shard are still unread: stop there
+        bound = min((next_key for _, next_key in pages if next_key is not None), default=None)
+        customers = sorted((customer for index, (page, _) in enumerate(pages) for customer in self._owned(index, page)
+                            if bound is None or customer.get_customer_id() <= bound), key=Customer.get_customer_id)
+        customers = customers[:page_size]
+        if len(customers) == page_size:
+            return customers, customers[-1].get_customer_id()
+        return customers, bound
+
+    # Products: the catalog node, with every write copied to the shards
+
+    def create_product(self, product: Product) -> bool:
+        if not self.catalog.create_product(product):
+            return False
+        return all([shard.create_product(product) for shard in self.shards])
+
+    def bulk_create_products(self, products: Iterable[Product], chunk_size: int = 1000,
+                             progress: Optional[Callable[[BulkInsertResult], None]] = None) -> BulkInsertResult:
+        # A product counts as inserted once the catalog has it; a shard that failed to take a copy is reported as an error
+        result = BulkInsertResult()
+        products = iter(products)
+        position = 0
+        while True:
+            try:
+                chunk = list(islice(products, chunk_size))
+            except Exception as e:
+                result.add_error(position, f"Error reading input: {e}")
+                break
+            if not chunk:
+                break
+            catalog_result = self.catalog.bulk_create_products(chunk, chunk_size)
+            result.inserted += catalog_result.inserted
+            failed = {offset for offset, _ in catalog_result.errors}
+            for offset, message in catalog_result.errors:
+                result.add_error(position + offset, message)
+            created = [(offset, product) for offset, product in enumerate(chunk) if offset not in failed]
+            for index, shard in enumerate(self.shards):
+                shard_result = shard.bulk_create_products([product for _, product in created], chunk_size)
+                for offset, message in shard_result.errors:
+                    result.add_error(position + created[offset][0], f"Shard {index}: {message}")
+            position += len(chunk)
+            if progress is not None:
+                progress(result)
+        return result
+
+    def delete_product(self, product_id: int) -> bool:
+        if not self.catalog.delete_product(product_id):
+            return False
+        return all([shard.delete_product(product_id) for shard in self.shards])
+
+    def update_columns(self, customers: Optional[Dict[int, Dict[str, object]]] = None,
+                       products: Optional[Dict[int, Dict[str, object]]] = None) -> bool:
+        """Like OrderProcessorRepositoryImpl.update_columns, with one transaction per database rather than one in all."""
+        ok = True
+        if customers:
+            with self._routed(customers) as shard_map:
+                by_shard: Dict[int, Dict[int, Dict[str, object]]] = {}
+                for customer_id, columns in customers.items():
+                    by_shard.setdefault(shard_map.shard_of(customer_id), {})[customer_id] = columns
+                for index, changes in sorted(by_shard.items()):
+                    ok = self.shards[index].update_columns(customers=changes) and ok
+        if products:
+            if not self.catalog.update_columns(products=products):
+                return False
+            ok = all([shard.update_columns(products=products) for shard in self.shards]) and ok
+        return ok
+
+    def get_product_by_id(self, product_id: int) -> Optional[Tuple[int, str, float, str, int]]:
+        return self.catalog.get_product_by_id(product_id)
+
+    def get_products_by_ids(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        return self.catalog.get_products_by_ids(product_ids)
+
+    def get_all_products(self) -> List[Product]:
+        return self.catalog.get_all_products()
+
+    def iter_products(self, page_size: int = 500, after_id: Optional[int] = None) -> Iterator[Product]:
+        return self.catalog.iter_products(page_size, after_id)
+
+    def get_products_page(self, page_size: int = 50, after_id: Optional[int] = None) -> Tuple[List[Product], Optional[int]]:
+        return self.catalog.get_products_page(page_size, after_id)
+
+    def load_product_batch(self, after_id: Optional[int] = None, limit: Optional[int] = None, page_size: int = 500):
+        return self.catalog.load_product_batch(after_id, limit, page_size)
+
+    def search_products(self, query: str, limit: int = 20, min_price=None, max_price=None, min_stock: Optional[int] = None) -> List[Product]:
+        return self.catalog.search_products(query, limit, min_price, max_price, min_stock)
+
+    def calculate_total_price(self, product_quantity_map: List[Tuple[Product, int]]) -> Decimal:
+        return self.catalog.calculate_total_price(product_quantity_map)
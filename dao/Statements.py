@@ -0,0 +1,41 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from util.StatementCache import StatementRegistry
+
+# Every fixed query of the repository, declared once; pooled connections keep a cursor per statement
+STATEMENTS = StatementRegistry()
+
+INSERT_PRODUCT = STATEMENTS.declare(
+    "insert_product", "INSERT INTO products (product_id, name, price, description, stockQuantity) VALUES (?, ?, ?, ?, ?)")
+INSERT_CUSTOMER = STATEMENTS.declare(
+    "insert_customer", "INSERT INTO customers (customer_id, name, email, password) VALUES (?, ?, ?, ?)")
+PRODUCT_BY_ID = STATEMENTS.declare(
+    "product_by_id", "SELECT product_id, name, price, description, stockQuantity FROM products WHERE product_id = ?")
+CUSTOMER_BY_ID = STATEMENTS.declare(
+    "customer_by_id", "SELECT customer_id, name, email, password FROM customers WHERE customer_id = ?")
+DELETE_PRODUCT = STATEMENTS.declare("delete_product", "DELETE FROM products WHERE product_id = ?")
+DELETE_CUSTOMER = STATEMENTS.declare("delete_customer", "DELETE FROM customers WHERE customer_id = ?")
+UPDATE_CUSTOMER = STATEMENTS.declare(
+    "update_customer", "UPDATE customers SET name = ?, email = ?, password = ? WHERE customer_id = ?")
+ALL_PRODUCTS = STATEMENTS.declare(
+    "all_products", "SELECT product_id, name, price, description, stockQuantity FROM products")
+ALL_CUSTOMERS = STATEMENTS.declare("all_customers", "SELECT customer_id, name, email, password FROM customers")
+
+ADD_CART_QUANTITY = STATEMENTS.declare(
+    "add_cart_quantity", "UPDATE cart SET quantity = quantity + ? WHERE customer_id = ? AND product_id = ?")
+INSERT_CART_LINE = STATEMENTS.declare(
+    "insert_cart_line", "INSERT INTO cart (cart_id, customer_id, product_id, quantity) VALUES (?, ?, ?, ?)")
+DELETE_CART_LINE = STATEMENTS.declare("delete_cart_line", "DELETE FROM cart WHERE customer_id = ? AND product_id = ?")
+CART_LINE_COUNT = STATEMENTS.declare(
+    "cart_line_count", "SELECT COUNT(DISTINCT product_id) FROM cart WHERE customer_id = ?")
+CART_ITEMS = STATEMENTS.declare(
+    "cart_items",
+    "SELECT p.product_id, p.name, p.price, c.quantity FROM cart c JOIN products p ON c.product_id = p.product_id "
+    "WHERE c.customer_id = ?")
+ORDERED_PRODUCTS = STATEMENTS.declare(
+    "ordered_products",
+    "SELECT oi.product_id, oi.quantity, p.name, p.price, p.description, p.stockQuantity FROM orders o "
+    "JOIN order_items oi ON o.order_id = oi.order_id JOIN products p ON oi.product_id = p.product_id "
+    "WHERE o.customer_id = ?")
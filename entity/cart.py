@@ -1,4 +1,6 @@
 class Cart:
+    __slots__ = ("__cart_id", "__customer_id", "__product_id", "__quantity")
+
     def __init__(self, cart_id, customer_id, product_id, quantity):
         self.__cart_id = cart_id
         self.__customer_id = customer_id
@@ -1,4 +1,6 @@
 class Customer:
+    __slots__ = ("__customer_id", "__name", "__email", "__password")
+
     def __init__(self, customer_id, name, email, password):
         self.__customer_id = customer_id
         self.__name = name
@@ -0,0 +1,62 @@
+from entity.product import Product
+
+
+class LazyProduct(Product):
+    # A product whose id is known but some columns are not; the first getter of a missing column calls loader(self),
+    # which fills them in with load()
+    __slots__ = ("__loader", "__missing")
+
+    FIELDS = ("name", "price", "description", "stockQuantity")
+
+    def __init__(self, product_id, loader, **known):
+        super().__init__(product_id, known.get("name"), known.get("price"), known.get("description"),
+                         known.get("stockQuantity"))
+        self.__loader = loader
+        self.__missing = {field for field in self.FIELDS if field not in known}
+
+    def is_loaded(self) -> bool:
+        return not self.__missing
+
+    def load(self, name, price, description, stockQuantity):
+        # Fills only the columns still missing, so values set before the load are kept
+        values = {"name": name, "price": price, "description": description, "stockQuantity": stockQuantity}
+        for field in self.__missing:
+            getattr(Product, f"set_{field}")(self, values[field])
+        self.__missing = set()
+
+    def _require(self, field):
+        if field in self.__missing:
+            self.__loader(self)
+            self.__missing.discard(field)  # the product may no longer exist; the column then stays None
+
+    def get_name(self):
+        self._require("name")
+        return super().get_name()
+
+    def set_name(self, name):
+        self.__missing.discard("name")
+        super().set_name(name)
+
+    def get_price(self):
+        self._require("price")
+        return super().get_price()
+
+    def set_price(self, price):
+        self.__missing.discard("price")
+        super().set_price(price)
+
+    def get_description(self):
+        self._require("description")
+        return super().get_description()
+
+    def set_description(self, description):
+        self.__missing.discard("description")
+        super().set_description(description)
+
+    def get_stockQuantity(self):
+        self._require("stockQuantity")
+        return super().get_stockQuantity()
+
+    def set_stockQuantity(self, stockQuantity):
+        self.__missing.discard("stockQuantity")
+        super().set_stockQuantity(stockQuantity)
@@ -1,10 +1,13 @@
 class Order:
-    def __init__(self, order_id, customer_id, order_date, total_price, shipping_address):
+    __slots__ = ("__order_id", "__customer_id", "__order_date", "__total_price", "__shipping_address", "__items")
+
+    def __init__(self, order_id, customer_id, order_date, total_price, shipping_address, items=None):
         self.__order_id = order_id
         self.__customer_id = customer_id
         self.__order_date = order_date
         self.__total_price = total_price
         self.__shipping_address = shipping_address
+        self.__items = items if items is not None else []  # OrderItem lines of this order
 
     # Getters and Setters
     def get_order_id(self):
@@ -36,3 +39,12 @@ class Order:
 
     def set_shipping_address(self, shipping_address):
         self.__shipping_address = shipping_address
+
+    def get_items(self):
+        return self.__items
+
+    def set_items(self, items):
+        self.__items = items
+
+    def add_item(self, item):
+        self.__items.append(item)
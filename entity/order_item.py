@@ -1,9 +1,12 @@
 class OrderItem:
-    def __init__(self, order_item_id, order_id, product_id, quantity):
+    __slots__ = ("__order_item_id", "__order_id", "__product_id", "__quantity", "__product")
+
+    def __init__(self, order_item_id, order_id, product_id, quantity, product=None):
         self.__order_item_id = order_item_id
         self.__order_id = order_id
         self.__product_id = product_id
         self.__quantity = quantity
+        self.__product = product  # Product details, when loaded together with the line
 
     # Getters and Setters
     def get_order_item_id(self):
@@ -29,3 +32,9 @@ class OrderItem:
 
     def set_quantity(self, quantity):
         self.__quantity = quantity
+
+    def get_product(self):
+        return self.__product
+
+    def set_product(self, product):
+        self.__product = product
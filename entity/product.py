@@ -1,4 +1,6 @@
 class Product:
+    __slots__ = ("__product_id", "__name", "__price", "__description", "__stockQuantity")
+
     def __init__(self, product_id, name, price, description, stockQuantity):
         self.__product_id = product_id
         self.__name = name
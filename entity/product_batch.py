@@ -0,0 +1,73 @@
+from array import array
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, Iterator
+from entity.product import Product
+
+
+_ONE = Decimal(1)
+
+
+def to_cents(price) -> int:
+    # Exact conversion of a DECIMAL(10,2) price (Decimal, float or str) to integer cents
+    if type(price) is int:
+        return price * 100
+    if not isinstance(price, Decimal):
+        price = Decimal(str(price))  # via str so a float like 9.99 stays 9.99
+    return int(price.scaleb(2).quantize(_ONE, rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+class ProductBatch:
+    """Columnar, array-backed holder for many products.
+
+    Numeric columns live in typed arrays (8 bytes per value, no per-row
+    objects); names and descriptions stay in plain lists.
+    """
+    __slots__ = ("product_ids", "price_cents", "stock_quantities", "names", "descriptions")
+
+    def __init__(self):
+        self.product_ids = array("q")
+        self.price_cents = array("q")
+        self.stock_quantities = array("q")
+        self.names = []
+        self.descriptions = []
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "ProductBatch":
+        # rows are (product_id, name, price, description, stockQuantity), as in the products table
+        batch = cls()
+        for row in rows:
+            batch.append(row[0], row[1], row[2], row[3], row[4])
+        return batch
+
+    @classmethod
+    def from_products(cls, products: Iterable[Product]) -> "ProductBatch":
+        batch = cls()
+        for product in products:
+            batch.append(product.get_product_id(), product.get_name(), product.get_price(),
+                         product.get_description(), product.get_stockQuantity())
+        return batch
+
+    def append(self, product_id, name, price, description, stockQuantity):
+        self.product_ids.append(product_id)
+        self.price_cents.append(to_cents(price))
+        self.stock_quantities.append(stockQuantity or 0)
+        self.names.append(name)
+        self.descriptions.append(description)
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def get_price(self, index: int) -> Decimal:
+        return from_cents(self.price_cents[index])
+
+    def get_product(self, index: int) -> Product:
+        return Product(self.product_ids[index], self.names[index], self.get_price(index),
+                       self.descriptions[index], self.stock_quantities[index])
+
+    def __iter__(self) -> Iterator[Product]:
+        for index in range(len(self.product_ids)):
+            yield self.get_product(index)
@@ -0,0 +1,4 @@
+class InsufficientStock(Exception):
+    def __init__(self, message="Insufficient stock for the requested quantity."):
+        self.message = message
+        super().__init__(self.message)
@@ -0,0 +1,4 @@
+class IntakeFull(Exception):
+    def __init__(self, message="Timed out waiting for room in the order intake queue."):
+        self.message = message
+        super().__init__(self.message)
@@ -0,0 +1,4 @@
+class PoolTimeout(Exception):
+    def __init__(self, message="Timed out waiting for a database connection."):
+        self.message = message
+        super().__init__(self.message)
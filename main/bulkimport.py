@@ -0,0 +1,122 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import csv
+import json
+import time
+from bisect import bisect_right
+from decimal import Decimal
+from typing import Dict, Iterator, List, Tuple
+from entity.customer import Customer
+from entity.product import Product
+from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from dao.BulkInsertResult import BulkInsertResult
+
+
+def product_from_record(record: Dict[str, str]) -> Product:
+    return Product(
+        product_id=int(record["product_id"]),
+        name=record["name"],
+        price=Decimal(str(record["price"])),
+        description=record.get("description") or "",
+        stockQuantity=int(record["stockQuantity"])
+    )
+
+
+def customer_from_record(record: Dict[str, str]) -> Customer:
+    return Customer(
+        customer_id=int(record["customer_id"]),
+        name=record["name"],
+        email=record["email"],
+        password=record["password"]
+    )
+
+
+ENTITY_TYPES = {
+    "products": (product_from_record, "bulk_create_products"),
+    "customers": (customer_from_record, "bulk_create_customers"),
+}
+
+
+def read_records(path: str, file_format: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    # Yields (line number, record) one at a time so memory stays constant
+    with open(path, newline="", encoding="utf-8") as source:
+        if file_format == "csv":
+            reader = csv.DictReader(source)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(source, start=1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+
+
+class BulkImporter:
+    def __init__(self, repository: OrderProcessorRepositoryImpl, entity_type: str, chunk_size: int = 1000, out=sys.stderr):
+        self.repository = repository
+        self.entity_type = entity_type
+        self.chunk_size = chunk_size
+        self.out = out
+        self.parse_errors: List[Tuple[int, str]] = []
+        # Line numbers of the records handed to the repository are only remembered around parse failures:
+        # (input position, line number) at each point where the position/line mapping shifts
+        self._anchors: List[Tuple[int, int]] = [(0, 0)]
+        self._started = 0.0
+
+    def run(self, path: str, file_format: str) -> BulkInsertResult:
+        convert, method = ENTITY_TYPES[self.entity_type]
+        self._started = time.monotonic()
+        result = getattr(self.repository, method)(self._entities(path, file_format, convert), self.chunk_size, self._report)
+        self._report(result, final=True)
+        return result
+
+    def line_for(self, index: int) -> int:
+        position, line_number = self._anchors[bisect_right(self._anchors, (index, float("inf"))) - 1]
+        return line_number + (index - position)
+
+    def _entities(self, path, file_format, convert):
+        position = 0
+        expected_line = None
+        for line_number, record in read_records(path, file_format):
+            try:
+                entity = convert(record)
+            except Exception as e:
+                self.parse_errors.append((line_number, f"Invalid record: {e}"))
+                continue
+            if line_number != expected_line:
+                self._anchors.append((position, line_number))
+            yield entity
+            position += 1
+            expected_line = line_number + 1
+
+    def _report(self, result: BulkInsertResult, final: bool = False):
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        processed = result.inserted + result.get_failed()
+        end = "\n" if final else "\r"
+        print(f"{processed} rows, {result.inserted} inserted, {result.get_failed() + len(self.parse_errors)} failed, "
+              f"{processed / elapsed:,.0f} rows/s", end=end, file=self.out, flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream products or customers from CSV/JSONL into the database.")
+    parser.add_argument("entity_type", choices=sorted(ENTITY_TYPES))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ("jsonl" if args.path.lower().endswith((".jsonl", ".json")) else "csv")
+    importer = BulkImporter(OrderProcessorRepositoryImpl(), args.entity_type, args.chunk_size)
+    result = importer.run(args.path, file_format)
+
+    errors = sorted(importer.parse_errors + [(importer.line_for(index), message) for index, message in result.errors])
+    for line_number, message in errors:
+        print(f"line {line_number}: {message}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,15 +3,44 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from decimal import Decimal, InvalidOperation
 from entity.customer import Customer
 from entity.product import Product
 from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from dao.ShardedOrderProcessorRepository import ShardedOrderProcessorRepository
+from dao.CachedOrderProcessorRepository import CachedOrderProcessorRepository
+from dao.ProductSearchIndex import ProductSearchIndex
+from dao.Session import Session
+from dao.CartStore import CartStore
+from util.DBConnection import DBConnection
+from util.IdAllocator import IdAllocator, SequenceTableSource
+from util.PropertyUtil import PropertyUtil
 from exception.customernotfound import CustomerNotFound
 from exception.productnotfound import ProductNotFound
 
 class EcomApp:
     def __init__(self):
-        self.repository = OrderProcessorRepositoryImpl()
+        # Sharded when ECOM_SHARDS lists shard databases
+        repository = ShardedOrderProcessorRepository.from_properties() or self._unsharded_repository()
+        # The search index is memory-mapped from its file and kept current by product creates and deletes
+        repository.search_index = ProductSearchIndex.open_or_build(PropertyUtil.get_search_index_path(), repository.iter_products)
+        repository.add_product_listener(repository.search_index)
+        # Product lookups in add_to_cart/place_order are served from the catalog cache
+        self.repository = CachedOrderProcessorRepository(repository)
+        # Unit of work of the command being run; see run()
+        self.session = None
+
+    @staticmethod
+    def _unsharded_repository() -> OrderProcessorRepositoryImpl:
+        # With ECOM_CART_JOURNAL set, cart changes are journaled locally and reach the database in batches
+        journal_path = PropertyUtil.get_cart_journal_path()
+        if journal_path is None:
+            return OrderProcessorRepositoryImpl()
+        pool = DBConnection.get_pool()
+        id_allocator = IdAllocator(SequenceTableSource(pool))
+        cart_store = CartStore(pool, id_allocator, journal_path=journal_path)
+        cart_store.start()
+        return OrderProcessorRepositoryImpl(pool, id_allocator, cart_store=cart_store, replicas=DBConnection.get_replicas())
 
     def display_menu(self):
         print("\nE-commerce Application\n")
@@ -26,7 +55,9 @@ class EcomApp:
         print("9. Update Customer Information")
         print("10. List All Customers")
         print("11. List All Products")
-        print("12. Exit")
+        print("12. Checkout Cart")
+        print("13. Search Products")
+        print("14. Exit")
 
     def register_customer(self):
         customerid = int(input("Enter customer Id: "))
@@ -62,23 +93,15 @@ class EcomApp:
         customer_id = int(input("Enter customer ID: "))
         product_id = int(input("Enter product ID: "))
         quantity = int(input("Enter quantity: "))
-        customer = self.repository.get_customer_by_id(customer_id)
+        customer = self.session.get_customer(customer_id)
         if not customer:
             print("Customer not found. Please register first.")
             return 
-        product_row = self.repository.get_product_by_id(product_id)
-        if not product_row:
+        product = self.session.get_product(product_id)
+        if not product:
             print("Product not found.")
             return
 
-        product = Product(
-            product_id=product_row[0],
-            name=product_row[1],
-            price=product_row[2],
-            description=product_row[3],
-            stockQuantity=product_row[4]
-        )
-        
         if self.repository.add_to_cart(customer, product, quantity):
             print("Product added to cart successfully.")
         else:
@@ -88,7 +111,7 @@ class EcomApp:
         customer_id = int(input("Enter customer ID: "))
         product_id = int(input("Enter product ID to remove from cart: "))
         
-        customer = self.repository.get_customer_by_id(customer_id)
+        customer = self.session.get_customer(customer_id)
         if not customer:
             print("Customer not found. Please register first.")
             return 
@@ -100,9 +123,9 @@ class EcomApp:
 
     def view_cart(self):
         customer_id = int(input("Enter customer ID: "))
-        customer = self.repository.get_customer_by_id(customer_id)
+        customer = self.session.get_customer(customer_id)
         if customer:
-            cart_items = self.repository.get_all_from_cart(customer)
+            cart_items = self.session.get_cart(customer)
             if cart_items:
                 print("Cart items:")
                 for item in cart_items:
@@ -118,26 +141,24 @@ class EcomApp:
         customer_id = int(input("Enter customer ID: "))
         shipping_address = input("Enter shipping address: ")
         product_quantity_map = []
-        customer = self.repository.get_customer_by_id(customer_id)
+        customer = self.session.get_customer(customer_id)
         if not customer:
             print("Customer not found. Please register first.")
             return
+        requested = []
         while True:
             product_id = int(input("Enter product ID to order (0 to finish): "))
             if product_id == 0:
                 break
             quantity = int(input("Enter quantity: "))
-            product_row = self.repository.get_product_by_id(product_id)
-            if not product_row:
+            requested.append((product_id, quantity))
+        # All products of the order are looked up in one query
+        products = self.session.get_products(product_id for product_id, _ in requested)
+        for product_id, quantity in requested:
+            product = products.get(product_id)
+            if product is None:
                 print(f"Product with ID {product_id} not found.")
                 continue
-            product = Product(
-                product_id=product_row[0],
-                name=product_row[1],
-                price=product_row[2],
-                description=product_row[3],
-                stockQuantity=product_row[4]
-            )
             if product.get_stockQuantity() < quantity:
                 print(f"Not enough stock for {product.get_name()}. Available: {product.get_stockQuantity()}")
                 continue
@@ -151,19 +172,54 @@ class EcomApp:
         else:
             print("Failed to place order.")
 
+    def search_products(self):
+        query = input("Search for: ")
+        max_price = input("Maximum price (leave blank for any): ").strip()
+        try:
+            max_price = Decimal(max_price) if max_price else None
+            if max_price is not None and not max_price.is_finite():
+                raise InvalidOperation(max_price)
+        except InvalidOperation:
+            print("Invalid price. Enter a number such as 19.99.")
+            return
+        in_stock = input("Only products in stock? (y/n): ").strip().lower() == "y"
+        products = self.repository.search_products(query, 20, max_price=max_price, min_stock=1 if in_stock else None)
+        if not products:
+            print("No products found.")
+            return
+        for product in products:
+            print(f"ID: {product.get_product_id()}, Name: {product.get_name()}, Price: {product.get_price()}, Stock: {product.get_stockQuantity()}")
+
+    def checkout_cart(self):
+        customer_id = int(input("Enter customer ID: "))
+        shipping_address = input("Enter shipping address: ")
+        customer = self.session.get_customer(customer_id)
+        if not customer:
+            print("Customer not found. Please register first.")
+            return
+        order = self.repository.checkout_cart(customer, shipping_address)
+        if order is not None:
+            print(f"Order {order.get_order_id()} placed with {len(order.get_items())} products, Total: {order.get_total_price()}")
+        else:
+            print("Failed to check out cart.")
+
     def view_customer_order(self):
         customer_id = int(input("Enter customer ID to view orders: "))
-        orders = self.repository.get_orders_by_customer(customer_id)
-        if orders:
-            print("Orders for Customer ID:", customer_id)
-            for product, quantity in orders.items():
-                print(f"- Product ID: {product.get_product_id()}, Quantity: {quantity}")
-        else:
+        found = False
+        for order in self.repository.get_order_history(customer_id):
+            if not found:
+                print("Orders for Customer ID:", customer_id)
+                found = True
+            print(f"Order {order.get_order_id()} on {order.get_order_date()}, Total: {order.get_total_price()}, Ship to: {order.get_shipping_address()}")
+            for item in order.get_items():
+                name = item.get_product().get_name() if item.get_product() is not None else "(deleted product)"
+                print(f"- Product ID: {item.get_product_id()}, {name}, Quantity: {item.get_quantity()}")
+        if not found:
             print("No orders found for this customer.")
 
     def update_customer_information(self):
         customer_id = int(input("Enter customer ID to update: "))
-        customer = self.repository.get_customer_by_id(customer_id)
+        customer = self.session.get_customer(customer_id)
         if not customer:
             print("Customer not found.")
             return
@@ -182,60 +238,84 @@ class EcomApp:
         if new_password:
             customer.set_password(new_password)
 
-        if self.repository.update_customer(customer):
+        # Only the columns that were changed are written
+        flushed = self.session.flush()
+        if flushed is None:
+            print("Nothing was changed.")
+        elif flushed:
             print("Customer information updated successfully.")
         else:
             print("Failed to update customer information.")
 
     def list_all_customers(self):
-        customers = self.repository.get_all_customers()
-        if customers:
-            print("List of Customers:")
-            for customer in customers:
-                print(f"ID: {customer.get_customer_id()}, Name: {customer.get_name()}, Email: {customer.get_email()}")
-        else:
+        # Customers are streamed page by page instead of being loaded all at once
+        found = False
+        for customer in self.repository.iter_customers():
+            if not found:
+                print("List of Customers:")
+                found = True
+            print(f"ID: {customer.get_customer_id()}, Name: {customer.get_name()}, Email: {customer.get_email()}")
+        if not found:
             print("No customers found.")
 
     def list_all_products(self):
-        products = self.repository.get_all_products()
-        if products:
-            print("List of Products:")
-            for product in products:
-                print(f"ID: {product.get_product_id()}, Name: {product.get_name()}, Price: {product.get_price()}, Description: {product.get_description()}, Stock: {product.get_stockQuantity()}")
-        else:
+        found = False
+        for product in self.repository.iter_products():
+            if not found:
+                print("List of Products:")
+                found = True
+            print(f"ID: {product.get_product_id()}, Name: {product.get_name()}, Price: {product.get_price()}, Description: {product.get_description()}, Stock: {product.get_stockQuantity()}")
+        if not found:
             print("No products found.")
 
     def run(self):
         while True:
             self.display_menu()
-            choice = input("Choose an operation (1-12): ")
-            if choice == '1':
-                self.register_customer()
-            elif choice == '2':
-                self.create_product()
-            elif choice == '3':
-                self.delete_product()
-            elif choice == '4':
-                self.add_to_cart()
-            elif choice == '5':
-                self.remove_from_cart()
-            elif choice == '6':
-                self.view_cart()
-            elif choice == '7':
-                self.place_order()
-            elif choice == '8':
-                self.view_customer_order()
-            elif choice == '9':
-                self.update_customer_information()
-            elif choice == '10':
-                self.list_all_customers()
-            elif choice == '11':
-                self.list_all_products()
-            elif choice == '12':
+            choice = input("Choose an operation (1-14): ")
+            if choice == '14':
+                self.repository.search_index.save()  # keeps this session's catalog changes for the next start
+                cart_store = getattr(self.repository, "cart_store", None)
+                if cart_store is not None:
+                    cart_store.stop()   # writes out the carts still pending
                 print("Thank you for visiting...We hope to see you again soon!")
                 break
-            else:
-                print("Invalid choice. Please try again.")
+            # Each command is one unit of work: entities are loaded once and changed columns written at the end
+            self.session = Session(self.repository)
+            try:
+                self.run_command(choice)
+                self.session.flush()
+            finally:
+                self.session = None
+
+    def run_command(self, choice):
+        if choice == '1':
+            self.register_customer()
+        elif choice == '2':
+            self.create_product()
+        elif choice == '3':
+            self.delete_product()
+        elif choice == '4':
+            self.add_to_cart()
+        elif choice == '5':
+            self.remove_from_cart()
+        elif choice == '6':
+            self.view_cart()
+        elif choice == '7':
+            self.place_order()
+        elif choice == '8':
+            self.view_customer_order()
+        elif choice == '9':
+            self.update_customer_information()
+        elif choice == '10':
+            self.list_all_customers()
+        elif choice == '11':
+            self.list_all_products()
+        elif choice == '12':
+            self.checkout_cart()
+        elif choice == '13':
+            self.search_products()
+        else:
+            print("Invalid choice. Please try again.")
 
 if __name__ == "__main__":
     app = EcomApp()
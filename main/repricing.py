@@ -0,0 +1,57 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import csv
+from typing import Dict, List
+from dao.RepricingJob import RepricingJob
+from util.DBConnection import DBConnection
+from util.PricingEngine import PricingEngine
+
+
+def parse_rates(values: List[str]) -> Dict[int, int]:
+    # "ID=BP" pairs, e.g. 17=1500 for 15 % off product (or customer) 17
+    rates = {}
+    for value in values or []:
+        key, _, rate = value.partition("=")
+        rates[int(key)] = int(rate)
+    return rates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quote every cart, or reconcile every order, at current product prices.")
+    parser.add_argument("command", choices=["carts", "orders"])
+    parser.add_argument("--tax-bp", type=int, default=0, help="tax rate in basis points, e.g. 1800 for 18 %%")
+    parser.add_argument("--promotion", nargs="*", metavar="PRODUCT_ID=BP", help="product discounts in basis points")
+    parser.add_argument("--customer-discount", nargs="*", metavar="CUSTOMER_ID=BP", help="cart discounts in basis points")
+    parser.add_argument("--batch", type=int, default=1000, help="carts priced per pass")
+    parser.add_argument("--output", help="CSV file (default: standard output)")
+    args = parser.parse_args(argv)
+
+    engine = PricingEngine(args.tax_bp, parse_rates(args.promotion))
+    job = RepricingJob(DBConnection.get_pool(), engine, carts_per_batch=args.batch)
+    handle = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        writer = csv.writer(handle)
+        if args.command == "carts":
+            writer.writerow(["customer_id", "subtotal", "discount", "tax", "total"])
+            for priced in job.quote_carts(parse_rates(args.customer_discount)):
+                writer.writerows(priced.rows())
+            return 0
+        writer.writerow(["order_id", "stored_total", "current_total"])
+        mismatches = 0
+        for mismatch in job.reconcile_orders():
+            writer.writerow(mismatch)
+            mismatches += 1
+        if job.unpriced_orders:
+            print(f"{job.unpriced_orders} orders with deleted products were not checked.", file=sys.stderr)
+        return 1 if mismatches else 0
+    finally:
+        if handle is not sys.stdout:
+            handle.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from dao.Resharder import Resharder
+from dao.ShardedOrderProcessorRepository import ShardedOrderProcessorRepository
+from util.SchemaBootstrapper import SchemaBootstrapper
+from util.SchemaMigrator import SchemaMigrator
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare the shards in ECOM_SHARDS and move customer buckets between them.")
+    parser.add_argument("command", choices=["init", "status", "rebalance", "move", "cleanup"])
+    parser.add_argument("bucket", nargs="?", type=int, help="bucket to move (move)")
+    parser.add_argument("shard", nargs="?", type=int, help="shard to move it to (move)")
+    args = parser.parse_args(argv)
+
+    repository = ShardedOrderProcessorRepository.from_properties()
+    if repository is None:
+        print("No shards configured; set ECOM_SHARDS.")
+        return 1
+    resharder = Resharder(repository, progress=print)
+    try:
+        started = time.perf_counter()
+        if args.command == "init":
+            # Schema and product copies on every shard, new or not
+            for index, shard in enumerate(repository.shards):
+                SchemaBootstrapper(shard.backend).create_all()
+                SchemaMigrator(shard.backend).migrate()
+                resharder.sync_products(index)
+        elif args.command == "rebalance":
+            moves = resharder.rebalance()
+            print(f"Moved {len(moves)} buckets in {time.perf_counter() - started:.1f}s")
+        elif args.command == "move":
+            if args.bucket is None or args.shard is None:
+                parser.error("move needs a bucket and a shard")
+            resharder.sync_products(args.shard)
+            resharder.move_bucket(args.bucket, args.shard)
+        elif args.command == "cleanup":
+            print(f"Deleted {resharder.cleanup()} customers from shards that no longer own them.")
+        for index, counts in enumerate(resharder.counts()):
+            print(f"shard {index}: {counts['buckets']} buckets, {counts['customers']:,} customers")
+        if repository.shard_map.frozen:
+            print(f"frozen buckets: {sorted(repository.shard_map.frozen)} (a move in progress, or interrupted: run cleanup)")
+    finally:
+        repository.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
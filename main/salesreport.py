@@ -0,0 +1,38 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from datetime import date
+from dao.SalesReport import REPORTS, SalesReport
+from util.DatabaseBackend import SqliteBackend, backend_from_properties
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate sales per product, day and customer since the last run.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--until", type=date.fromisoformat, help="first day not to include, YYYY-MM-DD (default: today)")
+    parser.add_argument("--sqlite", help="path of an SQLite database instead of the configured backend")
+    parser.add_argument("--show", type=int, default=0, metavar="N", help="print the first N rows of each report")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    backend = SqliteBackend(args.sqlite) if args.sqlite else backend_from_properties()
+    report = SalesReport(backend, args.output_dir, workers=args.workers)
+    started = time.perf_counter()
+    summary = report.run(args.until)
+    print(f"Aggregated {summary['orders']:,} new orders in {summary['partitions']} partitions "
+          f"through {summary['through']} in {time.perf_counter() - started:.1f}s")
+    for name in REPORTS if args.show else ():
+        columns = report.load(name)
+        print(f"\n{name}: " + "  ".join(columns))
+        for row in list(zip(*columns.values()))[:args.show]:
+            print("  " + "  ".join(str(value) for value in row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
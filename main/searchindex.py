@@ -0,0 +1,48 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from dao.ProductSearchIndex import ProductSearchIndex
+from util.PropertyUtil import PropertyUtil
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the product search index from the catalog, or query it.")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("text", nargs="?", default="", help="search text (query)")
+    parser.add_argument("--index", default=PropertyUtil.get_search_index_path(), help="index file (default: ECOM_SEARCH_INDEX)")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--min-price")
+    parser.add_argument("--max-price")
+    parser.add_argument("--in-stock", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+        started = time.perf_counter()
+        index = ProductSearchIndex()
+        for product in OrderProcessorRepositoryImpl().iter_products(page_size=5000):
+            index.add(product)
+        index.save(args.index)
+        print(f"Indexed {len(index):,} products into {args.index} in {time.perf_counter() - started:.1f}s")
+        index.close()
+        return 0
+
+    index = ProductSearchIndex.open(args.index)
+    try:
+        started = time.perf_counter()
+        hits = index.search(args.text, args.limit, args.min_price, args.max_price, 1 if args.in_stock else None)
+        elapsed = time.perf_counter() - started
+        for product_id, score in hits:
+            print(f"{product_id}\t{score}")
+        print(f"{len(hits)} results in {elapsed * 1000:.3f} ms", file=sys.stderr)
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,329 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import socket
+from decimal import Decimal, InvalidOperation
+from typing import List, Optional, Tuple
+from dao.AsyncOrderProcessorRepositoryImpl import AsyncOrderProcessorRepositoryImpl
+from dao.OrderProcessorRepositoryImpl import OrderProcessorRepositoryImpl
+from dao.ProductSearchIndex import ProductSearchIndex
+from dao.ShardedOrderProcessorRepository import ShardedOrderProcessorRepository
+from entity.customer import Customer
+from entity.product import Product
+from entity.order import Order
+from util.ConnectionPool import ConnectionPool
+from util.DatabaseBackend import backend_from_properties
+from util.HttpServer import HttpError, Request, Router, listening_socket, start_server
+from util.PropertyUtil import PropertyUtil
+
+
+def customer_json(customer: Customer) -> dict:
+    # The password never leaves the server
+    return {"customer_id": customer.get_customer_id(), "name": customer.get_name(), "email": customer.get_email()}
+
+
+def product_json(product: Product) -> dict:
+    return {"product_id": product.get_product_id(), "name": product.get_name(), "price": product.get_price(),
+            "description": product.get_description(), "stock_quantity": product.get_stockQuantity()}
+
+
+def order_json(order: Order) -> dict:
+    return {"order_id": order.get_order_id(), "customer_id": order.get_customer_id(), "order_date": order.get_order_date(),
+            "total_price": order.get_total_price(), "shipping_address": order.get_shipping_address(),
+            "items": [{"order_item_id": item.get_order_item_id(), "product_id": item.get_product_id(),
+                       "quantity": item.get_quantity(),
+                       "product": product_json(item.get_product()) if item.get_product() is not None else None}
+                      for item in order.get_items()]}
+
+
+def _field(body: dict, name: str, kind, required: bool = True):
+    value = body.get(name) if isinstance(body, dict) else None
+    if value is None:
+        if required:
+            raise HttpError(400, f"'{name}' is required.")
+        return None
+    try:
+        if kind is int and (isinstance(value, bool) or not isinstance(value, (int, str))):
+            raise ValueError
+        if kind is str and not isinstance(value, str):
+            raise ValueError
+        return Decimal(str(value)) if kind is Decimal else kind(value)
+    except (ValueError, InvalidOperation):
+        raise HttpError(400, f"'{name}' must be {'a number' if kind is Decimal else 'an integer' if kind is int else 'a string'}.")
+
+
+def _query_int(request: Request, name: str, default: Optional[int] = None, maximum: Optional[int] = None) -> Optional[int]:
+    if name not in request.query:
+        return default
+    try:
+        value = int(request.query[name])
+    except ValueError:
+        raise HttpError(400, f"Query parameter '{name}' must be an integer.")
+    return min(value, maximum) if maximum is not None else value
+
+
+class EcomService:
+    """The OrderProcessorRepository operations as a JSON API (see README "HTTP service")."""
+
+    MAX_PAGE_SIZE = 500
+
+    def __init__(self, repository: AsyncOrderProcessorRepositoryImpl):
+        self.repository = repository
+        self.router = Router()
+        routes = [
+            ("GET", "/health", self.health),
+            ("GET", "/customers", self.list_customers),
+            ("POST", "/customers", self.create_customer),
+            ("GET", "/customers/{customer_id:int}", self.get_customer),
+            ("PUT", "/customers/{customer_id:int}", self.update_customer),
+            ("DELETE", "/customers/{customer_id:int}", self.delete_customer),
+            ("GET", "/customers/{customer_id:int}/cart", self.get_cart),
+            ("POST", "/customers/{customer_id:int}/cart", self.add_to_cart),
+            ("DELETE", "/customers/{customer_id:int}/cart/{product_id:int}", self.remove_from_cart),
+            ("POST", "/customers/{customer_id:int}/checkout", self.checkout),
+            ("GET", "/customers/{customer_id:int}/orders", self.order_history),
+            ("POST", "/customers/{customer_id:int}/orders", self.place_order),
+            ("GET", "/products", self.list_products),
+            ("POST", "/products", self.create_product),
+            ("GET", "/products/search", self.search_products),
+            ("GET", "/products/{product_id:int}", self.get_product),
+            ("DELETE", "/products/{product_id:int}", self.delete_product),
+        ]
+        for method, pattern, handler in routes:
+            self.router.add(method, pattern, handler)
+
+    async def _customer(self, customer_id: int) -> Customer:
+        customer = await self.repository.get_customer_by_id(customer_id)
+        if customer is None:
+            raise HttpError(404, f"Customer ID {customer_id} does not exist.")
+        return customer
+
+    async def _lines(self, body) -> List[Tuple[Product, int]]:
+        # [{"product_id": 1, "quantity": 2}, ...] -> [(Product, quantity)], every product read in one query
+        items = body.get("items") if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            raise HttpError(400, "'items' must be a non-empty list.")
+        lines = [(_field(item, "product_id", int), _field(item, "quantity", int)) for item in items]
+        if any(quantity <= 0 for _, quantity in lines):
+            raise HttpError(400, "Quantities must be positive.")
+        products = await self.repository.get_products_by_ids(product_id for product_id, _ in lines)
+        missing = [product_id for product_id, _ in lines if product_id not in products]
+        if missing:
+            raise HttpError(404, f"Product IDs {missing} do not exist.")
+        return [(products[product_id], quantity) for product_id, quantity in lines]
+
+    async def health(self, request: Request):
+        return 200, {"status": "ok", "pid": os.getpid()}
+
+    async def list_customers(self, request: Request):
+        customers, next_key = await self.repository.get_customers_page(
+            _query_int(request, "page_size", 50, self.MAX_PAGE_SIZE), _query_int(request, "after_id"))
+        return 200, {"customers": [customer_json(customer) for customer in customers], "next_after_id": next_key}
+
+    async def create_customer(self, request: Request):
+        body = request.json()
+        customer = Customer(_field(body, "customer_id", int), _field(body, "name", str), _field(body, "email", str),
+                            _field(body, "password", str))
+        if not await self.repository.create_customer(customer):
+            raise HttpError(409, "Customer could not be created.")
+        return 201, customer_json(customer)
+
+    async def get_customer(self, request: Request):
+        return 200, customer_json(await self._customer(request.params["customer_id"]))
+
+    async def update_customer(self, request: Request):
+        body = request.json()
+        customer = Customer(request.params["customer_id"], _field(body, "name", str), _field(body, "email", str),
+                            _field(body, "password", str))
+        if not await self.repository.update_customer(customer):
+            raise HttpError(404, f"Customer ID {customer.get_customer_id()} does not exist.")
+        return 200, customer_json(customer)
+
+    async def delete_customer(self, request: Request):
+        if not await self.repository.delete_customer(request.params["customer_id"]):
+            raise HttpError(404, f"Customer ID {request.params['customer_id']} could not be deleted.")
+        return 204, None
+
+    async def get_cart(self, request: Request):
+        customer = await self._customer(request.params["customer_id"])
+        lines = await self.repository.get_all_from_cart(customer)
+        return 200, {"items": [{"product": product_json(line["product"]), "quantity": line["quantity"]} for line in lines]}
+
+    async def add_to_cart(self, request: Request):
+        customer = await self._customer(request.params["customer_id"])
+        lines = await self._lines(request.json())
+        if not await self.repository.add_items_to_cart(customer, lines):
+            raise HttpError(409, "Items could not be added to the cart.")
+        return 204, None
+
+    async def remove_from_cart(self, request: Request):
+        if not await self.repository.remove_product_from_cart(request.params["customer_id"], request.params["product_id"]):
+            raise HttpError(404, "The product is not in the cart.")
+        return 204, None
+
+    async def checkout(self, request: Request):
+        customer = await self._customer(request.params["customer_id"])
+        order = await self.repository.checkout_cart(customer, _field(request.json(), "shipping_address", str))
+        if order is None:
+            raise HttpError(409, "The cart is empty or short of stock.")
+        return 201, order_json(order)
+
+    async def place_order(self, request: Request):
+        customer = await self._customer(request.params["customer_id"])
+        body = request.json()
+        shipping_address = _field(body, "shipping_address", str)
+        if not await self.repository.place_order(customer, await self._lines(body), shipping_address):
+            raise HttpError(409, "The order could not be placed.")
+        return 201, {"placed": True}
+
+    async def order_history(self, request: Request):
+        orders, next_key = await self.repository.get_order_history_page(
+            request.params["customer_id"], _query_int(request, "page_size", 20, self.MAX_PAGE_SIZE),
+            _query_int(request, "after_order_id"))
+        return 200, {"orders": [order_json(order) for order in orders], "next_after_order_id": next_key}
+
+    async def list_products(self, request: Request):
+        products, next_key = await self.repository.get_products_page(
+            _query_int(request, "page_size", 50, self.MAX_PAGE_SIZE), _query_int(request, "after_id"))
+        return 200, {"products": [product_json(product) for product in products], "next_after_id": next_key}
+
+    async def create_product(self, request: Request):
+        body = request.json()
+        product = Product(_field(body, "product_id", int), _field(body, "name", str), _field(body, "price", Decimal),
+                          _field(body, "description", str, required=False) or "", _field(body, "stock_quantity", int))
+        if not await self.repository.create_product(product):
+            raise HttpError(409, "Product could not be created.")
+        return 201, product_json(product)
+
+    async def get_product(self, request: Request):
+        row = await self.repository.get_product_by_id(request.params["product_id"])
+        if row is None:
+            raise HttpError(404, f"Product ID {request.params['product_id']} does not exist.")
+        return 200, product_json(Product(row[0], row[1], row[2], row[3], row[4]))
+
+    async def delete_product(self, request: Request):
+        if not await self.repository.delete_product(request.params["product_id"]):
+            raise HttpError(404, f"Product ID {request.params['product_id']} could not be deleted.")
+        return 204, None
+
+    async def search_products(self, request: Request):
+        if getattr(self.repository.repository, "search_index", None) is None:
+            raise HttpError(503, "Product search is not enabled.")
+        try:
+            min_price = Decimal(request.query["min_price"]) if "min_price" in request.query else None
+            max_price = Decimal(request.query["max_price"]) if "max_price" in request.query else None
+        except InvalidOperation:
+            raise HttpError(400, "Price filters must be numbers.")
+        products = await self.repository.search_products(request.query.get("q", ""), _query_int(request, "limit", 20, 100),
+                                                         min_price, max_price, _query_int(request, "min_stock"))
+        return 200, {"products": [product_json(product) for product in products]}
+
+
+async def serve(sock: socket.socket, search_index_path: Optional[str] = None, keep_alive_timeout: float = 15.0,
+                max_pipeline: int = 64):
+    # Runs in each worker process: the pool and executor are created here, never inherited across fork
+    repository = ShardedOrderProcessorRepository.from_properties() or OrderProcessorRepositoryImpl()
+    if search_index_path is not None and os.path.exists(search_index_path):
+        # Memory-mapped read-only; products created through this worker are added to its in-memory segment
+        repository.search_index = ProductSearchIndex.open(search_index_path)
+        repository.add_product_listener(repository.search_index)
+    service = EcomService(AsyncOrderProcessorRepositoryImpl(repository))
+    server = await start_server(service.router, sock, keep_alive_timeout, max_pipeline)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        service.repository.close()
+        if isinstance(repository, ShardedOrderProcessorRepository):
+            repository.close()
+        else:
+            repository.pool.close()
+        if repository.search_index is not None:
+            repository.search_index.close()
+
+
+def _worker(host: str, port: int, reuse_port: bool, sock: Optional[socket.socket], search_index_path: Optional[str],
+            keep_alive_timeout: float, max_pipeline: int):
+    if sock is None:
+        sock = listening_socket(host, port, reuse_port)
+    try:
+        asyncio.run(serve(sock, search_index_path, keep_alive_timeout, max_pipeline))
+    except KeyboardInterrupt:
+        pass
+
+
+def _build_search_index(path: str):
+    # Built once by the parent on a short-lived pool, so workers only ever memory-map the finished file
+    if os.path.exists(path):
+        return
+    pool = ConnectionPool.for_backend(backend_from_properties(), min_size=0, max_size=1)
+    try:
+        ProductSearchIndex.open_or_build(path, OrderProcessorRepositoryImpl(pool).iter_products).close()
+    finally:
+        pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the e-commerce repository as a JSON API over HTTP/1.1.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per CPU)")
+    parser.add_argument("--keep-alive", type=float, default=15.0, help="seconds an idle connection is kept open")
+    parser.add_argument("--max-pipeline", type=int, default=64, help="queued requests per connection before reading pauses")
+    parser.add_argument("--no-search", action="store_true", help="do not open or build the product search index")
+    args = parser.parse_args(argv)
+
+    search_index_path = None if args.no_search else PropertyUtil.get_search_index_path()
+    if search_index_path is not None:
+        _build_search_index(search_index_path)
+
+    workers = max(args.workers, 1)
+    if workers > 1 and not hasattr(os, "fork"):
+        print("Multiple workers need fork(); serving with one worker.")
+        workers = 1
+    options = (search_index_path, args.keep_alive, args.max_pipeline)
+    print(f"Serving on http://{args.host}:{args.port} with {workers} worker(s)")
+    if workers == 1:
+        _worker(args.host, args.port, False, None, *options)
+        return 0
+
+    # With SO_REUSEPORT each worker binds its own socket and the kernel balances connections between them;
+    # otherwise the workers share one listening socket inherited from the parent
+    reuse_port = hasattr(socket, "SO_REUSEPORT")
+    shared = None if reuse_port else listening_socket(args.host, args.port)
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_worker, args=(args.host, args.port, reuse_port, shared, *options), daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # Stopping the parent (Ctrl+C or SIGTERM) stops every worker with it
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for process in processes:
+            process.join()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
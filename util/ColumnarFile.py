@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from array import array
+from typing import Dict, Sequence
+
+MAGIC = b"ECOLUMNS1\n"
+
+
+def write_columns(path: str, columns: Dict[str, Sequence[int]]):
+    """Writes equal-length int64 columns: a magic line, a JSON header line, then each column as little-endian bytes.
+
+    The file is written next to `path` and renamed over it, so readers never see a partial file.
+    """
+    names = list(columns)
+    arrays = [column if isinstance(column, array) and column.typecode == "q" else array("q", column) for column in columns.values()]
+    rows = len(arrays[0]) if arrays else 0
+    if any(len(column) != rows for column in arrays):
+        raise ValueError(f"Columns of {path} have different lengths.")
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(MAGIC)
+        handle.write(json.dumps({"rows": rows, "columns": names, "type": "int64"}).encode("utf-8") + b"\n")
+        for column in arrays:
+            if sys.byteorder == "big":
+                column = array("q", column)
+                column.byteswap()
+            column.tofile(handle)
+    os.replace(temporary, path)
+
+
+def read_columns(path: str) -> Dict[str, array]:
+    with open(path, "rb") as handle:
+        if handle.readline() != MAGIC:
+            raise ValueError(f"{path} is not a columnar file.")
+        header = json.loads(handle.readline())
+        columns = {}
+        for name in header["columns"]:
+            column = array("q")
+            column.fromfile(handle, header["rows"])
+            if sys.byteorder == "big":
+                column.byteswap()
+            columns[name] = column
+    return columns
@@ -0,0 +1,279 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from exception.pooltimeout import PoolTimeout
+from util.StatementCache import StatementCache
+
+
+class PooledConnection:
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.use_count = 0
+        self.statements = None  # StatementCache, created on first use
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of DB-API connections.
+
+    `connect` is any zero-argument callable returning a new connection, so the
+    same pool works for pyodbc/SQL Server and for a local SQLite stand-in.
+    `backend`, when given, tells the DAO which SQL dialect the connections speak.
+    `instrumentation`, when given and enabled, wraps the connections handed out
+    by connection() so every statement is timed (see util/Instrumentation.py).
+    """
+
+    def __init__(self, connect: Callable, min_size: int = 1, max_size: int = 10,
+                 timeout: float = 30.0, max_idle: float = 300.0,
+                 validation_query: Optional[str] = "SELECT 1", reset_on_return: bool = True, backend=None,
+                 instrumentation=None):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.validation_query = validation_query
+        self.reset_on_return = reset_on_return
+        self.backend = backend
+        self.instrumentation = instrumentation
+
+        self._lock = threading.Condition()
+        self._idle = deque()    # most recently returned connection on the right
+        self._all = set()       # every open PooledConnection, idle or borrowed
+        self._pending = 0       # slots reserved by threads currently opening a connection
+        self._closed = False
+        self._counters = {
+            "checkouts": 0,
+            "created": 0,
+            "reused": 0,
+            "evicted": 0,
+            "failed_checks": 0,
+            "timeouts": 0,
+        }
+
+    @classmethod
+    def for_backend(cls, backend, **settings) -> "ConnectionPool":
+        settings.setdefault("validation_query", backend.validation_query)
+        return cls(backend.connect, backend=backend, **settings)
+
+    def prefill(self):
+        # Open connections up to min_size so the first requests do not pay for the login
+        while True:
+            with self._lock:
+                if self._closed or len(self._all) + self._pending >= self.min_size:
+                    return
+                self._pending += 1
+            self._release_slot(self._open())
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            pooled = None
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed.")
+                evicted = self._evict_idle_locked()
+                if self._idle:
+                    pooled = self._idle.pop()
+                elif len(self._all) + self._pending < self.max_size:
+                    self._pending += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(f"No database connection available within {self.timeout if timeout is None else timeout}s "
+                                          f"(max_size={self.max_size}).")
+                    self._lock.wait(remaining)
+                    continue
+            for stale in evicted:
+                self._close_raw(stale)
+
+            if pooled is None:
+                pooled = self._open()
+                with self._lock:
+                    self._pending -= 1
+                    self._all.add(pooled)
+            elif not self._is_healthy(pooled):
+                with self._lock:
+                    self._counters["failed_checks"] += 1
+                self._discard(pooled)
+                continue
+            else:
+                with self._lock:
+                    self._counters["reused"] += 1
+
+            with self._lock:
+                self._counters["checkouts"] += 1
+            pooled.use_count += 1
+            pooled.last_used = time.monotonic()
+            return pooled
+
+    def release(self, pooled: PooledConnection, discard: bool = False):
+        if not discard and self.reset_on_return:
+            try:
+                # Never hand the next borrower someone else's open transaction
+                pooled.raw.rollback()
+            except Exception:
+                discard = True
+        with self._lock:
+            if not discard and not self._closed:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+                self._lock.notify()
+                return
+        self._discard(pooled)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        instrumentation = self.instrumentation
+        if instrumentation is None or not instrumentation.enabled:
+            pooled = self.acquire(timeout)
+            try:
+                yield pooled.raw
+            finally:
+                self.release(pooled)
+            return
+
+        started = time.perf_counter()
+        pooled = self.acquire(timeout)
+        instrumentation.record_pool_wait(time.perf_counter() - started)
+        connection = instrumentation.wrap(pooled.raw)
+        try:
+            yield connection
+        finally:
+            connection.finish()
+            self.release(pooled)
+
+    @contextmanager
+    def statements(self, timeout: Optional[float] = None):
+        # Like connection(), but yields the borrowed connection's StatementCache so declared statements reuse their cursors
+        instrumentation = self.instrumentation
+        if instrumentation is not None and not instrumentation.enabled:
+            instrumentation = None
+        if instrumentation is None:
+            pooled = self.acquire(timeout)
+        else:
+            started = time.perf_counter()
+            pooled = self.acquire(timeout)
+            instrumentation.record_pool_wait(time.perf_counter() - started)
+        if pooled.statements is None:
+            pooled.statements = StatementCache(pooled.raw)
+        connection = pooled.raw if instrumentation is None else instrumentation.wrap(pooled.raw)
+        try:
+            yield pooled.statements.bind(connection, instrumentation)
+        finally:
+            if instrumentation is not None:
+                connection.finish()
+            pooled.statements.bind(pooled.raw)
+            self.release(pooled)
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            evicted = self._evict_idle_locked()
+        for pooled in evicted:
+            self._close_raw(pooled)
+        return len(evicted)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            for pooled in idle:
+                self._all.discard(pooled)
+            self._lock.notify_all()
+        for pooled in idle:
+            self._close_raw(pooled)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._all)
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = len(self._all) - len(self._idle)
+        return stats
+
+    def connection_stats(self) -> List[Dict[str, float]]:
+        now = time.monotonic()
+        with self._lock:
+            pooled_connections = list(self._all)
+        return [
+            {
+                "id": id(pooled),
+                "use_count": pooled.use_count,
+                "age": now - pooled.created_at,
+                "idle_for": now - pooled.last_used,
+                "cached_statements": len(pooled.statements) if pooled.statements is not None else 0,
+            }
+            for pooled in pooled_connections
+        ]
+
+    def _open(self) -> PooledConnection:
+        try:
+            pooled = PooledConnection(self.connect())
+        except Exception:
+            self._release_slot(None)
+            raise
+        with self._lock:
+            self._counters["created"] += 1
+        return pooled
+
+    def _release_slot(self, pooled: Optional[PooledConnection]):
+        # Turn a reserved slot into an idle connection (or give it back on failure)
+        with self._lock:
+            self._pending -= 1
+            if pooled is not None:
+                self._all.add(pooled)
+                self._idle.appendleft(pooled)
+            self._lock.notify()
+
+    def _is_healthy(self, pooled: PooledConnection) -> bool:
+        if not self.validation_query:
+            return True
+        try:
+            cursor = pooled.raw.cursor()
+            try:
+                cursor.execute(self.validation_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle_locked(self) -> List[PooledConnection]:
+        # Oldest idle connections sit on the left; keep at least min_size open
+        evicted = []
+        if self.max_idle is None:
+            return evicted
+        now = time.monotonic()
+        while self._idle and len(self._all) > self.min_size and now - self._idle[0].last_used >= self.max_idle:
+            pooled = self._idle.popleft()
+            self._all.discard(pooled)
+            self._counters["evicted"] += 1
+            evicted.append(pooled)
+        return evicted
+
+    def _discard(self, pooled: PooledConnection):
+        with self._lock:
+            self._all.discard(pooled)
+            self._lock.notify()
+        self._close_raw(pooled)
+
+    @staticmethod
+    def _close_raw(pooled: PooledConnection):
+        if pooled.statements is not None:
+            pooled.statements.close()
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
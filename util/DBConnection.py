@@ -1,30 +1,77 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-import pyodbc
+import threading
 from util.PropertyUtil import PropertyUtil  # Adjust import based on your package structure
+from util.ConnectionPool import ConnectionPool
+from util.DatabaseBackend import DatabaseBackend, backend_from_properties
+from util.Instrumentation import Instrumentation
+from util.ReplicaSet import ReplicaSet
 
 class DBConnection:
-    connection = None
+    pool = None
+    replicas = None
+    _replicas_built = False
+    shard_pools = None
+    _pool_lock = threading.Lock()
 
     @staticmethod
-    def get_connection():
-        if DBConnection.connection is None:
-            try:
-                conn_str = PropertyUtil.get_property_string()
-                DBConnection.connection = pyodbc.connect(conn_str)
-                print("Connected Successfully")
-            except Exception as e:
-                print(f"Connection failed: {e}")
-        return DBConnection.connection
+    def get_backend() -> DatabaseBackend:
+        return DBConnection.get_pool().backend
+
+    @staticmethod
+    def connect():
+        # Opens a brand new connection; callers normally borrow from get_pool() instead
+        return DBConnection.get_backend().connect()
+
+    @staticmethod
+    def get_pool() -> ConnectionPool:
+        if DBConnection.pool is None:
+            with DBConnection._pool_lock:
+                if DBConnection.pool is None:
+                    settings = PropertyUtil.get_pool_settings()
+                    DBConnection.pool = ConnectionPool.for_backend(backend_from_properties(),
+                                                                   instrumentation=Instrumentation.from_properties(), **settings)
+        return DBConnection.pool
+
+    @staticmethod
+    def get_replicas():
+        # ReplicaSet over the configured read replicas, or None when there are none
+        if not DBConnection._replicas_built:
+            with DBConnection._pool_lock:
+                if not DBConnection._replicas_built:
+                    names = PropertyUtil.get_read_replicas()
+                    if names:
+                        settings = PropertyUtil.get_pool_settings()
+                        instrumentation = Instrumentation.from_properties()
+                        pools = [ConnectionPool.for_backend(backend_from_properties(name), instrumentation=instrumentation, **settings)
+                                 for name in names]
+                        DBConnection.replicas = ReplicaSet(pools, **PropertyUtil.get_replica_settings())
+                    DBConnection._replicas_built = True
+        return DBConnection.replicas
+
+    @staticmethod
+    def get_shard_pools():
+        # One pool per configured shard, in ECOM_SHARDS order (empty when not sharded)
+        if DBConnection.shard_pools is None:
+            with DBConnection._pool_lock:
+                if DBConnection.shard_pools is None:
+                    settings = PropertyUtil.get_pool_settings()
+                    instrumentation = Instrumentation.from_properties()
+                    DBConnection.shard_pools = [ConnectionPool.for_backend(backend_from_properties(name), instrumentation=instrumentation,
+                                                                           **settings)
+                                                for name in PropertyUtil.get_shards()]
+        return DBConnection.shard_pools
+
     @staticmethod
     def test_connection():
         # This method will only test the connection without executing any queries
-        connection = DBConnection.get_connection()
-        if connection:
-            print("Database connection is successful.")
-        else:
+        try:
+            with DBConnection.get_pool().connection():
+                print("Database connection is successful.")
+        except Exception as e:
+            print(f"Connection failed: {e}")
             print("Failed to connect to the database.")
 
 if __name__ == "__main__":
-    DBConnection.test_connection()
\ No newline at end of file
+    DBConnection.test_connection()
@@ -0,0 +1,179 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+from util.PropertyUtil import PropertyUtil
+
+# pyodbc binds these natively; SQLite stores DECIMAL as NUMERIC and DATE as ISO text. Registered at import so that
+# processes which unpickle a SqliteBackend (and skip __init__) bind them too.
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, datetime.isoformat)
+
+
+class DatabaseBackend(ABC):
+    """A database engine plus the SQL dialect the DAO must speak to it."""
+
+    name = None
+    validation_query = "SELECT 1"
+
+    @abstractmethod
+    def connect(self):
+        pass
+
+    @abstractmethod
+    def current_date(self) -> str:
+        """SQL expression for today's date."""
+        pass
+
+    @abstractmethod
+    def limit(self, select_sql: str, count: int) -> str:
+        """Restrict a plain `SELECT ...` statement to its first `count` rows."""
+        pass
+
+    @abstractmethod
+    def create_table_if_missing(self, table: str, create_sql: str) -> str:
+        pass
+
+    @abstractmethod
+    def locking_read(self, table: str) -> str:
+        """Table reference for a FROM clause whose rows stay locked against writers until the transaction ends."""
+        pass
+
+    @abstractmethod
+    def open_transaction(self, table: str) -> Optional[str]:
+        """Statement that opens the connection's transaction by reading `table`, or None if savepoint() opens it."""
+        pass
+
+    @abstractmethod
+    def savepoint(self, name: str) -> str:
+        """Statement that marks a savepoint in the open transaction."""
+        pass
+
+    @abstractmethod
+    def rollback_to_savepoint(self, name: str) -> str:
+        """Statement that undoes everything since the savepoint and leaves the transaction open."""
+        pass
+
+    @abstractmethod
+    def explain(self, cursor, sql: str, params: Sequence = ()) -> List[str]:
+        """Text lines of the engine's query plan for `sql`."""
+        pass
+
+
+class SqlServerBackend(DatabaseBackend):
+    name = "sqlserver"
+
+    def __init__(self, connection_string: Optional[str] = None):
+        self.connection_string = connection_string if connection_string is not None else PropertyUtil.get_property_string()
+
+    def connect(self):
+        import pyodbc  # only needed when SQL Server is actually used
+        return pyodbc.connect(self.connection_string)
+
+    def current_date(self) -> str:
+        return "GETDATE()"
+
+    def limit(self, select_sql: str, count: int) -> str:
+        return f"SELECT TOP ({int(count)}) " + select_sql[len("SELECT "):]
+
+    def create_table_if_missing(self, table: str, create_sql: str) -> str:
+        return f"IF OBJECT_ID(N'{table}', N'U') IS NULL {create_sql}"
+
+    def locking_read(self, table: str) -> str:
+        return f"{table} WITH (UPDLOCK, HOLDLOCK)"
+
+    def open_transaction(self, table: str) -> Optional[str]:
+        # With autocommit off, pyodbc runs in implicit transaction mode: reading a table opens the transaction that
+        # commit() ends. SAVE TRANSACTION does not open one, and BEGIN TRANSACTION would nest a second (@@TRANCOUNT 2)
+        # that commit() leaves open.
+        return f"SELECT COUNT(*) FROM {table} WHERE 1 = 0"
+
+    def savepoint(self, name: str) -> str:
+        return f"SAVE TRANSACTION {name}"
+
+    def rollback_to_savepoint(self, name: str) -> str:
+        return f"ROLLBACK TRANSACTION {name}"
+
+    def explain(self, cursor, sql: str, params: Sequence = ()) -> List[str]:
+        # With SHOWPLAN_TEXT on, the statement is compiled but not run and the plan comes back as rows
+        cursor.execute("SET SHOWPLAN_TEXT ON")
+        try:
+            cursor.execute(sql, params)
+            lines = []
+            while True:
+                lines.extend(str(row[0]) for row in cursor.fetchall())
+                if not cursor.nextset():
+                    break
+            return lines
+        finally:
+            cursor.execute("SET SHOWPLAN_TEXT OFF")
+
+
+class SqliteBackend(DatabaseBackend):
+    """Embedded SQLite engine in WAL mode, for edge nodes, tests and benchmarks."""
+
+    name = "sqlite"
+
+    # WAL lets readers run alongside the single writer; NORMAL sync is durable across application crashes in WAL mode
+    DEFAULT_PRAGMAS: Dict[str, object] = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "foreign_keys": "ON",
+        "temp_store": "MEMORY",
+        "cache_size": -65536,       # 64 MiB page cache per connection
+        "mmap_size": 268435456,     # 256 MiB memory-mapped I/O
+        "busy_timeout": 30000,
+    }
+
+    def __init__(self, path: str, pragmas: Optional[Dict[str, object]] = None):
+        self.path = path
+        self.pragmas = dict(self.DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+    def connect(self):
+        # Connections move between pool threads, but the pool only lends each to one thread at a time
+        connection = sqlite3.connect(self.path, timeout=self.pragmas["busy_timeout"] / 1000, check_same_thread=False)
+        for pragma, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        return connection
+
+    def current_date(self) -> str:
+        return "DATE('now', 'localtime')"
+
+    def limit(self, select_sql: str, count: int) -> str:
+        return f"{select_sql} LIMIT {int(count)}"
+
+    def create_table_if_missing(self, table: str, create_sql: str) -> str:
+        return "CREATE TABLE IF NOT EXISTS " + create_sql[len("CREATE TABLE "):]
+
+    def locking_read(self, table: str) -> str:
+        # The database has a single writer: once a transaction has written, nothing it read can change under it
+        return table
+
+    def open_transaction(self, table: str) -> Optional[str]:
+        return None
+
+    def savepoint(self, name: str) -> str:
+        # Outside a transaction SAVEPOINT opens one; COMMIT then ends it together with every savepoint inside
+        return f"SAVEPOINT {name}"
+
+    def rollback_to_savepoint(self, name: str) -> str:
+        return f"ROLLBACK TO SAVEPOINT {name}"
+
+    def explain(self, cursor, sql: str, params: Sequence = ()) -> List[str]:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[3] for row in cursor.fetchall()]
+
+
+def backend_from_properties(replica: Optional[str] = None) -> DatabaseBackend:
+    # The primary, or a read replica or shard named as in PropertyUtil.get_read_replicas()/get_shards()
+    if PropertyUtil.get_backend_name() == "sqlite":
+        return SqliteBackend(replica or PropertyUtil.get_sqlite_path())
+    return SqlServerBackend(PropertyUtil.get_property_string(replica) if replica else None)
@@ -0,0 +1,292 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import re
+import socket
+import time
+from collections import deque
+from datetime import date
+from decimal import Decimal
+from email.utils import formatdate
+from http import HTTPStatus
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        self.status = status
+        self.message = message
+        super().__init__(message)
+
+
+class Request:
+    __slots__ = ("method", "path", "query", "headers", "body", "params", "keep_alive")
+
+    def __init__(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str], body: bytes, keep_alive: bool):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers     # lower-case names
+        self.body = body
+        self.params: Dict[str, object] = {}   # path parameters filled in by the router
+        self.keep_alive = keep_alive
+
+    def json(self):
+        if not self.body:
+            raise HttpError(400, "A JSON request body is required.")
+        try:
+            return json.loads(self.body)
+        except ValueError as e:
+            raise HttpError(400, f"Invalid JSON body: {e}")
+
+
+# A handler returns (status, JSON-serialisable body); body None sends no content
+Handler = Callable[[Request], Awaitable[Tuple[int, object]]]
+
+
+def _json_default(value):
+    # Money stays exact as a string; dates as ISO text
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
+
+
+class Router:
+    """Method + path routing; "{name}" matches one segment and "{name:int}" an integer id."""
+
+    _PARAMETER = re.compile(r"\{(\w+)(?::(int))?\}")
+
+    def __init__(self):
+        self._static: Dict[Tuple[str, str], Handler] = {}
+        self._patterns: List[Tuple[str, re.Pattern, Dict[str, bool], Handler]] = []
+
+    def add(self, method: str, pattern: str, handler: Handler):
+        if "{" not in pattern:
+            self._static[(method, pattern)] = handler
+            return
+        integers = {}
+
+        def parameter(match):
+            integers[match.group(1)] = match.group(2) == "int"
+            return rf"(?P<{match.group(1)}>\d+)" if match.group(2) == "int" else rf"(?P<{match.group(1)}>[^/]+)"
+
+        self._patterns.append((method, re.compile("^" + self._PARAMETER.sub(parameter, pattern) + "$"), integers, handler))
+
+    def route(self, method: str, pattern: str):
+        def decorator(handler: Handler) -> Handler:
+            self.add(method, pattern, handler)
+            return handler
+        return decorator
+
+    def resolve(self, request: Request) -> Handler:
+        handler = self._static.get((request.method, request.path))
+        if handler is not None:
+            return handler
+        path_matched = False
+        for method, regex, integers, handler in self._patterns:
+            match = regex.match(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                path_matched = True
+                continue
+            request.params = {name: int(value) if integers[name] else unquote(value) for name, value in match.groupdict().items()}
+            return handler
+        if path_matched or any(path == request.path for _, path in self._static):
+            raise HttpError(405, f"{request.method} is not allowed on {request.path}.")
+        raise HttpError(404, f"No route for {request.path}.")
+
+
+class _Date:
+    # The Date header changes once a second; it is formatted once per second, not per response
+    value = b""
+    second = 0
+
+    @classmethod
+    def header(cls) -> bytes:
+        now = int(time.time())
+        if now != cls.second:
+            cls.second = now
+            cls.value = formatdate(now, usegmt=True).encode("ascii")
+        return cls.value
+
+
+class HttpProtocol(asyncio.Protocol):
+    """HTTP/1.1 over one connection: keep-alive, pipelined requests answered in order, bounded buffering.
+
+    Parsed requests queue up behind the one being handled; reading pauses while
+    `max_pipeline` requests are queued or the transport's write buffer is full,
+    so a fast client cannot make the server buffer without limit.
+    """
+
+    MAX_HEADER_BYTES = 65536
+    MAX_BODY_BYTES = 1048576
+
+    def __init__(self, router: Router, keep_alive_timeout: float = 15.0, max_pipeline: int = 64):
+        self.router = router
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_pipeline = max_pipeline
+        self.transport = None
+        self._buffer = bytearray()
+        self._queue: Deque[Request] = deque()
+        self._worker: Optional[asyncio.Task] = None
+        self._idle_timer = None
+        self._reading_paused = False
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._closing = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reset_idle_timer()
+
+    def connection_lost(self, exc):
+        self._closing = True
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        if self._worker is not None:
+            self._worker.cancel()
+        self._writable.set()
+
+    def pause_writing(self):
+        self._writable.clear()
+
+    def resume_writing(self):
+        self._writable.set()
+
+    def data_received(self, data: bytes):
+        self._buffer += data
+        try:
+            while not self._closing:
+                request = self._parse()
+                if request is None:
+                    break
+                self._queue.append(request)
+        except HttpError as e:
+            # The stream cannot be resynchronised after a malformed request: answer it, then close
+            self._queue.append(e)
+            self._closing = True
+        if self._queue and self._worker is None:
+            self._worker = asyncio.get_running_loop().create_task(self._serve())
+        if len(self._queue) >= self.max_pipeline and not self._reading_paused:
+            self.transport.pause_reading()
+            self._reading_paused = True
+
+    def _parse(self) -> Optional[Request]:
+        end = self._buffer.find(b"\r\n\r\n")
+        if end < 0:
+            if len(self._buffer) > self.MAX_HEADER_BYTES:
+                raise HttpError(431, "Request headers are too large.")
+            return None
+        lines = bytes(self._buffer[:end]).decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise HttpError(400, "Malformed request line.")
+        headers = {}
+        for line in lines[1:]:
+            name, separator, value = line.partition(":")
+            if not separator:
+                raise HttpError(400, "Malformed header line.")
+            headers[name.strip().lower()] = value.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(501, "Chunked request bodies are not supported; send Content-Length.")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HttpError(400, "Invalid Content-Length.")
+        if length > self.MAX_BODY_BYTES:
+            raise HttpError(413, "Request body is too large.")
+        if len(self._buffer) < end + 4 + length:
+            return None
+        body = bytes(self._buffer[end + 4:end + 4 + length])
+        del self._buffer[:end + 4 + length]
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        path, _, query_string = target.partition("?")
+        return Request(method, path, dict(parse_qsl(query_string)), headers, body, keep_alive)
+
+    async def _serve(self):
+        try:
+            while self._queue:
+                request = self._queue.popleft()
+                if self._reading_paused and len(self._queue) < self.max_pipeline // 2:
+                    self.transport.resume_reading()
+                    self._reading_paused = False
+                if isinstance(request, HttpError):
+                    self._write(request.status, {"error": request.message}, False)
+                    break
+                status, body = await self._dispatch(request)
+                if self._closing and self.transport.is_closing():
+                    return
+                self._write(status, body, request.keep_alive)
+                if not request.keep_alive:
+                    break
+                await self._writable.wait()
+            else:
+                self._worker = None
+                self._reset_idle_timer()
+                return
+            self._worker = None
+            self.transport.close()
+        except asyncio.CancelledError:
+            pass
+
+    async def _dispatch(self, request: Request) -> Tuple[int, object]:
+        try:
+            return await self.router.resolve(request)(request)
+        except HttpError as e:
+            return e.status, {"error": e.message}
+        except Exception as e:
+            print(f"Error handling {request.method} {request.path}: {e}")
+            return 500, {"error": "Internal server error."}
+
+    def _write(self, status: int, body, keep_alive: bool):
+        if status in (204, 304):
+            body = None   # these never carry a body, and RFC 9110 forbids Content-Length on 204
+        payload = b"" if body is None else json.dumps(body, default=_json_default, separators=(",", ":")).encode("utf-8")
+        reason = HTTPStatus(status).phrase
+        head = (f"HTTP/1.1 {status} {reason}\r\n"
+                + ("" if status in (204, 304) else f"Content-Length: {len(payload)}\r\n")
+                + ("Content-Type: application/json\r\n" if body is not None else "")
+                + ("" if keep_alive else "Connection: close\r\n")).encode("latin-1")
+        self.transport.write(head + b"Date: " + _Date.header() + b"\r\n\r\n" + payload)
+
+    def _reset_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        if self.keep_alive_timeout and not self._closing:
+            self._idle_timer = asyncio.get_running_loop().call_later(self.keep_alive_timeout, self._idle)
+
+    def _idle(self):
+        if self._worker is None and not self._queue and self.transport is not None:
+            self.transport.close()
+
+
+def listening_socket(host: str, port: int, reuse_port: bool = False, backlog: int = 1024) -> socket.socket:
+    # With SO_REUSEPORT every worker process binds its own socket and the kernel spreads connections over them
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+async def start_server(router: Router, sock: socket.socket, keep_alive_timeout: float = 15.0,
+                       max_pipeline: int = 64) -> asyncio.AbstractServer:
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(lambda: HttpProtocol(router, keep_alive_timeout, max_pipeline), sock=sock)
@@ -0,0 +1,113 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+# Sequence name -> (table, key column) it hands out ids for
+SEQUENCES: Dict[str, Tuple[str, str]] = {
+    "cart": ("cart", "cart_id"),
+    "orders": ("orders", "order_id"),
+    "order_items": ("order_items", "order_item_id"),
+    "stock_reservations": ("stock_reservations", "reservation_id"),
+}
+
+
+def current_max_id(connection, name: str) -> int:
+    table, column = SEQUENCES[name]
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT MAX({column}) FROM {table}")
+        max_id = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+    return 0 if max_id is None else int(max_id)
+
+
+class IdBlockSource(ABC):
+    @abstractmethod
+    def reserve(self, name: str, block_size: int) -> int:
+        """Reserve `block_size` consecutive ids for `name` and return the first one."""
+        pass
+
+
+class LocalCounterSource(IdBlockSource):
+    # In-process counter seeded once from the table; only safe with a single writer process
+    def __init__(self, pool=None):
+        self.pool = pool
+        self._next: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, name: str, block_size: int) -> int:
+        with self._lock:
+            if name not in self._next:
+                self._next[name] = self._seed(name)
+            first = self._next[name]
+            self._next[name] = first + block_size
+            return first
+
+    def _seed(self, name: str) -> int:
+        if self.pool is None:
+            return 1
+        with self.pool.connection() as connection:
+            return current_max_id(connection, name) + 1
+
+
+class SequenceTableSource(IdBlockSource):
+    # Blocks come from the id_sequences table, so every process sharing the database stays collision-free
+    def __init__(self, pool):
+        self.pool = pool
+
+    def reserve(self, name: str, block_size: int) -> int:
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                while True:
+                    cursor.execute("UPDATE id_sequences SET next_value = next_value + ? WHERE name = ?", (block_size, name))
+                    if cursor.rowcount > 0:
+                        cursor.execute("SELECT next_value FROM id_sequences WHERE name = ?", (name,))
+                        next_value = cursor.fetchone()[0]
+                        connection.commit()
+                        return int(next_value) - block_size
+
+                    # First use of this sequence: start after the ids already in the table
+                    first = current_max_id(connection, name) + 1
+                    try:
+                        cursor.execute("INSERT INTO id_sequences (name, next_value) VALUES (?, ?)", (name, first + block_size))
+                        connection.commit()
+                        return first
+                    except Exception:
+                        # Another writer created the row first; take a block from it instead
+                        connection.rollback()
+            finally:
+                cursor.close()
+
+
+class IdAllocator:
+    """Hi/lo id allocator: reserves blocks from a source and hands ids out from memory."""
+
+    def __init__(self, source: IdBlockSource, block_size: int = 100):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.source = source
+        self.block_size = block_size
+        self._blocks: Dict[str, List[int]] = {}  # name -> [next id, end of block (exclusive)]
+        self._lock = threading.Lock()
+
+    def next_id(self, name: str) -> int:
+        return self.next_ids(name, 1)[0]
+
+    def next_ids(self, name: str, count: int) -> range:
+        # Returns `count` consecutive ids; the rest of a too-small block is skipped
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[1] - block[0] < count:
+                size = max(self.block_size, count)
+                first = self.source.reserve(name, size)
+                block = [first, first + size]
+                self._blocks[name] = block
+            ids = range(block[0], block[0] + count)
+            block[0] += count
+            return ids
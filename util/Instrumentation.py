@@ -0,0 +1,457 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Callable, Dict, Iterable, List, Optional, TextIO, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@lru_cache(maxsize=1024)
+def statement_key(sql: str) -> str:
+    # Label a statement by its normalized text; IN (?, ?, ...) lists of any length share one label
+    normalized = re.sub(r"\s+", " ", sql).strip()
+    normalized = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?, ...)", normalized)
+    return normalized[:160]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+
+class MetricsSink(ABC):
+    """Receives one event per finished statement and per finished repository call."""
+
+    @abstractmethod
+    def statement(self, event: Dict):
+        pass
+
+    @abstractmethod
+    def call(self, event: Dict):
+        pass
+
+
+class InMemorySink(MetricsSink):
+    """Counters and latency histograms per statement and per repository method, plus the latest events."""
+
+    def __init__(self, max_events: int = 1000, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self.statements: Dict[str, Dict] = {}
+        self.calls: Dict[str, Dict] = {}
+
+    def statement(self, event: Dict):
+        with self._lock:
+            metrics = self.statements.get(event["statement"])
+            if metrics is None:
+                metrics = self.statements[event["statement"]] = {
+                    "count": 0, "rows": 0, "errors": 0, "slow": 0, "seconds": Histogram(self.buckets)}
+            metrics["count"] += 1
+            metrics["rows"] += event["rows"]
+            metrics["errors"] += event["error"] is not None
+            metrics["slow"] += event["slow"]
+            metrics["seconds"].observe(event["seconds"])
+            self.events.append(event)
+
+    def call(self, event: Dict):
+        with self._lock:
+            metrics = self.calls.get(event["method"])
+            if metrics is None:
+                metrics = self.calls[event["method"]] = {
+                    "count": 0, "round_trips": 0, "rows": 0, "errors": 0, "seconds": Histogram(self.buckets),
+                    "db_seconds": 0.0, "pool_wait_seconds": 0.0}
+            metrics["count"] += 1
+            metrics["round_trips"] += event["round_trips"]
+            metrics["rows"] += event["rows"]
+            metrics["errors"] += event["errors"]
+            metrics["db_seconds"] += event["db_seconds"]
+            metrics["pool_wait_seconds"] += event["pool_wait_seconds"]
+            metrics["seconds"].observe(event["seconds"])
+            self.events.append(event)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        # Plain numbers only (histograms as count/sum), safe to print or serialize
+        def flatten(metrics):
+            return {key: ({"count": value.count, "sum": value.sum} if isinstance(value, Histogram) else value)
+                    for key, value in metrics.items()}
+
+        with self._lock:
+            return {
+                "statements": {key: flatten(metrics) for key, metrics in self.statements.items()},
+                "calls": {key: flatten(metrics) for key, metrics in self.calls.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.statements.clear()
+            self.calls.clear()
+            self.events.clear()
+
+
+class PrometheusSink(InMemorySink):
+    """In-memory metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self, prefix: str = "ecom", **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            self._render_family(lines, "sql_statements_total", "counter", "Statements executed", "statement",
+                                self.statements, "count")
+            self._render_family(lines, "sql_rows_total", "counter", "Rows fetched or affected", "statement",
+                                self.statements, "rows")
+            self._render_family(lines, "sql_errors_total", "counter", "Statements that raised", "statement",
+                                self.statements, "errors")
+            self._render_family(lines, "sql_slow_statements_total", "counter", "Statements over the slow query threshold",
+                                "statement", self.statements, "slow")
+            self._render_histogram(lines, "sql_statement_seconds", "Statement latency including fetches", "statement",
+                                   self.statements)
+            self._render_family(lines, "repository_calls_total", "counter", "Repository calls", "method", self.calls, "count")
+            self._render_family(lines, "repository_round_trips_total", "counter", "Database round-trips made by repository calls",
+                                "method", self.calls, "round_trips")
+            self._render_family(lines, "repository_errors_total", "counter", "Failed statements inside repository calls",
+                                "method", self.calls, "errors")
+            self._render_family(lines, "repository_db_seconds_total", "counter", "Time repository calls spent in statements",
+                                "method", self.calls, "db_seconds")
+            self._render_family(lines, "repository_pool_wait_seconds_total", "counter",
+                                "Time repository calls waited for a pooled connection", "method", self.calls, "pool_wait_seconds")
+            self._render_histogram(lines, "repository_call_seconds", "Repository call latency", "method", self.calls)
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        # Atomic replace, for the node exporter textfile collector
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            handle.write(self.render())
+        os.replace(temporary, path)
+
+    def _render_family(self, lines, name, kind, help_text, label, metrics, field):
+        name = f"{self.prefix}_{name}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, values in metrics.items():
+            lines.append(f'{name}{{{label}="{self._escape(key)}"}} {values[field]}')
+
+    def _render_histogram(self, lines, name, help_text, label, metrics):
+        name = f"{self.prefix}_{name}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, values in metrics.items():
+            histogram = values["seconds"]
+            escaped = self._escape(key)
+            for bound, count in histogram.cumulative():
+                lines.append(f'{name}_bucket{{{label}="{escaped}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{{label}="{escaped}"}} {histogram.sum}')
+            lines.append(f'{name}_count{{{label}="{escaped}"}} {histogram.count}')
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class JsonLogSink(MetricsSink):
+    """Writes every event as one JSON line; `only_slow` keeps just slow statements and failed calls."""
+
+    def __init__(self, stream: Optional[TextIO] = None, path: Optional[str] = None, only_slow: bool = False):
+        self._owned = stream is None and path is not None
+        self.stream = open(path, "a", encoding="utf-8") if self._owned else (stream or sys.stderr)
+        self.only_slow = only_slow
+        self._lock = threading.Lock()
+
+    def statement(self, event: Dict):
+        if not self.only_slow or event["slow"] or event["error"] is not None:
+            self._write(event)
+
+    def call(self, event: Dict):
+        if not self.only_slow or event["errors"]:
+            self._write(event)
+
+    def close(self):
+        if self._owned:
+            self.stream.close()
+
+    def _write(self, event: Dict):
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+class _CallStats:
+    __slots__ = ("method", "started", "statements", "round_trips", "rows", "errors", "db_seconds", "pool_wait_seconds")
+
+    def __init__(self, method: str):
+        self.method = method
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.round_trips = 0
+        self.rows = 0
+        self.errors = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+
+
+class Instrumentation:
+    """Times every statement run through pooled connections and attributes it to the repository call in progress.
+
+    Pass one to ConnectionPool(instrumentation=...). Connections are only
+    wrapped while `enabled` is true, so a disabled instance costs one attribute
+    check per checkout and per repository call.
+    """
+
+    def __init__(self, sinks: Optional[Iterable[MetricsSink]] = None, slow_query_seconds: Optional[float] = 0.5,
+                 slow_query_log: Optional[Callable[[Dict], None]] = None, enabled: bool = True):
+        self.sinks = list(sinks) if sinks is not None else [InMemorySink()]
+        self.slow_query_seconds = slow_query_seconds
+        self.slow_query_log = slow_query_log if slow_query_log is not None else self._print_slow_query
+        self.enabled = enabled
+        self._local = threading.local()
+
+    @classmethod
+    def from_properties(cls) -> Optional["Instrumentation"]:
+        from util.PropertyUtil import PropertyUtil
+        settings = PropertyUtil.get_instrumentation_settings()
+        if not settings["enabled"]:
+            return None
+        sinks = [PrometheusSink()]
+        if settings["json_log"]:
+            sinks.append(JsonLogSink(path=settings["json_log"]))
+        return cls(sinks, slow_query_seconds=settings["slow_query_seconds"])
+
+    def wrap(self, connection) -> "InstrumentedConnection":
+        return InstrumentedConnection(connection, self)
+
+    @contextmanager
+    def call(self, method: str):
+        # Nested repository calls roll up into the outermost one
+        if getattr(self._local, "current", None) is not None:
+            yield self._local.current
+            return
+        stats = self._local.current = _CallStats(method)
+        try:
+            yield stats
+        finally:
+            self._local.current = None
+            event = {
+                "type": "call", "method": method, "seconds": time.perf_counter() - stats.started,
+                "statements": stats.statements, "round_trips": stats.round_trips, "rows": stats.rows,
+                "errors": stats.errors, "db_seconds": stats.db_seconds, "pool_wait_seconds": stats.pool_wait_seconds,
+            }
+            for sink in self.sinks:
+                sink.call(event)
+
+    def current_call(self) -> Optional[_CallStats]:
+        return getattr(self._local, "current", None)
+
+    def record_pool_wait(self, seconds: float):
+        stats = self.current_call()
+        if stats is not None:
+            stats.pool_wait_seconds += seconds
+
+    def record_statement(self, sql: str, seconds: float, rows: int, round_trips: int = 1, error: Optional[BaseException] = None):
+        slow = self.slow_query_seconds is not None and seconds >= self.slow_query_seconds
+        event = {"type": "statement", "statement": statement_key(sql), "seconds": seconds, "rows": rows,
+                 "round_trips": round_trips, "error": None if error is None else f"{type(error).__name__}: {error}",
+                 "slow": slow}
+        stats = self.current_call()
+        if stats is not None:
+            event["method"] = stats.method
+            stats.statements += 1
+            stats.round_trips += round_trips
+            stats.rows += rows
+            stats.errors += error is not None
+            stats.db_seconds += seconds
+        for sink in self.sinks:
+            sink.statement(event)
+        if slow:
+            self.slow_query_log(event)
+
+    @staticmethod
+    def _print_slow_query(event: Dict):
+        print(f"Slow query ({event['seconds'] * 1000:.1f} ms, {event['rows']} rows"
+              f"{', in ' + event['method'] if 'method' in event else ''}): {event['statement']}")
+
+
+def instrumented(method):
+    """Runs a repository method inside an Instrumentation.call scope when its pool is instrumented."""
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        instrumentation = self.pool.instrumentation
+        if instrumentation is None or not instrumentation.enabled:
+            return method(self, *args, **kwargs)
+        with instrumentation.call(name):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class InstrumentedConnection:
+    __slots__ = ("raw", "instrumentation", "_cursors")
+
+    def __init__(self, raw, instrumentation: Instrumentation):
+        self.raw = raw
+        self.instrumentation = instrumentation
+        self._cursors = []
+
+    def cursor(self) -> "InstrumentedCursor":
+        cursor = InstrumentedCursor(self.raw.cursor(), self.instrumentation)
+        self._cursors.append(cursor)
+        return cursor
+
+    def execute(self, sql: str, params=()):
+        # sqlite3-style shortcut
+        cursor = self.cursor()
+        cursor.execute(sql, params)
+        return cursor
+
+    def commit(self):
+        self._timed("COMMIT", self.raw.commit)
+
+    def rollback(self):
+        self._timed("ROLLBACK", self.raw.rollback)
+
+    def finish(self):
+        # Called when the connection goes back to the pool: report statements of cursors left unclosed
+        for cursor in self._cursors:
+            cursor.finish()
+        self._cursors.clear()
+
+    def close(self):
+        self.finish()
+        self.raw.close()
+
+    def _timed(self, sql: str, action: Callable):
+        started = time.perf_counter()
+        try:
+            action()
+        except Exception as e:
+            self.instrumentation.record_statement(sql, time.perf_counter() - started, 0, error=e)
+            raise
+        self.instrumentation.record_statement(sql, time.perf_counter() - started, 0)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class InstrumentedCursor:
+    """Cursor proxy; a statement is reported once its rows are consumed, the next statement runs or the cursor closes."""
+
+    __slots__ = ("raw", "instrumentation", "_sql", "_seconds", "_rows", "_round_trips")
+
+    def __init__(self, raw, instrumentation: Instrumentation):
+        object.__setattr__(self, "raw", raw)
+        object.__setattr__(self, "instrumentation", instrumentation)
+        object.__setattr__(self, "_sql", None)
+        object.__setattr__(self, "_seconds", 0.0)
+        object.__setattr__(self, "_rows", 0)
+        object.__setattr__(self, "_round_trips", 0)
+
+    def execute(self, sql: str, *params):
+        return self._run(sql, self.raw.execute, sql, *params)
+
+    def executemany(self, sql: str, seq_of_params):
+        return self._run(sql, self.raw.executemany, sql, seq_of_params)
+
+    def fetchone(self):
+        row = self._fetch(self.raw.fetchone)
+        if row is None:
+            self.finish()
+        else:
+            object.__setattr__(self, "_rows", self._rows + 1)
+        return row
+
+    def fetchmany(self, size: Optional[int] = None):
+        rows = self._fetch(self.raw.fetchmany) if size is None else self._fetch(lambda: self.raw.fetchmany(size))
+        if rows:
+            object.__setattr__(self, "_rows", self._rows + len(rows))
+        else:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self.raw.fetchall)
+        object.__setattr__(self, "_rows", self._rows + len(rows))
+        self.finish()
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self.finish()
+        self.raw.close()
+
+    def finish(self):
+        if self._sql is not None:
+            sql = self._sql
+            object.__setattr__(self, "_sql", None)
+            self.instrumentation.record_statement(sql, self._seconds, self._rows, self._round_trips)
+
+    def _run(self, sql: str, action: Callable, *args):
+        self.finish()
+        started = time.perf_counter()
+        try:
+            action(*args)
+        except Exception as e:
+            self.instrumentation.record_statement(sql, time.perf_counter() - started, 0, error=e)
+            raise
+        rowcount = getattr(self.raw, "rowcount", -1)
+        object.__setattr__(self, "_sql", sql)
+        object.__setattr__(self, "_seconds", time.perf_counter() - started)
+        object.__setattr__(self, "_rows", rowcount if rowcount is not None and rowcount > 0 else 0)
+        object.__setattr__(self, "_round_trips", 1)
+        return self
+
+    def _fetch(self, action: Callable):
+        started = time.perf_counter()
+        try:
+            return action()
+        finally:
+            object.__setattr__(self, "_seconds", self._seconds + time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        # e.g. pyodbc's fast_executemany
+        setattr(self.raw, name, value)
@@ -0,0 +1,139 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from array import array
+from decimal import Decimal
+from itertools import accumulate, repeat
+from operator import add, floordiv, itemgetter, mul, sub
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+from entity.product_batch import from_cents, to_cents
+
+BASIS_POINTS = 10_000  # rates are given in basis points: 1825 = 18.25 %
+
+
+def _rate(amounts: Iterable[int], rates: Iterable[int]) -> Iterable[int]:
+    # amount * rate / 10000, rounded half up, for non-negative integer amounts; runs as C-level map chains
+    return map(floordiv, map(add, map(mul, amounts, rates), repeat(BASIS_POINTS // 2)), repeat(BASIS_POINTS))
+
+
+def _pick(indexes) -> Callable[[Sequence[int]], Tuple[int, ...]]:
+    # itemgetter that returns a tuple for a single index too
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda values: (values[index],)
+    return itemgetter(*indexes)
+
+
+class CartLines:
+    """Columnar lines of many carts: cart i owns lines offsets[i] .. offsets[i + 1] - 1.
+
+    Prices are integer cents, so every total computed from them is exact.
+    """
+    __slots__ = ("keys", "offsets", "product_ids", "price_cents", "quantities")
+
+    def __init__(self):
+        self.keys = []                  # caller's identifier of each cart (customer_id, order_id, ...)
+        self.offsets = array("q", [0])
+        self.product_ids = array("q")
+        self.price_cents = array("q")
+        self.quantities = array("q")
+
+    def add_cart(self, key, lines: Iterable[Tuple[int, object, int]]) -> int:
+        # lines are (product_id, price, quantity); price may be Decimal, float or str
+        for product_id, price, quantity in lines:
+            self.add_line(product_id, to_cents(price), quantity)
+        return self.end_cart(key)
+
+    def add_line(self, product_id: int, price_cents: int, quantity: int):
+        if quantity < 0 or price_cents < 0:
+            raise ValueError(f"Negative price or quantity for product {product_id}.")
+        self.product_ids.append(product_id)
+        self.price_cents.append(price_cents)
+        self.quantities.append(quantity)
+
+    def end_cart(self, key) -> int:
+        # Closes the cart made of the lines added since the previous one; returns its index
+        self.keys.append(key)
+        self.offsets.append(len(self.product_ids))
+        return len(self.keys) - 1
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class PricedCarts:
+    __slots__ = ("keys", "subtotal_cents", "discount_cents", "tax_cents", "total_cents")
+
+    def __init__(self, keys, subtotal_cents: array, discount_cents: array, tax_cents: array, total_cents: array):
+        self.keys = keys
+        self.subtotal_cents = subtotal_cents
+        self.discount_cents = discount_cents
+        self.tax_cents = tax_cents
+        self.total_cents = total_cents
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def get_total(self, index: int) -> Decimal:
+        return from_cents(self.total_cents[index])
+
+    def rows(self) -> Iterable[Tuple[object, Decimal, Decimal, Decimal, Decimal]]:
+        # (key, subtotal, discount, tax, total) per cart
+        for index, key in enumerate(self.keys):
+            yield (key, from_cents(self.subtotal_cents[index]), from_cents(self.discount_cents[index]),
+                   from_cents(self.tax_cents[index]), from_cents(self.total_cents[index]))
+
+
+class PricingEngine:
+    """Prices many carts in one pass over columnar integer-cent arrays.
+
+    Per line: subtotal = price * quantity, less the product's promotion
+    (basis points). Per cart: a percentage and/or fixed-amount discount on what
+    remains, never below zero, then tax on the discounted amount. Every
+    rounding is half up to the cent, the same rule as to_cents().
+    """
+
+    def __init__(self, tax_rate_bp: int = 0, promotions: Optional[Dict[int, int]] = None):
+        self.tax_rate_bp = tax_rate_bp
+        self.promotions = dict(promotions or {})  # product_id -> discount in basis points
+
+    def price(self, lines: CartLines, cart_discount_bp: Optional[Sequence[int]] = None,
+              cart_discount_cents: Optional[Sequence[int]] = None, tax_rate_bp: Optional[Sequence[int]] = None) -> PricedCarts:
+        """Totals for every cart in `lines`; the optional sequences hold one value per cart."""
+        count = len(lines)
+        if count == 0:
+            return PricedCarts([], array("q"), array("q"), array("q"), array("q"))
+        # Intermediate columns are lists: building them from map() is about twice as fast as building arrays
+        line_totals = list(map(mul, lines.price_cents, lines.quantities))
+
+        # Per-cart sums are differences of prefix sums taken at the cart boundaries
+        starts, ends = _pick(lines.offsets[:-1]), _pick(lines.offsets[1:])
+
+        def per_cart(values):
+            prefix = list(accumulate(values, initial=0))
+            return list(map(sub, ends(prefix), starts(prefix)))
+
+        subtotal = per_cart(line_totals)
+        if self.promotions:
+            discount = per_cart(_rate(line_totals, map(self.promotions.get, lines.product_ids, repeat(0))))
+        else:
+            discount = [0] * count
+        if cart_discount_bp is not None:
+            discount = list(map(add, discount, _rate(map(sub, subtotal, discount), cart_discount_bp)))
+        if cart_discount_cents is not None:
+            discount = list(map(add, discount, cart_discount_cents))
+        # A discount never takes a cart below zero
+        discount = list(map(min, discount, subtotal))
+        taxable = list(map(sub, subtotal, discount))
+
+        rates = repeat(self.tax_rate_bp, count) if tax_rate_bp is None else tax_rate_bp
+        tax = list(_rate(taxable, rates))
+        total = map(add, taxable, tax)
+        return PricedCarts(list(lines.keys), array("q", subtotal), array("q", discount), array("q", tax), array("q", total))
+
+    def price_order(self, lines: Iterable[Tuple[int, object, int]]) -> Decimal:
+        # Total of a single cart given as (product_id, price, quantity) lines
+        cart = CartLines()
+        cart.add_cart(None, lines)
+        return self.price(cart).get_total(0)
@@ -1,7 +1,9 @@
+import os
+
 class PropertyUtil:
     @staticmethod
-    def get_property_string():
-        hostname = "SARTHAKKULKARNI"  # Your SQL Server instance name
+    def get_property_string(hostname=None):
+        hostname = hostname or "SARTHAKKULKARNI"  # Your SQL Server instance name
         dbname = "Ecommerce_Application"           # Your database name
 
         connection_string = (
@@ -12,4 +14,66 @@ class PropertyUtil:
         )
         return connection_string
 
+    @staticmethod
+    def get_pool_settings():
+        return {
+            "min_size": 1,        # connections kept open even when idle
+            "max_size": 10,       # hard upper bound on open connections
+            "timeout": 30.0,      # seconds to wait for a free connection
+            "max_idle": 300.0,    # seconds before an idle connection above min_size is closed
+        }
+
+    @staticmethod
+    def get_instrumentation_settings():
+        return {
+            "enabled": os.environ.get("ECOM_SQL_METRICS", "").lower() in ("1", "true", "yes"),
+            "slow_query_seconds": float(os.environ.get("ECOM_SLOW_QUERY_MS", "500")) / 1000,
+            "json_log": os.environ.get("ECOM_SQL_LOG"),   # path of a JSON-lines statement log, if wanted
+        }
+
+    @staticmethod
+    def get_backend_name():
+        # "sqlserver" (default) or "sqlite" for the embedded engine
+        return os.environ.get("ECOM_DB_BACKEND", "sqlserver").lower()
 
+    @staticmethod
+    def get_sqlite_path():
+        return os.environ.get("ECOM_SQLITE_PATH", "ecommerce.db")
+
+    @staticmethod
+    def get_read_replicas():
+        # Comma-separated read replicas: SQL Server instance names, or database file paths with the sqlite backend
+        return [replica.strip() for replica in os.environ.get("ECOM_READ_REPLICAS", "").split(",") if replica.strip()]
+
+    @staticmethod
+    def get_replica_settings():
+        return {
+            "strategy": os.environ.get("ECOM_REPLICA_STRATEGY", "round_robin"),   # or "least_loaded"
+            "retry_interval": 5.0,   # seconds before a replica that failed is tried again
+        }
+
+    @staticmethod
+    def get_read_your_writes():
+        # Seconds after a write during which the same thread keeps reading from the primary
+        return float(os.environ.get("ECOM_READ_YOUR_WRITES", "1.0"))
+
+    @staticmethod
+    def get_shards():
+        # Comma-separated shard databases for customers, carts and orders, named like the read replicas;
+        # the database configured above is then the catalog node
+        return [shard.strip() for shard in os.environ.get("ECOM_SHARDS", "").split(",") if shard.strip()]
+
+    @staticmethod
+    def get_shard_map_path():
+        # Bucket-to-shard assignment, created on first use
+        return os.environ.get("ECOM_SHARD_MAP", "shards.json")
+
+    @staticmethod
+    def get_cart_journal_path():
+        # Journal of the console application's write-behind carts; unset, carts are written straight to the database
+        return os.environ.get("ECOM_CART_JOURNAL") or None
+
+    @staticmethod
+    def get_search_index_path():
+        # Product search index file; built from the catalog on first start
+        return os.environ.get("ECOM_SEARCH_INDEX", "products.idx")
@@ -0,0 +1,133 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inspect
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from typing import Dict, List, Optional
+from exception.pooltimeout import PoolTimeout
+from util.ConnectionPool import ConnectionPool
+
+
+def writes(method):
+    """Marks a repository method as a write, so the caller's next reads can be sent to the primary.
+
+    The caller is the customer the write is for: the first argument when it is
+    a Customer or the method's first parameter is named customer_id. Writes
+    for no particular customer are remembered for the calling thread only.
+    """
+    by_id = list(inspect.signature(method).parameters)[1:2] == ["customer_id"]
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            first = args[0] if args else kwargs.get("customer_id")
+            if by_id:
+                self.note_write(first)
+            else:
+                self.note_write(first.get_customer_id() if hasattr(first, "get_customer_id") else None)
+
+    return wrapper
+
+
+class ReplicaSet:
+    """Read-only replica pools and the choice of which one serves the next read.
+
+    "round_robin" takes the healthy replicas in turn; "least_loaded" takes the
+    one with the fewest borrowed connections. A replica whose connection cannot
+    be opened is marked down and skipped; after `retry_interval` seconds the
+    next read tries it again and brings it back if that works (check() probes
+    every down replica at once). A replica whose pool is merely exhausted is
+    skipped for that read only. When no replica can serve, the read goes to
+    the primary pool.
+    """
+
+    STRATEGIES = ("round_robin", "least_loaded")
+
+    def __init__(self, pools: List[ConnectionPool], strategy: str = "round_robin", retry_interval: float = 5.0,
+                 acquire_timeout: float = 1.0):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown replica strategy {strategy!r}; use one of {', '.join(self.STRATEGIES)}.")
+        self.pools = list(pools)
+        self.strategy = strategy
+        self.retry_interval = retry_interval
+        self.acquire_timeout = acquire_timeout
+        self._lock = threading.Lock()
+        self._next = 0
+        self._down_until: Dict[int, float] = {}            # index -> monotonic time of the next retry
+        self._reads = [0] * len(self.pools)
+        self._failures = [0] * len(self.pools)
+        self.primary_reads = 0
+
+    @contextmanager
+    def borrow(self, kind: str, primary: ConnectionPool):
+        # Yields pool.connection() or pool.statements() (kind) of the chosen replica, falling back to the primary
+        with ExitStack() as stack:
+            for index in self._candidates():
+                pool = self.pools[index]
+                try:
+                    resource = stack.enter_context(getattr(pool, kind)(self.acquire_timeout))
+                except PoolTimeout:
+                    continue
+                except Exception as e:
+                    self._mark_down(index, e)
+                    continue
+                with self._lock:
+                    self._down_until.pop(index, None)
+                    self._reads[index] += 1
+                break
+            else:
+                resource = stack.enter_context(getattr(primary, kind)())
+                with self._lock:
+                    self.primary_reads += 1
+            yield resource
+
+    def check(self) -> int:
+        # Probes every replica marked down and returns how many replicas are up
+        with self._lock:
+            down = list(self._down_until)
+        for index in down:
+            try:
+                with self.pools[index].connection(self.acquire_timeout):
+                    pass
+            except Exception as e:
+                self._mark_down(index, e)
+                continue
+            with self._lock:
+                self._down_until.pop(index, None)
+        with self._lock:
+            return len(self.pools) - len(self._down_until)
+
+    def stats(self) -> List[Dict[str, object]]:
+        with self._lock:
+            return [{"reads": self._reads[index], "failures": self._failures[index], "up": index not in self._down_until,
+                     "in_use": pool.stats()["in_use"]} for index, pool in enumerate(self.pools)]
+
+    def close(self):
+        for pool in self.pools:
+            pool.close()
+
+    def _candidates(self) -> List[int]:
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % max(len(self.pools), 1)
+            order = [(start + offset) % len(self.pools) for offset in range(len(self.pools))]
+            up = [index for index in order if index not in self._down_until]
+            # A down replica due for a retry is tried first; if it still fails, only this read pays for the attempt
+            retry = [index for index in order if self._down_until.get(index, now + 1) <= now]
+        if self.strategy == "least_loaded":
+            up.sort(key=lambda index: self.pools[index].stats()["in_use"])   # stable: ties keep the rotation
+        return retry + up
+
+    def _mark_down(self, index: int, error: Exception):
+        with self._lock:
+            if index not in self._down_until:
+                print(f"Read replica {index} is unavailable: {error}")
+            self._failures[index] += 1
+            self._down_until[index] = time.monotonic() + self.retry_interval
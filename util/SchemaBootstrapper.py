@@ -0,0 +1,68 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import re
+from typing import List, Optional, Tuple
+from util.DatabaseBackend import DatabaseBackend
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Ecommerce Application -- Main Case Study.sql")
+
+_CREATE_TABLE = re.compile(r"create\s+table\s+(\w+)\s*\((.*?)\)\s*;", re.IGNORECASE | re.DOTALL)
+
+
+def load_table_definitions(path: str = SCHEMA_FILE) -> List[Tuple[str, str]]:
+    # (table, CREATE TABLE statement) in file order, which already respects the foreign keys
+    with open(path, encoding="utf-8") as handle:
+        script = handle.read()
+    definitions = []
+    for table, body in _CREATE_TABLE.findall(script):
+        columns = ", ".join(line.strip().rstrip(",") for line in body.splitlines() if line.strip())
+        definitions.append((table, f"CREATE TABLE {table} ({columns})"))
+    return definitions
+
+
+class SchemaBootstrapper:
+    """Creates the application tables from the case-study SQL script on any backend."""
+
+    def __init__(self, backend: DatabaseBackend, schema_file: str = SCHEMA_FILE):
+        self.backend = backend
+        self.definitions = load_table_definitions(schema_file)
+
+    def create_all(self, connection=None):
+        owned = connection is None
+        if owned:
+            connection = self.backend.connect()
+        try:
+            cursor = connection.cursor()
+            for table, create_sql in self.definitions:
+                cursor.execute(self.backend.create_table_if_missing(table, create_sql))
+            connection.commit()
+            cursor.close()
+        finally:
+            if owned:
+                connection.close()
+
+    def drop_all(self, connection=None):
+        owned = connection is None
+        if owned:
+            connection = self.backend.connect()
+        try:
+            cursor = connection.cursor()
+            for table, _ in reversed(self.definitions):
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            connection.commit()
+            cursor.close()
+        finally:
+            if owned:
+                connection.close()
+
+    def table_names(self) -> List[str]:
+        return [table for table, _ in self.definitions]
+
+
+if __name__ == "__main__":
+    from util.DatabaseBackend import backend_from_properties, SqliteBackend
+    target: Optional[DatabaseBackend] = SqliteBackend(sys.argv[1]) if len(sys.argv) > 1 else backend_from_properties()
+    SchemaBootstrapper(target).create_all()
+    print(f"Schema created on {target.name}.")
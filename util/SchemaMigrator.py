@@ -0,0 +1,177 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, List, Optional, Tuple
+from util.DatabaseBackend import DatabaseBackend
+from util.IdAllocator import SEQUENCES
+from util.SchemaBootstrapper import load_table_definitions
+
+
+class Migration:
+    def __init__(self, version: int, description: str, statements: Dict[str, List[str]]):
+        self.version = version
+        self.description = description
+        self.statements = statements  # backend name -> statements, "*" for SQL every backend accepts
+
+    def statements_for(self, backend: DatabaseBackend) -> List[str]:
+        # A statement may also be a callable that renders itself for the backend
+        statements = self.statements.get("*", []) + self.statements.get(backend.name, [])
+        return [statement(backend) if callable(statement) else statement for statement in statements]
+
+
+def _create_table_from_script(table: str):
+    # Tables added to the case-study script after a database was created
+    return lambda backend: backend.create_table_if_missing(table, dict(load_table_definitions())[table])
+
+
+# Keep duplicate (customer_id, product_id) cart lines from blocking the unique index: their quantities are
+# merged into the oldest line and the rest are deleted.
+_MERGE_DUPLICATE_CART_LINES = [
+    "UPDATE cart SET quantity = (SELECT SUM(c2.quantity) FROM cart c2 "
+    "WHERE c2.customer_id = cart.customer_id AND c2.product_id = cart.product_id) "
+    "WHERE cart_id IN (SELECT MIN(cart_id) FROM cart GROUP BY customer_id, product_id HAVING COUNT(*) > 1)",
+    "DELETE FROM cart WHERE cart_id NOT IN (SELECT MIN(cart_id) FROM cart GROUP BY customer_id, product_id)",
+]
+
+
+def _seed_sequence(name: str) -> str:
+    # Starts the sequence after the ids already in its table, unless it is already there
+    table, column = SEQUENCES[name]
+    return (f"INSERT INTO id_sequences (name, next_value) SELECT '{name}', next_value "
+            f"FROM (SELECT COALESCE(MAX({column}), 0) + 1 AS next_value FROM {table}) seed "
+            f"WHERE NOT EXISTS (SELECT 1 FROM id_sequences WHERE name = '{name}')")
+
+
+MIGRATIONS = [
+    Migration(1, "Covering indexes for cart, order history and order lines; unique cart line per customer and product", {
+        "*": _MERGE_DUPLICATE_CART_LINES,
+        # SQL Server can carry the non-key columns in INCLUDE; SQLite has no INCLUDE, so they join the key instead
+        "sqlserver": [
+            "CREATE UNIQUE INDEX ux_cart_customer_product ON cart (customer_id, product_id) INCLUDE (quantity)",
+            "CREATE INDEX ix_orders_customer ON orders (customer_id, order_id) INCLUDE (order_date, total_price, shipping_address)",
+            "CREATE INDEX ix_order_items_order ON order_items (order_id) INCLUDE (product_id, quantity)",
+        ],
+        "sqlite": [
+            "CREATE UNIQUE INDEX ux_cart_customer_product ON cart (customer_id, product_id)",
+            "CREATE INDEX ix_orders_customer ON orders (customer_id, order_id, order_date)",
+            "CREATE INDEX ix_order_items_order ON order_items (order_id, product_id, quantity)",
+        ],
+    }),
+    Migration(2, "Stock reservations table with an index for the expiry reaper", {
+        "*": [
+            _create_table_from_script("stock_reservations"),
+            "CREATE INDEX ix_stock_reservations_expiry ON stock_reservations (expires_at)",
+        ],
+    }),
+    Migration(3, "Id sequences for the hi/lo id allocator, seeded past the existing ids", {
+        "*": [_create_table_from_script("id_sequences")] + [_seed_sequence(name) for name in SEQUENCES],
+    }),
+]
+
+# Hot DAO access paths and the index each one must use once the migrations are applied
+HOT_QUERIES: List[Tuple[str, str, tuple, List[str]]] = [
+    ("get_all_from_cart",
+     "SELECT p.product_id, p.name, p.price, c.quantity FROM cart c JOIN products p ON c.product_id = p.product_id "
+     "WHERE c.customer_id = ?", (1,), ["ux_cart_customer_product"]),
+    ("remove_product_from_cart",
+     "DELETE FROM cart WHERE customer_id = ? AND product_id = ?", (1, 1), ["ux_cart_customer_product"]),
+    ("get_orders_by_customer",
+     "SELECT oi.product_id, oi.quantity, p.name, p.price, p.description, p.stockQuantity FROM orders o "
+     "JOIN order_items oi ON o.order_id = oi.order_id JOIN products p ON oi.product_id = p.product_id "
+     "WHERE o.customer_id = ?", (1,), ["ix_orders_customer", "ix_order_items_order"]),
+]
+
+
+class SchemaMigrator:
+    """Applies numbered schema migrations once each and records them in schema_version."""
+
+    def __init__(self, backend: DatabaseBackend, migrations: Optional[List[Migration]] = None):
+        self.backend = backend
+        self.migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda migration: migration.version)
+
+    def current_version(self, connection) -> int:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(self.backend.create_table_if_missing(
+                "schema_version", "CREATE TABLE schema_version (version INT PRIMARY KEY, description VARCHAR(200))"))
+            connection.commit()
+            cursor.execute("SELECT MAX(version) FROM schema_version")
+            version = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+        return 0 if version is None else int(version)
+
+    def migrate(self, connection=None, target: Optional[int] = None) -> List[int]:
+        # Each migration commits on its own together with its schema_version row
+        owned = connection is None
+        if owned:
+            connection = self.backend.connect()
+        applied = []
+        try:
+            current = self.current_version(connection)
+            cursor = connection.cursor()
+            try:
+                for migration in self.migrations:
+                    if migration.version <= current or (target is not None and migration.version > target):
+                        continue
+                    try:
+                        for statement in migration.statements_for(self.backend):
+                            cursor.execute(statement)
+                        cursor.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                                       (migration.version, migration.description))
+                        connection.commit()
+                    except Exception:
+                        connection.rollback()
+                        raise
+                    applied.append(migration.version)
+            finally:
+                cursor.close()
+        finally:
+            if owned:
+                connection.close()
+        return applied
+
+    def verify_query_plans(self, connection) -> List[Tuple[str, bool, List[str]]]:
+        # (query name, uses every expected index, plan lines) for each hot access path
+        results = []
+        cursor = connection.cursor()
+        try:
+            for name, sql, params, indexes in HOT_QUERIES:
+                plan = self.backend.explain(cursor, sql, params)
+                text = "\n".join(plan).lower()
+                results.append((name, all(index.lower() in text for index in indexes), plan))
+        finally:
+            cursor.close()
+        return results
+
+
+def main(argv=None):
+    import argparse
+    from util.DatabaseBackend import SqliteBackend, backend_from_properties
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations and check that hot queries use their indexes.")
+    parser.add_argument("command", choices=["migrate", "verify"])
+    parser.add_argument("--sqlite", help="path of an SQLite database instead of the configured backend")
+    args = parser.parse_args(argv)
+
+    backend = SqliteBackend(args.sqlite) if args.sqlite else backend_from_properties()
+    migrator = SchemaMigrator(backend)
+    if args.command == "migrate":
+        applied = migrator.migrate()
+        print(f"Applied migrations: {applied}" if applied else "Schema is up to date.")
+        return 0
+    connection = backend.connect()
+    try:
+        results = migrator.verify_query_plans(connection)
+    finally:
+        connection.close()
+    for name, ok, plan in results:
+        print(f"{'OK  ' if ok else 'FAIL'} {name}")
+        for line in plan:
+            print(f"       {line}")
+    return 0 if all(ok for _, ok, _ in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_GOLDEN = 0x9E3779B97F4A7C15   # 2^64 / golden ratio: consecutive ids land far apart
+_MASK = (1 << 64) - 1
+
+
+class ShardMap:
+    """Which shard holds each customer.
+
+    customer_id hashes to one of a fixed number of buckets, and every bucket
+    is assigned to a shard. Resharding moves whole buckets, so adding a shard
+    never rehashes the customers that stay. The assignment is saved as JSON
+    (replaced atomically) at `path`; reload_if_changed() picks up a move made
+    by another process. Buckets being moved are saved as frozen: every process
+    holds back their calls until the move assigns them to their new shard.
+    """
+
+    BUCKETS = 256
+
+    def __init__(self, assignment: List[int], path: Optional[str] = None, version: int = 0, frozen: Iterable[int] = ()):
+        if not assignment:
+            raise ValueError("A shard map needs at least one bucket.")
+        self.assignment = list(assignment)
+        self.path = path
+        self.version = version
+        self.frozen: Set[int] = set(frozen)
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, shard_count: int, buckets: int = BUCKETS, path: Optional[str] = None) -> "ShardMap":
+        # Buckets dealt out to the shards in turn
+        if shard_count < 1:
+            raise ValueError("A shard map needs at least one shard.")
+        return cls([bucket % shard_count for bucket in range(buckets)], path)
+
+    @classmethod
+    def load(cls, path: str) -> "ShardMap":
+        shard_map = cls([0], path)
+        shard_map.reload_if_changed()
+        return shard_map
+
+    @classmethod
+    def open(cls, path: str, shard_count: int, buckets: int = BUCKETS) -> "ShardMap":
+        # The saved map, or a new one saved for `shard_count` shards
+        if os.path.exists(path):
+            return cls.load(path)
+        shard_map = cls.create(shard_count, buckets, path)
+        shard_map.save()
+        return shard_map
+
+    @property
+    def buckets(self) -> int:
+        return len(self.assignment)
+
+    def bucket_of(self, customer_id: int) -> int:
+        # Multiplicative hash, then the high bits scaled to the bucket count
+        return (((int(customer_id) * _GOLDEN) & _MASK) * len(self.assignment)) >> 64
+
+    def shard_of(self, customer_id: int) -> int:
+        return self.assignment[self.bucket_of(customer_id)]
+
+    def shard_of_bucket(self, bucket: int) -> int:
+        return self.assignment[bucket]
+
+    def buckets_of(self, shard: int) -> List[int]:
+        return [bucket for bucket, owner in enumerate(self.assignment) if owner == shard]
+
+    def shard_count(self) -> int:
+        return max(self.assignment) + 1
+
+    def assign(self, bucket: int, shard: int):
+        # Also lifts the bucket's freeze
+        with self._lock:
+            self.assignment[bucket] = shard
+            self.frozen.discard(bucket)
+            self.version += 1
+            if self.path is not None:
+                self._save()
+
+    def freeze(self, buckets: Iterable[int]):
+        with self._lock:
+            self.frozen.update(buckets)
+            self.version += 1
+            if self.path is not None:
+                self._save()
+
+    def thaw(self, buckets: Iterable[int]):
+        with self._lock:
+            self.frozen.difference_update(buckets)
+            self.version += 1
+            if self.path is not None:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def reload_if_changed(self) -> bool:
+        if self.path is None:
+            return False
+        try:
+            stamp = self._stat()
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if stamp == self._stamp:
+                return False
+            with open(self.path, encoding="utf-8") as handle:
+                saved = json.load(handle)
+            self.assignment = saved["assignment"]
+            self.version = saved["version"]
+            self.frozen = set(saved.get("frozen", ()))   # maps saved before freezing existed have none
+            self._stamp = stamp
+            return True
+
+    def rebalance_plan(self, shard_count: int) -> List[Tuple[int, int]]:
+        """(bucket, target shard) moves that leave every one of `shard_count` shards within one bucket of the others.
+
+        The fullest shards give up their highest buckets; nothing moves between shards that are already even.
+        """
+        quota = [self.buckets // shard_count + (1 if shard < self.buckets % shard_count else 0) for shard in range(shard_count)]
+        owned: Dict[int, List[int]] = {shard: self.buckets_of(shard) for shard in range(max(shard_count, self.shard_count()))}
+        # Shards holding more than their quota hand out buckets; those past shard_count hand out all of theirs
+        spare = [bucket for shard, buckets in sorted(owned.items())
+                 for bucket in buckets[quota[shard] if shard < shard_count else 0:]]
+        spare.sort()
+        moves = []
+        for shard in range(shard_count):
+            while len(owned[shard]) < quota[shard] and spare:
+                bucket = spare.pop()
+                owned[shard].append(bucket)
+                moves.append((bucket, shard))
+        return moves
+
+    def _save(self):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump({"version": self.version, "assignment": self.assignment, "frozen": sorted(self.frozen)}, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temporary, self.path)
+        self._stamp = self._stat()
+
+    def _stat(self) -> Tuple[int, int]:
+        # Every save replaces the file, so the inode changes even when two saves share an mtime tick
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_ino
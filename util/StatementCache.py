@@ -0,0 +1,124 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, Iterable, List, Optional
+from util.Instrumentation import InstrumentedCursor
+
+
+class Statement:
+    """A named SQL statement declared once; its text is what drivers key prepared handles on."""
+
+    __slots__ = ("name", "sql")
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+
+    def __repr__(self):
+        return f"Statement({self.name!r})"
+
+
+class StatementRegistry:
+    def __init__(self):
+        self._statements: Dict[str, Statement] = {}
+
+    def declare(self, name: str, sql: str) -> Statement:
+        if name in self._statements:
+            raise ValueError(f"Statement {name!r} is already declared.")
+        statement = self._statements[name] = Statement(name, sql)
+        return statement
+
+    def get(self, name: str) -> Statement:
+        return self._statements[name]
+
+    def __iter__(self):
+        return iter(self._statements.values())
+
+    def __len__(self):
+        return len(self._statements)
+
+
+class StatementCache:
+    """One cursor per declared statement, kept on a pooled connection for as long as the connection lives.
+
+    Re-executing the same SQL text on the same cursor lets pyodbc skip
+    SQLPrepare and avoids building a cursor per call on every driver. Each
+    helper leaves its cursor with no pending results, whatever happens, and
+    a cursor whose statement raised is closed and dropped rather than reused.
+    The pool binds the cache to the connection view of the current borrow.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.connection = raw          # raw connection, or its instrumented wrapper for this borrow
+        self.instrumentation = None
+        self._cursors: Dict[Statement, object] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def bind(self, connection, instrumentation=None) -> "StatementCache":
+        self.connection = connection
+        self.instrumentation = instrumentation
+        return self
+
+    def execute(self, statement: Statement, params=()) -> int:
+        # Returns the affected row count
+        return self._run(statement, params, None)
+
+    def executemany(self, statement: Statement, rows: Iterable[tuple]) -> int:
+        return self._run(statement, rows, None, many=True)
+
+    def fetchone(self, statement: Statement, params=()) -> Optional[tuple]:
+        return self._run(statement, params, "one")
+
+    def fetchall(self, statement: Statement, params=()) -> List[tuple]:
+        return self._run(statement, params, "all")
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        for cursor in self._cursors.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._cursors.clear()
+
+    def __len__(self):
+        return len(self._cursors)
+
+    def _run(self, statement: Statement, params, fetch: Optional[str], many: bool = False):
+        raw_cursor = self._cursors.pop(statement, None)
+        if raw_cursor is None:
+            raw_cursor = self.raw.cursor()
+            self.misses += 1
+        else:
+            self.hits += 1
+        cursor = raw_cursor if self.instrumentation is None else InstrumentedCursor(raw_cursor, self.instrumentation)
+        try:
+            if many:
+                cursor.executemany(statement.sql, params)
+            else:
+                cursor.execute(statement.sql, params)
+            if fetch == "all":
+                result = cursor.fetchall()
+            else:
+                result = cursor.fetchone() if fetch == "one" else raw_cursor.rowcount
+                if raw_cursor.description is not None:
+                    raw_cursor.fetchall()  # drain what the caller did not read so the cursor holds no open result
+        except Exception:
+            try:
+                raw_cursor.close()
+            except Exception:
+                pass
+            raise
+        finally:
+            if cursor is not raw_cursor:
+                cursor.finish()
+        self._cursors[statement] = raw_cursor
+        return result
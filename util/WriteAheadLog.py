@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import threading
+from typing import Iterable, List
+
+
+class WriteAheadLog:
+    """Append-only JSON-lines log whose append() returns only once the record is on disk.
+
+    Concurrent appenders share fsyncs (group commit): whoever syncs first
+    covers every record written before it, so N threads appending at once
+    cost about one fsync rather than N.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()        # guards writes to the file buffer
+        self._sync_lock = threading.Lock()   # one fsync at a time
+        self._written = 0
+        self._synced = 0
+        self.fsyncs = 0
+        self._records = self._read()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def records(self) -> List[dict]:
+        # Records found when the log was opened, oldest first
+        return self._records
+
+    def append(self, record: dict):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._written += 1
+            ticket = self._written
+        with self._sync_lock:
+            if self._synced >= ticket:
+                return  # an fsync started after our write already covered it
+            with self._lock:
+                self._file.flush()
+                target = self._written
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+            self._synced = target
+
+    def size(self) -> int:
+        with self._lock:
+            return self._file.tell()
+
+    def reset(self, records: Iterable[dict] = ()):
+        # Atomically replaces the log with just `records`; callers make sure no append is in flight
+        with self._sync_lock, self._lock:
+            self._file.close()
+            temporary = self.path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as handle:
+                handle.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(temporary, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._written = self._synced = 0
+            self._records = []
+
+    def close(self):
+        with self._sync_lock, self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+    def _read(self) -> List[dict]:
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        good = 0
+        with open(self.path, "rb") as handle:
+            for line in handle:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # torn final write from a crash
+                good += len(line)
+        if good != os.path.getsize(self.path):
+            # Cut the torn tail so the next append starts on a clean line
+            with open(self.path, "r+b") as handle:
+                handle.truncate(good)
+        return records